@@ -0,0 +1,180 @@
+"""Memory per app and update time of committed state with 50k apps.
+
+Compares plain dict of `Record` namedtuples, storage used before (its
+`mark_*` methods are reproduced below), with `CommittedState` in production
+configuration: `IndexedRecords` with FAILED apps index, expiry heap and
+change journal of default size.
+
+Columnar storage with interned strings was tried as well, in production
+configuration it took 169 bytes per app against 167 of plain dict, while
+updates were about ten times slower, so it was dropped.
+
+Records are written as dispatch rounds do: apps of a round share state
+version and time stamp, every tenth app has failed with unique error.
+Memory is measured as size of objects reachable from the state object
+(strings prepared beforehand, like app names and descriptions, are not
+counted). Each storage is measured in separate process.
+
+Run with `PYTHONPATH=src python garbage/cstate.memory.bench.py`.
+"""
+import gc
+import random
+import subprocess
+import sys
+import time
+
+# Installed cocaine namespace package shadows `src/cocaine` otherwise.
+import pkg_resources  # noqa
+
+from cocaine.burlak.comm_state import CommittedState, Defaults, States
+
+
+APPS_COUNT = 50000
+PROFILES_COUNT = 100
+ROUND_SIZE = 5000
+UPDATE_ROUNDS = 4
+
+
+class DictState(object):
+    """Storage and `mark_*` methods of committed state used before."""
+
+    def __init__(self):
+        self.state = dict()
+
+    def mark_running(self, app, workers, profile, state_version, tm):
+        self.state.update(
+            {
+                app: CommittedState.Record(
+                    States.STARTED,
+                    workers,
+                    profile,
+                    state_version,
+                    Defaults.SUCCESS_DESCRIPTION,
+                    int(tm))
+            })
+
+    def mark_failed(self, app, profile, state_version, tm, reason=None):
+        self.state.update(
+            {
+                app: CommittedState.Record(
+                    States.FAILED,
+                    0,
+                    profile,
+                    state_version,
+                    reason,
+                    int(tm))
+            })
+
+
+def footprint(obj, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        for k, v in obj.iteritems():
+            size += footprint(k, seen) + footprint(v, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)) or \
+            type(obj).__name__ == 'deque':
+        for v in obj:
+            size += footprint(v, seen)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        size += footprint(obj.__dict__, seen)
+
+    return size
+
+
+def make_records():
+    now = int(time.time())
+    for i in xrange(APPS_COUNT):
+        app = 'app_{:06}'.format(i)
+        profile = 'profile_{}'.format(random.randint(1, PROFILES_COUNT))
+        version = i // ROUND_SIZE
+
+        if i % 10:
+            yield (
+                'running', app, random.randint(1, 100), profile, version,
+                now + version)
+        else:
+            yield (
+                'failed', app, profile, version, now + version,
+                'failed with error {}'.format(i))
+
+
+def fill(state, records):
+    for record in records:
+        getattr(state, 'mark_' + record[0])(*record[1:])
+
+
+def update(state, records):
+    """Rounds of workers changes of running apps."""
+    running = [r for r in records if r[0] == 'running']
+
+    started = time.time()
+    count = 0
+    for i in xrange(UPDATE_ROUNDS):
+        version = APPS_COUNT // ROUND_SIZE + i
+        for _, app, workers, profile, _, tm in running:
+            state.mark_running(app, workers + i, profile, version, tm + i)
+            count += 1
+
+    return count, time.time() - started
+
+
+def measure(name, state):
+    # Strings are built beforehand to count storage only.
+    records = list(make_records())
+
+    gc.collect()
+
+    started = time.time()
+    fill(state, records)
+    spent = time.time() - started
+
+    seen = set()
+    footprint(records, seen)
+    size = footprint(state, seen)
+
+    count, updated_in = update(state, records)
+
+    print(
+        '{}: {:.1f} MB, {:.0f} bytes per app, filled in {:.3f}s, '
+        '{} updates in {:.3f}s'.format(
+            name, size / 1024. / 1024, float(size) / APPS_COUNT, spent,
+            count, updated_in))
+
+
+STORAGES = {
+    'dict': ('dict of namedtuples', DictState),
+    'committed': ('CommittedState', CommittedState),
+    'no_journal': (
+        'CommittedState without journal',
+        lambda: CommittedState(journal_size=0)),
+}
+
+
+# Sample run (x86_64, CPython 2.7.18):
+#
+# dict of namedtuples: 8.0 MB, 167 bytes per app, filled in 0.098s,
+#   180000 updates in 0.318s
+# CommittedState: 9.3 MB, 196 bytes per app, filled in 0.361s,
+#   180000 updates in 0.963s
+# CommittedState without journal: 8.9 MB, 186 bytes per app, filled in
+#   0.264s, 180000 updates in 0.685s
+#
+def main():
+    if len(sys.argv) < 2:
+        for kind in ('dict', 'committed', 'no_journal'):
+            subprocess.check_call([sys.executable, __file__, kind])
+        return
+
+    random.seed(0)
+
+    name, make_state = STORAGES[sys.argv[1]]
+    measure(name, make_state())
+
+
+if __name__ == '__main__':
+    main()
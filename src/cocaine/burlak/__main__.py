@@ -16,13 +16,18 @@ from cocaine.services import Service, SecureServiceFactory
 from tornado import queues
 from tornado.ioloop import IOLoop
 
+from .admission import AdmissionController
 from .comm_state import CommittedState
 from .config import Config
 from .context import Context, LoggerSetup
+from .flapping import FlapDamper
 from .mokak.mokak import SharedStatus, make_status_web_handler
+from .rolling import ProfileRoller
 from .semaphore import Semaphore
 from .sentry import SentryClientWrapper
 from .sharding import ShardingSetup
+from .smoothing import StateSmoother
+from .snapshot import StateSnapshot
 from .sys_metrics import SysMetricsGatherer
 from .uniresis import catchup_an_uniresis
 from .web import Uptime, WebOptions, make_web_app_v1
@@ -66,7 +71,8 @@ def main(
     config = Config(shared_status)
     config.update()
 
-    committed_state = CommittedState()
+    committed_state = CommittedState(
+        journal_size=config.committed_state.journal_size)
 
     if console_log_level is not None:
         config.console_log_level = console_log_level
@@ -112,6 +118,24 @@ def main(
 
     acquirer = burlak.StateAcquirer(context, sharding_setup, input_queue)
     workers_distribution = dict()
+    roller = ProfileRoller(context, workers_distribution)
+    damper = FlapDamper(context)
+    smoother = StateSmoother(context)
+
+    hub = metrics.Hub()
+    admission = AdmissionController(context, hub)
+
+    apps_elysium = burlak.AppsElysium(
+        context,
+        committed_state,
+        node,
+        control_queue,
+        feedback_submitter,
+        admission=admission,
+        workers_distribution=workers_distribution,
+        roller=roller,
+    )
+
     state_processor = burlak.StateAggregator(
         context,
         node,
@@ -120,22 +144,20 @@ def main(
         feedback_submitter,
         apps_poll_interval,
         workers_distribution,
+        roller=roller,
+        damper=damper,
+        smoother=smoother,
+        prewarmer=apps_elysium,
     )
 
     semaphore = Semaphore(context, unicorn, sharding_setup)
 
-    apps_elysium = burlak.AppsElysium(
-        context,
-        committed_state,
-        node,
-        control_queue,
-        feedback_submitter,
-    )
+    snapshot = StateSnapshot(context, committed_state, apps_elysium)
+    snapshot.restore()
 
     if not uuid_prefix:
         uuid_prefix = config.uuid_path
 
-    hub = metrics.Hub()
     metrics_fetcher = burlak.MetricsFetcher(context, hub)
     metrics_submitter = burlak.MetricsSubmitter(
         context, committed_state, hub, feedback_submitter)
@@ -146,6 +168,12 @@ def main(
     # Note that while dependency is avoided, sometime order matters!
     io_loop.spawn_callback(lambda: apps_elysium.blessing_road(semaphore))
     io_loop.spawn_callback(lambda: state_processor.process_loop(semaphore))
+    io_loop.spawn_callback(lambda: roller.roll(
+        apps_elysium, semaphore, state_processor.run_lock))
+    io_loop.spawn_callback(apps_elysium.ramp_up)
+    io_loop.spawn_callback(apps_elysium.watch_spooling)
+    io_loop.spawn_callback(apps_elysium.sweep_channels)
+    io_loop.spawn_callback(snapshot.snapshot_loop)
 
     io_loop.spawn_callback(metrics_fetcher.poll_stats)
     io_loop.spawn_callback(metrics_submitter.post_metrics)
@@ -157,7 +185,15 @@ def main(
     units = dict(
         state_acquisition=acquirer,
         state_dispatch=state_processor,
-        elysium=apps_elysium)
+        elysium=apps_elysium,
+        start_rate_limit=apps_elysium.start_limiter,
+        admission=admission,
+        profile_roller=roller,
+        ramp=apps_elysium.ramp,
+        spooling=apps_elysium.spooling,
+        flapping=damper,
+        smoothing=smoother,
+        snapshot=snapshot)
 
     cfg_port, prefix = config.web_endpoint
 
@@ -0,0 +1,164 @@
+"""Host load aware admission of applications starts and workers increases.
+
+Decisions are based on host's system metrics gathered by `MetricsFetcher`
+into metrics `Hub`:
+
+ - cpu.load - EWMA of total CPUs load, ratio in [0, 1]
+ - mem.usable - EWMA of free and cached memory, ratio in [0, 1]
+ - loadavg - 1, 5, 15 minutes system load avarage
+
+While host is under pressure new starts and workers increases are deferred
+or throttled, stops and workers decreases are always admitted. If metrics
+aren't available (yet) everything is admitted.
+"""
+from collections import namedtuple
+
+from .mixins import LoggerMixin, MetricsMixin
+
+
+"""Result of workers control admission."""
+ControlAdmission = namedtuple('ControlAdmission', [
+    'admitted',   # list of (app, profile, workers)
+    'deferred',   # list of (app, profile, workers)
+    'throttled',  # list of (app, profile, workers) with requested workers
+    'reason',
+])
+
+
+class AdmissionController(LoggerMixin, MetricsMixin):
+    """Defers new load to the host while it is under pressure."""
+
+    def __init__(self, context, hub, **kwargs):
+        """AdmissionController.
+
+        :param hub: metrics registry with system metrics
+        :type hub: metrics.Hub
+        """
+        super(AdmissionController, self).__init__(context, **kwargs)
+
+        self._app_config = context.config
+        self._hub = hub
+
+        self.last_reason = None
+
+    @property
+    def _config(self):
+        return self._app_config.admission
+
+    @property
+    def enabled(self):
+        return self._config.enabled
+
+    def pressure(self):
+        """Check host pressure watermarks.
+
+        :return: description of exceeded watermark, or None
+        :rtype: str | None
+        """
+        if not self._config.enabled:
+            return None
+
+        system = self._hub.system or {}
+
+        cpu_load = system.get('cpu.load')
+        if cpu_load is not None and cpu_load > self._config.cpu_load_high:
+            return 'cpu load {:.2f} above {:.2f}'.format(
+                cpu_load, self._config.cpu_load_high)
+
+        mem_usable = system.get('mem.usable')
+        if mem_usable is not None and \
+                mem_usable < self._config.mem_usable_low:
+            return 'usable memory {:.2f} below {:.2f}'.format(
+                mem_usable, self._config.mem_usable_low)
+
+        loadavg = system.get('loadavg')
+        if loadavg and self._config.loadavg_high > 0 and \
+                loadavg[0] > self._config.loadavg_high:
+            return 'loadavg {:.2f} above {:.2f}'.format(
+                loadavg[0], self._config.loadavg_high)
+
+        return None
+
+    def _update_reason(self, reason):
+        if reason != self.last_reason:
+            if reason:
+                self.warn('host is under pressure: {}', reason)
+            else:
+                self.info('host pressure has gone')
+
+        self.last_reason = reason
+
+    def admit_starts(self, apps):
+        """Select apps allowed to be started now.
+
+        :param apps: apps to start ordered by importance
+        :type apps: list[str]
+
+        :return: (admitted, deferred, reason) tuple
+        :rtype: (list[str], list[str], str | None)
+        """
+        reason = self.pressure()
+        self._update_reason(reason)
+
+        if reason is None:
+            return apps, [], None
+
+        limit = self._config.max_starts_under_pressure
+        admitted, deferred = apps[:limit], apps[limit:]
+
+        self.metrics_cnt['deferred_starts'] += len(deferred)
+
+        return admitted, deferred, reason
+
+    def admit_controls(self, to_adjust, current_workers, exempt=()):
+        """Select workers changes allowed to be applied now.
+
+        Workers decreases are always admitted, increases are throttled to
+        `max_increase_under_pressure` per round, or deferred if throttle
+        step is zero. Apps with unknown current workers count are admitted.
+
+        :param to_adjust: list of (app, profile, workers) records
+        :type to_adjust: list[(str, str, int)]
+
+        :param current_workers: maps app to currently applied workers count
+        :type current_workers: callable
+
+        :param exempt: apps admitted regardless of pressure, e.g. just
+                       started ones
+        :type exempt: set[str]
+
+        :rtype: ControlAdmission
+        """
+        reason = self.pressure()
+        self._update_reason(reason)
+
+        if reason is None:
+            return ControlAdmission(to_adjust, [], [], None)
+
+        step = self._config.max_increase_under_pressure
+        admitted, deferred, throttled = [], [], []
+
+        for app, profile, workers in to_adjust:
+            current = current_workers(app)
+
+            if app in exempt or current is None or workers <= current:
+                admitted.append((app, profile, workers))
+            elif step > 0:
+                admitted.append((app, profile, current + step))
+                throttled.append((app, profile, workers))
+            else:
+                deferred.append((app, profile, workers))
+
+        self.metrics_cnt['deferred_increases'] += len(deferred)
+        self.metrics_cnt['throttled_increases'] += len(throttled)
+
+        return ControlAdmission(admitted, deferred, throttled, reason)
+
+    def get_count_metrics(self):
+        metrics = dict(super(AdmissionController, self).get_count_metrics())
+        metrics.update(
+            enabled=self._config.enabled,
+            under_pressure=int(self.last_reason is not None),
+        )
+
+        return metrics
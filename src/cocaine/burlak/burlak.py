@@ -13,27 +13,34 @@
 #   - use coxx logger
 #   - secure service for 'unicorn'
 #
+import itertools
 import time
 
 from cocaine.exceptions import ServiceError
-from collections import namedtuple
+from collections import deque, namedtuple
 from datetime import timedelta
 
 from cerberus import Validator
 
-import six
-
 from tornado import gen
 from tornado import locks
+from tornado import queues
 
-from .chcache import ChannelsCache, close_tx_safe
+from .admission import AdmissionController
+from .chcache import ChannelsCache, CloseReason, close_tx_safe
+from .comm_state import States
 # Config imported for filter schema
 from .config import Config
 from .dumper import Dumper
 from .logger import ConsoleLogger, VoidLogger
 from .loop_sentry import LoopSentry
-from .metrics import MetricsSource
+from .metrics import Histogram, Hub, MetricsSource
+from .pipeline import AppLocks, ControlPipeline, ControlTask
+from .pipeline import acquire_slot, make_concurrency_limit
+from .ramp import WorkersRamp
+from .rate_limit import StartRateLimiter
 from .semaphore import LockHolder
+from .spooling import SpoolingWatcher
 
 from .mixins import *
 
@@ -50,6 +57,8 @@ SYNC_COMPLETION_TIMEOUT_SEC = 600
 
 INVALID_STATE_ERR_CODE = 6
 
+DEFAULT_APP_PRIORITY = 0
+
 
 # TODO(burlak): Decompose!
 DispatchMessage = namedtuple('DispatchMessage', [
@@ -69,6 +78,16 @@ DispatchMessage = namedtuple('DispatchMessage', [
 StateRecord = namedtuple('StateRecord', [
     'workers',
     'profile',
+    'priority',  # optional, apps with higher priority are processed first
+])
+StateRecord.__new__.__defaults__ = (DEFAULT_APP_PRIORITY,)
+
+
+"""Targets of not yet processed dispatch commands."""
+SupersedingPlan = namedtuple('SupersedingPlan', [
+    'state',
+    'to_run',
+    'is_state_updated',
 ])
 
 
@@ -96,21 +115,124 @@ def find_keys_with_prefix(data, prefixes):
     return search_trie(t, prefixes)
 
 
+def is_spooling_state(e):
+    """Check for spooling state with some heuristics.
+
+    Simple guess for now, should use exception error code and
+    category to distinguish among different possible state.
+
+        TODO: check for category
+    """
+    return \
+        isinstance(e, ServiceError) and \
+        e.code == INVALID_STATE_ERR_CODE
+
+
+def is_stop_superseded(app, newer):
+    """Check whether app should not be stopped due to newer plan.
+
+    App returned back to state shouldn't be stopped.
+    """
+    return app in newer.state
+
+
+def is_start_superseded(app, record, newer):
+    """Check whether app start is obsoleted by newer plan.
+
+    Start is obsolete if app has gone from newer state, or it would be
+    started with other profile by newer plan itself.
+    """
+    newer_record = newer.state.get(app)
+    if newer_record is None:
+        return True
+
+    return \
+        newer_record.profile != record.profile and \
+        app in newer.to_run
+
+
+def is_control_superseded(app, record, newer):
+    """Check whether app control is obsoleted by newer plan."""
+    newer_record = newer.state.get(app)
+    if newer_record is None:
+        return True
+
+    # Priority affects order of processing only, not the target itself.
+    changed = (newer_record.workers, newer_record.profile) != \
+        (record.workers, record.profile)
+
+    return changed and newer.is_state_updated
+
+
+def merge_dispatch_messages(messages):
+    """Fold dispatch messages into single one.
+
+    Newest state is used, apps to stop which have reappeared in newest state
+    are not stopped, apps to run are taken from all messages if they are
+    still in newest state, as for single message.
+
+    :param messages: dispatch messages, oldest first
+    :type messages: list[DispatchMessage]
+
+    :rtype: DispatchMessage
+    """
+    newest = messages[-1]
+    state_apps = set(newest.state.iterkeys())
+
+    def union(field, among=messages):
+        return set().union(*(getattr(msg, field) for msg in among))
+
+    return newest._replace(
+        is_state_updated=any(msg.is_state_updated for msg in messages),
+        to_hard_stop=union('to_hard_stop'),
+        to_stop=union('to_stop') - state_apps,
+        to_run=union('to_run') & state_apps,
+        runtime_reborn=any(msg.runtime_reborn for msg in messages),
+        workers_mismatch=union('workers_mismatch') & state_apps,
+        stop_again=union('stop_again'),
+    )
+
+
+def by_priority(apps, state):
+    """Order apps by priority in state, higher first, then by name."""
+    return sorted(apps, key=lambda app: (-state[app].priority, app))
+
+
 #
 # TODO: refactor someday as hugely inefficient and redundant conversion.
 #
-def transmute_and_filter_state(input_state):
+def app_priority(app, val, logger=None):
+    """Get priority of app state record, default one if it isn't valid."""
+    if 'priority' not in val:
+        return DEFAULT_APP_PRIORITY
+
+    try:
+        return int(val['priority'])
+    except (TypeError, ValueError, OverflowError):
+        if logger:
+            logger.warn(
+                'app {} has invalid priority {!r}, using default {}',
+                app, val['priority'], DEFAULT_APP_PRIORITY)
+
+        return DEFAULT_APP_PRIORITY
+
+
+def transmute_and_filter_state(input_state, logger=None):
     """Converts raw state dictionary to (app => StateRecords) mapping."""
     return {
-        app: StateRecord(int(val['workers']), str(val['profile']))
+        app: StateRecord(
+            int(val['workers']),
+            str(val['profile']),
+            app_priority(app, val, logger),
+        )
         for app, val in input_state.iteritems()
         if val['workers'] >= 0
     }
 
 
 class StateUpdateMessage(object):
-    def __init__(self, state, version, uuid):
-        self._state = transmute_and_filter_state(state)
+    def __init__(self, state, version, uuid, logger=None):
+        self._state = transmute_and_filter_state(state, logger)
         self._version = version
         self._uuid = uuid
 
@@ -155,6 +277,10 @@ class StateAcquirer(LoggerMixin, MetricsMixin, LoopSentry):
                         'type': 'integer',
                         'min': 0,
                     },
+                    'priority': {
+                        'type': 'integer',
+                        'required': False,
+                    },
                 },
             },
         },
@@ -286,7 +412,7 @@ class StateAcquirer(LoggerMixin, MetricsMixin, LoopSentry):
                     # StateUpdateMessage should throw in ctor on wrong state
                     # format
                     yield self.input_queue.put(
-                        StateUpdateMessage(state, version, uuid))
+                        StateUpdateMessage(state, version, uuid, self))
 
                     self.metrics_cnt['apps_in_last_state'] = len(state)
             except gen.TimeoutError as e:
@@ -315,7 +441,10 @@ class MetricsFetcher(LoggerMixin, MetricsMixin, LoopSentry):
         self.sentry_wrapper = context.sentry_wrapper
 
     def _fetch(self):
-        if not self._config.metrics.enabled:
+        # System metrics are required by admission control as well.
+        if not (
+                self._config.metrics.enabled or
+                self._config.admission.enabled):
             return
 
         now = time.time()
@@ -434,6 +563,10 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
             input_queue, control_queue, submitter,
             poll_interval_sec,
             workers_distribution,
+            roller=None,
+            damper=None,
+            smoother=None,
+            prewarmer=None,
             **kwargs):
         super(StateAggregator, self).__init__(context, **kwargs)
 
@@ -451,8 +584,26 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
         self.ci_state = ci_state
         self.workers_distribution = workers_distribution
 
+        self.roller = roller
+        self.damper = damper
+        self.smoother = smoother
+
+        # Opens control channels on state arrival, `AppsElysium` usually.
+        self.prewarmer = prewarmer
+
+        # Node run lock holder, shared with profile roller.
+        self.run_lock = LockHolder()
+
         self.status = context.shared_status.register(StateAggregator.TASK_NAME)
 
+    @property
+    def rolling_apps(self):
+        """Apps under control of profile roller."""
+        if self.roller is None:
+            return set()
+
+        return self.roller.busy
+
     def make_prof_update_set(self, prev_state, state):
         to_update = []
         # Detect apps profile change
@@ -605,12 +756,61 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
                 app, profile, state_version, now,
                 "app is in broken state")
 
+    def speculate_run_lock(self, semaphore, run_lock, state, running_apps):
+        """Start run lock acquisition for state with new apps.
+
+        Apps absent in last known running apps set would most likely be
+        started, so lock acquisition is started before node is queried for
+        running apps, to overlap lock wait with node requests.
+
+        :return: lock acquisition future or None if not speculated
+        """
+        if not self.context.config.dispatch.speculative_run_lock:
+            return None
+
+        if run_lock.has_lock or not state.viewkeys() - running_apps:
+            return None
+
+        self.debug('speculatively acquiring run lock')
+        self.metrics_cnt['run_lock_speculations'] += 1
+
+        return semaphore.try_to_acquire_lock(run_lock)
+
+    def prewarm_channels(self, state, running_apps):
+        """Start opening channels of apps in new state.
+
+        Channels are opened while node is queried for running apps, so last
+        known running apps set is used, apps to be started are skipped.
+        """
+        if self.prewarmer is None:
+            return
+
+        self.prewarmer.prewarm_channels(state.viewkeys() & running_apps)
+
+    def account_run_lock_speculation(self, run_lock, to_run):
+        if not run_lock.has_lock:
+            self.metrics_cnt['run_lock_speculation_failures'] += 1
+        elif to_run:
+            self.metrics_cnt['run_lock_speculation_hits'] += 1
+        else:
+            # Lock is released right away with no apps to run.
+            self.metrics_cnt['run_lock_speculation_misses'] += 1
+
     def reset_state(self, state):
         state.clear()
 
         self.ci_state.reset()
         self.workers_distribution.clear()
 
+        if self.roller is not None:
+            self.roller.clear()
+
+        if self.damper is not None:
+            self.damper.clear()
+
+        if self.smoother is not None:
+            self.smoother.clear()
+
     @gen.coroutine
     def dump_feedback_guarded(self):
         try:
@@ -630,7 +830,7 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
         last_uuid = None
         no_state_yet = True
 
-        run_lock = LockHolder()
+        run_lock = self.run_lock
 
         while self.should_run():
             self.status.mark_ok('listenning on incoming queue')
@@ -643,6 +843,8 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
             uuid, msg = None, None
             workers_mismatch, stop_again = set(), set()
 
+            speculative_lock = None
+
             try:
                 msg = yield self.input_queue.get(
                     timeout=timedelta(seconds=self.poll_interval_sec))
@@ -663,8 +865,21 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
                     state, state_version, uuid = msg.get_all()
                     is_state_updated = True
                     no_state_yet = False
+
+                    if self.ci_state.uuid not in (None, uuid):
+                        # Committed state (e.g. restored from snapshot)
+                        # belongs to other runtime.
+                        self.info(
+                            'dropping committed state of uuid {}',
+                            self.ci_state.uuid)
+                        self.ci_state.reset_output_state()
+
+                    self.ci_state.uuid = uuid
                     self.ci_state.set_incoming_state(state, state_version)
 
+                    if self.smoother is not None:
+                        state = self.smoother.smooth(state)
+
                     self.debug(
                         'disp::got state update with version {} uuid {}: {}',
                         state_version, uuid, state
@@ -695,6 +910,12 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
                     # nothing to do here, skipping next steps.
                     continue
 
+                if is_state_updated:
+                    self.prewarm_channels(state, running_apps)
+
+                    speculative_lock = self.speculate_run_lock(
+                        semaphore, run_lock, state, running_apps)
+
                 running_apps = yield self.get_running_apps_set()
                 self.info(
                     'last uuid {}, running apps {}',
@@ -702,6 +923,14 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
                 )
 
                 if not is_state_updated:
+                    # Held workers changes are dispatched as workers
+                    # mismatch once they persisted for dwell time.
+                    if self.smoother is not None:
+                        released = self.smoother.release(state)
+                        if released:
+                            state = dict(state)
+                            state.update(released)
+
                     (
                         workers_count,
                         workers_mismatch,
@@ -717,6 +946,11 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
                     self.mark_broken_apps(
                         state, broken.broken_in_state, state_version)
 
+                    if self.damper is not None:
+                        workers_mismatch = self.damper.damp(
+                            workers_mismatch, state)
+                        self.ci_state.mark_flapping(self.damper.flapping)
+
                     self.workers_distribution.clear()
                     self.workers_distribution.update(workers_count)
 
@@ -726,6 +960,12 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
                 self.error('failed to get control message with {}', e)
                 self.sentry_wrapper.capture_exception()
 
+            if speculative_lock is not None:
+                try:
+                    yield speculative_lock
+                except Exception as e:
+                    self.error('speculative run lock acquisition failed {}', e)
+
             # Note that in general following code (up to the end of the
             # method) shouldn't raise.
             if no_state_yet:
@@ -748,11 +988,41 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
             to_stop = running_apps - update_state_apps_set
             to_hard_stop = broken.broken
 
+            if is_state_updated:  # check for profiles change
+                to_update = set()
+
+                if self.roller is not None and self.roller.enabled:
+                    to_update = \
+                        self.make_prof_update_set(prev_state, state) & \
+                        running_apps
+                    self.roller.schedule(to_update, state, state_version)
+
+                prev_state = state
+                last_uuid = uuid
+
+                self.debug('profile update list {}', to_update)
+
+            # Apps being restarted with new profile are started and
+            # controlled by roller itself.
+            rolling_apps = self.rolling_apps
+            if rolling_apps:
+                self.debug('apps in rolling update {}', rolling_apps)
+
+                to_run -= rolling_apps
+                workers_mismatch -= rolling_apps
+
+            if speculative_lock is not None:
+                self.account_run_lock_speculation(run_lock, to_run)
+
             if to_run:
                 # If it is some apps to start.
                 if not run_lock.has_lock:  # not yet in `run_lock` state
-                    self.info('no run lock, trying to acquire')
-                    yield semaphore.try_to_acquire_lock(run_lock)
+                    # Lock was just tried speculatively, don't wait for it
+                    # twice within the iteration.
+                    if speculative_lock is None:
+                        self.info('no run lock, trying to acquire')
+                        yield semaphore.try_to_acquire_lock(run_lock)
+
                     if not run_lock.has_lock:
                         self.info(
                             'no free lock found, clearing to_run list {}',
@@ -770,23 +1040,6 @@ class StateAggregator(LoggerMixin, MetricsMixin, LoopSentry):
                 # and leave `run_lock` state.
                 yield semaphore.release_lock_holder(run_lock)
 
-            if is_state_updated:  # check for profiles change
-                #
-                # TODO(Profile update check): temporary disabled, should have
-                # more flexible schema profile update in future.
-                #
-                # to_update = self.make_prof_update_set(prev_state, state)
-                #
-                to_update = set()
-
-                to_run.update(to_update)
-                to_stop.update(to_update)
-
-                prev_state = state
-                last_uuid = uuid
-
-                self.debug('profile update list {}', to_update)
-
             self.info("to_stop apps list {}", to_stop)
             self.info("to_run apps list {}", to_run)
             self.info("to_hard_stop apps list {}", to_hard_stop)
@@ -825,7 +1078,9 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
     TASK_NAME = 'tasks_dispatch'
 
     def __init__(
-            self, context, ci_state, node, control_queue, submitter, **kwargs):
+            self, context, ci_state, node, control_queue, submitter,
+            admission=None, workers_distribution=None, roller=None,
+            **kwargs):
         super(AppsElysium, self).__init__(context, **kwargs)
 
         self.context = context
@@ -839,14 +1094,234 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
         self.submitter = submitter
         self.status = context.shared_status.register(AppsElysium.TASK_NAME)
 
-        self.channels_cache = ChannelsCache(self, node)
+        self.channels_cache = ChannelsCache(self, node, context.config)
+        # Limits count of channels opened in background, both pre-warmed
+        # and re-opened.
+        self.prewarm_limit = make_concurrency_limit(
+            context.config.channels_cache.prewarm_concurrency)
+
+        # Limits count of concurrent node requests within dispatch stages.
+        self.concurrency_limit = make_concurrency_limit(
+            context.config.dispatch.max_concurrency)
+
+        # Serializes writes to (and acks from) shared app control channel
+        # between dispatch, workers ramp and spooling retries.
+        self.app_locks = AppLocks()
+
+        self.control_pipeline = ControlPipeline(
+            self.channels_cache,
+            self.concurrency_limit,
+            context.config.api_timeout,
+            self.app_locks)
+
+        self.start_limiter = StartRateLimiter(context.config.start_rate_limit)
+
+        # Without system metrics hub everything would be admitted.
+        self.admission = admission \
+            if admission is not None else AdmissionController(context, Hub())
+
+        # Without runtime workers distribution ramp steps are confirmed by
+        # timeout only.
+        self.ramp = WorkersRamp(
+            context,
+            workers_distribution if workers_distribution is not None
+            else dict())
+
+        # Dispatch commands already taken from `control_queue`, but not yet
+        # processed.
+        self.pending_commands = deque()
+
+        # Time from start initiation up to first control acknowledged by
+        # started app.
+        self.time_to_first_worker = Histogram()
+
+        self.spooling = SpoolingWatcher(context)
+
+        # Apps stopped by zero workers control, updated in place.
+        self.stopped_by_control = set()
+
+        # Apps restored from snapshot, used to skip controls already applied
+        # before restart.
+        self.restored_apps = set()
+
+        # Apps being restarted with new profile are controlled by roller.
+        self.roller = roller
+
+    @property
+    def rolling_apps(self):
+        """Apps under control of profile roller."""
+        if self.roller is None:
+            return set()
+
+        return self.roller.busy
+
+    def restore(self, apps, stopped_by_control):
+        """Restore control state saved before restart.
+
+        :param apps: apps of restored committed state
+        :type apps: iterable[str]
+
+        :param stopped_by_control: apps stopped by zero workers control
+        :type stopped_by_control: set[str]
+        """
+        self.restored_apps = set(apps)
+
+        self.stopped_by_control.clear()
+        self.stopped_by_control.update(stopped_by_control)
+
+    def skip_restored_controls(self, to_control, state):
+        """Filter out controls applied before restart.
+
+        Used for the first state update after restore only: app is not
+        controlled if its committed record is started with the same workers
+        count and profile as requested by the state.
+        """
+        restored, self.restored_apps = self.restored_apps, set()
+        committed = self.ci_state.as_dict()
+
+        def is_applied(app):
+            record = committed.get(app)
+            return \
+                record is not None and \
+                record.state == States.STARTED and \
+                record.workers == state[app].workers and \
+                record.profile == state[app].profile
+
+        skipped = {
+            app for app in to_control & restored & state.viewkeys()
+            if is_applied(app)
+        }
+
+        if skipped:
+            self.info(
+                'skipping controls applied before restart for {} apps',
+                len(skipped))
+            self.metrics_cnt['restored_controls_skipped'] += len(skipped)
+
+        return to_control - skipped
+
+    def _drain_control_queue(self):
+        """Move all queued commands to `pending_commands`."""
+        while True:
+            try:
+                command = self.control_queue.get_nowait()
+            except queues.QueueEmpty:
+                break
+
+            self.control_queue.task_done()
+            self.pending_commands.append(command)
+
+    @gen.coroutine
+    def next_command(self):
+        """Get next command to process, pending commands go first."""
+        if self.pending_commands:
+            raise gen.Return(self.pending_commands.popleft())
+
+        command = yield self.control_queue.get()
+        self.control_queue.task_done()
+
+        raise gen.Return(command)
+
+    def merge_pending(self, command):
+        """Fold dispatch commands waiting for processing into `command`.
+
+        :type command: DispatchMessage
+
+        :rtype: DispatchMessage
+        """
+        if not self.context.config.dispatch.merge_pending_rounds:
+            return command
+
+        self._drain_control_queue()
+
+        to_merge = [command]
+        while self.pending_commands and \
+                isinstance(self.pending_commands[0], DispatchMessage):
+            to_merge.append(self.pending_commands.popleft())
+
+        if len(to_merge) == 1:
+            return command
+
+        merged = merge_dispatch_messages(to_merge)
+
+        self.info(
+            'merged {} pending dispatch commands, newest version {}',
+            len(to_merge), merged.state_version)
+
+        self.metrics_cnt['merged_rounds'] += 1
+        self.metrics_cnt['merged_commands'] += len(to_merge) - 1
+        self.metrics_cnt['merged_commands_max'] = max(
+            self.metrics_cnt['merged_commands_max'], len(to_merge))
+
+        return merged
+
+    def superseding_plan(self):
+        """Get targets of dispatch commands waiting for processing.
+
+        :return: plan with newest state, or None if no command is pending
+        :rtype: SupersedingPlan | None
+        """
+        if not self.context.config.supersede_stale_rounds:
+            return None
+
+        self._drain_control_queue()
+
+        pending = [
+            command for command in self.pending_commands
+            if isinstance(command, DispatchMessage)
+        ]
+
+        if not pending:
+            return None
+
+        return SupersedingPlan(
+            pending[-1].state,
+            set().union(*(command.to_run for command in pending)),
+            any(command.is_state_updated for command in pending),
+        )
+
+    def drop_superseded(self, apps, is_superseded, metric_name):
+        """Filter out apps with targets changed by pending commands.
+
+        :param apps: apps to filter
+        :type apps: iterable
+
+        :param is_superseded: predicate over (app, newer plan)
+        :type is_superseded: callable
+
+        :param metric_name: counter of skipped commands
+        :type metric_name: str
+
+        :return: apps which targets are still actual
+        :rtype: set[str]
+        """
+        apps = set(apps)
+
+        newer = self.superseding_plan()
+        if newer is None:
+            return apps
+
+        superseded = {app for app in apps if is_superseded(app, newer)}
+        if superseded:
+            self.info(
+                'skipping {} superseded by pending commands: {}',
+                metric_name, superseded)
+
+            self.metrics_cnt[metric_name] += len(superseded)
+            self.metrics_cnt['superseded_commands_skipped'] += \
+                len(superseded)
+
+        return apps - superseded
 
     @gen.coroutine
     def start(self, app, profile, state_version, tm, started=None):
         """Try to start application with specified profile."""
         try:
-            ch = yield self.node_service.start_app(app, profile)
-            yield ch.rx.get(timeout=self.context.config.api_timeout_by2)
+            yield self.start_limiter.acquire(profile)
+
+            with (yield acquire_slot(self.concurrency_limit)):
+                ch = yield self.node_service.start_app(app, profile)
+                yield ch.rx.get(timeout=self.context.config.api_timeout_by2)
         except Exception as e:
             self.metrics_cnt['errors_start_app'] += 1
             self.status.mark_warn('failed to start application')
@@ -874,8 +1349,9 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
     def slay(self, app, state_version, tm, *unused):
         """Stop/pause application."""
         try:
-            ch = yield self.node_service.pause_app(app)
-            yield ch.rx.get(timeout=self.context.config.api_timeout)
+            with (yield acquire_slot(self.concurrency_limit)):
+                ch = yield self.node_service.pause_app(app)
+                yield ch.rx.get(timeout=self.context.config.api_timeout)
 
             self.ci_state.mark_stopped(app, state_version, tm)
             self.metrics_cnt['apps_stopped'] += 1
@@ -938,26 +1414,26 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
     @gen.coroutine
     def write_to_channel(self, app, to_adjust):
         self.debug('control command to {} with {}', app, to_adjust)
-        ch = yield self.channels_cache.get_ch(app)
-        yield self.control_with_ack(ch, to_adjust)
 
-    @gen.coroutine
-    def adjust_by_channel(
-            self, app, profile, to_adjust, state_version, tm):
+        # App lock is taken before concurrency slot, so waiting for other
+        # writer of the same app doesn't hold a slot.
+        with (yield self.app_locks.acquire(app)):
+            with (yield acquire_slot(self.concurrency_limit)):
+                ch = yield self.channels_cache.get_ch(app)
 
-        def is_spooling_state(e):
-            """Check for spooling state with some heuristics.
+                try:
+                    yield self.control_with_ack(ch, to_adjust)
+                except Exception:
+                    self.channels_cache.mark_error(app)
+                    raise
 
-            Simple guess for now, should use exception error code and
-            category to distinguish among different possible state.
+                self.channels_cache.mark_ack(app)
 
-                TODO: check for category
-            """
-            return \
-                isinstance(e, ServiceError) and \
-                e.code == INVALID_STATE_ERR_CODE
+    @gen.coroutine
+    def adjust_by_channel(
+            self, app, profile, to_adjust, state_version, tm,
+            attempts=CONTROL_RETRY_ATTEMPTS):
 
-        attempts = CONTROL_RETRY_ATTEMPTS
         while attempts:
             try:
                 yield self.write_to_channel(app, to_adjust)
@@ -967,7 +1443,9 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
                         'seems that app {} is in spooling state: {}', app, e)
                     self.ci_state.mark_pending_start(
                         app, to_adjust, profile, state_version, tm)
-                    yield self.channels_cache.close_and_remove([app])
+                    self.spooling.watch(app, profile, to_adjust, state_version)
+                    yield self.channels_cache.close_and_remove(
+                        [app], CloseReason.SPOOLING)
                     break
 
                 attempts -= 1
@@ -983,7 +1461,9 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
                 self.metrics_cnt['errors_of_control'] += 1
                 self.sentry_wrapper.capture_exception()
 
-                yield self.channels_cache.close_and_remove([app])
+                # Failed channel is already suspected by `write_to_channel`,
+                # it is re-opened while waiting for retry.
+                self.channels_cache.heal(self.prewarm_limit)
                 yield gen.sleep(DEFAULT_RETRY_EXP_BASE_SEC)
 
                 self.ci_state.mark_failed(
@@ -991,6 +1471,8 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
             else:
                 self.ci_state.mark_running(
                     app, to_adjust, profile, state_version, tm)
+                # Spooling app (if any) has been controlled by regular round.
+                self.spooling.resolved(app)
 
                 self.debug(
                     'have adjusted workers count for app {} to {}',
@@ -998,26 +1480,456 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
 
                 break
 
+    @gen.coroutine
+    def adjust_many(self, to_adjust, state_version, tm):
+        """Adjust workers count of many apps at once.
+
+        If `control_pipeline` is enabled commands are sent with
+        `ControlPipeline`, failed and timed out commands are retried with
+        `adjust_by_channel`.
+
+        :param to_adjust: list of (app, profile, workers) records
+        :type to_adjust: list[(str, str, int)]
+        """
+        if not self.context.config.dispatch.control_pipeline:
+            yield [
+                self.adjust_by_channel(
+                    app, profile, workers, state_version, tm)
+                for app, profile, workers in to_adjust
+            ]
+            return
+
+        result = yield self.control_pipeline.send([
+            ControlTask(app, workers, profile, state_version)
+            for app, profile, workers in to_adjust
+        ])
+
+        for ack in result.acked:
+            task = ack.task
+            self.channels_cache.mark_ack(task.app)
+            self.ci_state.mark_running(
+                task.app, task.workers, task.profile, task.state_version, tm)
+            self.spooling.resolved(task.app)
+
+        self.metrics_cnt['control_pipeline_acked'] += len(result.acked)
+        self.metrics_cnt['control_pipeline_max_in_flight'] = \
+            self.control_pipeline.max_in_flight
+
+        to_retry, spooling = [], []
+        for task, e in result.failed:
+            if is_spooling_state(e):
+                self.warn(
+                    'seems that app {} is in spooling state: {}', task.app, e)
+                self.ci_state.mark_pending_start(
+                    task.app, task.workers, task.profile,
+                    task.state_version, tm)
+                self.spooling.watch(
+                    task.app, task.profile, task.workers, task.state_version)
+                spooling.append(task.app)
+                continue
+
+            self.error(
+                'send control has been failed for app `{}`, workers {}, '
+                'error: {}', task.app, task.workers, e)
+            to_retry.append(task)
+
+        if result.timed_out:
+            timed_out_apps = [task.app for task in result.timed_out]
+
+            error_message = 'control ack timeout for {} app(s): {}'.format(
+                len(timed_out_apps), timed_out_apps)
+
+            self.error(error_message)
+            self.sentry_wrapper.capture_message(error_message)
+
+            self.metrics_cnt['control_ack_timeouts'] += len(timed_out_apps)
+            to_retry.extend(result.timed_out)
+
+        # Stale acks could be received on timed out channels, so all failed
+        # channels are closed, retries would open new ones.
+        if spooling:
+            yield self.channels_cache.close_and_remove(
+                spooling, CloseReason.SPOOLING)
+        if to_retry:
+            yield self.channels_cache.close_and_remove(
+                [task.app for task in to_retry], CloseReason.FAILED)
+
+        if not to_retry:
+            return
+
+        self.status.mark_crit('failed to send control command')
+        self.metrics_cnt['errors_of_control'] += len(to_retry)
+
+        for task in to_retry:
+            self.ci_state.mark_failed(
+                task.app, task.profile, task.state_version, tm,
+                'send control has been failed, retrying')
+
+        yield gen.sleep(DEFAULT_RETRY_EXP_BASE_SEC)
+        yield [
+            self.adjust_by_channel(
+                task.app, task.profile, task.workers, task.state_version, tm,
+                attempts=CONTROL_RETRY_ATTEMPTS - 1)
+            for task in to_retry
+        ]
+
+    @gen.coroutine
+    def control_started(
+            self, app, record, state_version, tm, start_future, started):
+        """Send control to app as soon as its start is completed.
+
+        :param record: app record in state
+        :type record: StateRecord
+
+        :param tm: start initiation time, used for time to first worker
+        :type tm: float
+
+        :param start_future: start request of the app
+        :type start_future: tornado.concurrent.Future
+        """
+        yield start_future
+
+        if app not in started:
+            return
+
+        # Newer state could be arrived while app was starting.
+        if not self.drop_superseded(
+                [app],
+                lambda app, newer: is_control_superseded(app, record, newer),
+                'superseded_controls_skipped'):
+            return
+
+        to_adjust = self.ramp.plan(
+            [(app, record.profile, int(record.workers))],
+            state_version,
+            self.applied_workers,
+            exempt={app})
+
+        yield self.adjust_many(to_adjust, state_version, time.time())
+
+        if self.applied_workers(app) is not None:
+            self.time_to_first_worker.observe(time.time() - tm)
+
+    @gen.coroutine
+    def control_running(self, apps, state, state_version):
+        """Adjust workers count of already running apps.
+
+        :param apps: apps to control
+        :type apps: set[str]
+
+        :param state: current state
+        :type state: dict[str, StateRecord]
+        """
+        tm = time.time()
+
+        admission = self.admission.admit_controls(
+            [
+                (app, state[app].profile, int(state[app].workers))
+                for app in by_priority(apps, state)
+            ],
+            self.applied_workers)
+
+        to_adjust = self.ramp.plan(
+            admission.admitted, state_version, self.applied_workers)
+
+        yield self.adjust_many(to_adjust, state_version, tm)
+
+        self.mark_deferred(
+            admission.deferred, state_version, tm,
+            'workers increase', admission.reason)
+        self.mark_deferred(
+            admission.throttled, state_version, tm,
+            'part of workers increase', admission.reason)
+
+    def applied_workers(self, app):
+        """Workers count of started app, None if app isn't started."""
+        record = self.ci_state.as_dict().get(app)
+        if record is None or record.state != States.STARTED:
+            return None
+
+        return record.workers
+
+    def mark_deferred(self, deferred, state_version, tm, what, reason):
+        """Mark deferred by admission control apps in committed state.
+
+        :param deferred: list of (app, profile, workers) records
+        """
+        description = '{} deferred: {}'.format(what, reason)
+        for app, profile, workers in deferred:
+            self.ci_state.mark_deferred(
+                app, workers, profile, state_version, tm, description)
+
+        if deferred:
+            self.info(
+                '{} deferred for {} app(s) due to host pressure: {}',
+                what, len(deferred), reason)
+
+    @gen.coroutine
+    def ramp_up(self):
+        """Workers ramp-up steps processing loop."""
+        while self.should_run():
+            try:
+                # Steps are workers increases, as other increases they are
+                # postponed while host is under pressure.
+                reason = self.admission.pressure()
+                if reason is None:
+                    to_write = self.ramp.due_steps(
+                        lambda app: self.applied_workers(app) is not None)
+                else:
+                    to_write = []
+                    if self.ramp.ramps:
+                        self.debug('ramp-up steps postponed: {}', reason)
+                        self.metrics_cnt['ramp_steps_postponed'] += 1
+
+                if to_write:
+                    self.info('making {} ramp-up step(s)', len(to_write))
+
+                    tm = time.time()
+                    yield [
+                        self.adjust_by_channel(
+                            app, profile, workers, state_version, tm)
+                        for app, profile, workers, state_version in to_write
+                    ]
+
+                    yield self.submitter.post_committed_state()
+            except Exception as e:  # pragma nocover
+                self.error('failed to make ramp-up steps: {}', e)
+                self.sentry_wrapper.capture_exception()
+
+            yield gen.sleep(self.context.config.ramp.interval_sec)
+
+    @gen.coroutine
+    def retry_spooling(self, app, record):
+        """Retry pending control of spooling app.
+
+        :type record: spooling.SpoolingRecord
+
+        :return: whether app has left spooling state
+        :rtype: bool
+        """
+        committed = self.ci_state.as_dict().get(app)
+        if committed is None or committed.state != States.SPOOLING:
+            # App has been stopped or controlled by regular round.
+            self.spooling.forget(app)
+            raise gen.Return(False)
+
+        try:
+            yield self.write_to_channel(app, record.workers)
+        except Exception as e:
+            yield self.channels_cache.close_and_remove(
+                [app], CloseReason.FAILED)
+
+            if is_spooling_state(e):
+                self.debug('app {} is still spooling', app)
+                self.spooling.backoff(app)
+            else:
+                self.warn(
+                    'failed to retry control of spooling app {}: {}', app, e)
+                self.metrics_cnt['errors_spooling_retry'] += 1
+                self.spooling.forget(app)
+
+            raise gen.Return(False)
+
+        self.ci_state.mark_running(
+            app, record.workers, record.profile, record.state_version,
+            time.time())
+
+        spent = self.spooling.resolved(app)
+        self.info(
+            'app {} has left spooling state in {:.3f}s, workers {}',
+            app, spent, record.workers)
+
+        raise gen.Return(True)
+
+    @gen.coroutine
+    def watch_spooling(self):
+        """Spooling apps control retry loop."""
+        while self.should_run():
+            try:
+                due = self.spooling.due()
+                if due:
+                    recovered = yield [
+                        self.retry_spooling(app, record)
+                        for app, record in due
+                    ]
+
+                    if any(recovered):
+                        yield self.submitter.post_committed_state()
+            except Exception as e:  # pragma nocover
+                self.error('failed to retry spooling apps control: {}', e)
+                self.sentry_wrapper.capture_exception()
+
+            yield gen.sleep(self.context.config.spooling.initial_delay_sec)
+
+    def prewarm_channels(self, apps):
+        """Start opening channels of apps to be controlled in background.
+
+        :param apps: running apps to be controlled soon, control channel
+                     couldn't be opened to not running app
+        :type apps: iterable[str]
+        """
+        if not self.context.config.channels_cache.prewarm:
+            return
+
+        self.channels_cache.prewarm(apps, self.prewarm_limit)
+
+    @gen.coroutine
+    def sweep_channels(self):
+        """Channels cache sweeping loop."""
+        while self.should_run():
+            try:
+                # Empty (or not yet known) desired state is no reason to
+                # close channels, they are closed on apps stop anyway.
+                desired_apps = \
+                    self.ci_state.incoming_state['state'].viewkeys() or None
+
+                closed = yield self.channels_cache.sweep(desired_apps)
+                if closed:
+                    self.ci_state.channels_cache_apps = \
+                        self.channels_cache.apps()
+            except Exception as e:  # pragma nocover
+                self.error('failed to sweep channels cache: {}', e)
+                self.sentry_wrapper.capture_exception()
+
+            yield gen.sleep(
+                self.context.config.channels_cache.sweep_interval_sec)
+
     def mark_pending_stop(self, to_stop, state_version):
         now = time.time()
         for app in to_stop:
             self.ci_state.mark_pending_stop(app, state_version, now)
 
 
+    def get_count_metrics(self):
+        metrics = dict(super(AppsElysium, self).get_count_metrics())
+        metrics.update(
+            time_to_first_worker=self.time_to_first_worker.as_dict(),
+            channels_cache=self.channels_cache.get_metrics())
+
+        return metrics
+
+    @gen.coroutine
+    def stop_hard_one(self, ch_cache, app, state_version, tm):
+        """Close app control channel and stop app by node service.
+
+        Stuck channel close is abandoned after api timeout, so it could
+        delay the pause of own app only.
+        """
+        try:
+            with (yield acquire_slot(self.concurrency_limit)):
+                yield gen.with_timeout(
+                    timedelta(seconds=self.context.config.api_timeout),
+                    ch_cache.close_and_remove([app], CloseReason.STOPPED))
+        except Exception as e:
+            self.error('failed to close channel of app {}: {}', app, e)
+            self.metrics_cnt['errors_hard_stop_close'] += 1
+
+        yield self.slay(app, state_version, tm)
+
     @gen.coroutine
     def stop_hard(self, ch_cache, to_hard_stop, state_version):
         """Stop applications by node server stop command."""
         tm = time.time()
-        yield ch_cache.close_and_remove(to_hard_stop)
         yield [
-            self.slay(app, state_version, tm) for app in to_hard_stop
+            self.stop_hard_one(ch_cache, app, state_version, tm)
+            for app in to_hard_stop
         ]
         self.metrics_cnt['stopped_hard'] = len(to_hard_stop)
 
+    @gen.coroutine
+    def stop_hard_after(self, stopping, app, state_version, tm):
+        """Stop app by node service when its control stop (if any) is done.
+
+        :param stopping: control stop future of the app or None
+        :type stopping: tornado.concurrent.Future | None
+        """
+        if stopping is not None:
+            yield stopping
+
+        yield self.stop_hard_one(self.channels_cache, app, state_version, tm)
+
+    def stop_many(
+            self, to_stop, to_hard_stop, state_version, stopped_by_control):
+        """Stop apps by control and broken apps by node service.
+
+        Stops are run per app: hard stop of an app follows its own control
+        stop only, so stops of different apps don't wait for each other.
+
+        :return: stop future of every app being stopped
+        :rtype: dict[str, tornado.concurrent.Future]
+        """
+        tm = time.time()
+
+        stopping = {
+            app: self.stop_by_control(
+                app,
+                state_version,
+                tm,
+                stopped_by_control,
+            )
+            for app in to_stop
+        }
+
+        self.debug('stopping hard, apps {}', to_hard_stop)
+
+        for app in to_hard_stop:
+            stopping[app] = self.stop_hard_after(
+                stopping.get(app), app, state_version, tm)
+
+        self.metrics_cnt['stopped_hard'] = len(to_hard_stop)
+
+        return stopping
+
+    @gen.coroutine
+    def start_after(self, after, app, profile, state_version, tm, started):
+        """Start application when futures it depends on are resolved.
+
+        :param after: stop future of the app (if any) and start futures of
+                      apps with higher priority
+        :type after: list[tornado.concurrent.Future]
+        """
+        yield after
+        yield self.start(app, profile, state_version, tm, started)
+
+    def start_by_priority(
+            self, apps, state, stopping, state_version, tm, started):
+        """Start apps in tiers of the same priority.
+
+        Apps of the same priority are started concurrently (within
+        concurrency limit), apps of lower priority are started once all
+        starts of higher priority are done.
+
+        :param stopping: stop futures of apps being stopped
+        :type stopping: dict[str, tornado.concurrent.Future]
+
+        :return: start future of every app
+        :rtype: dict[str, tornado.concurrent.Future]
+        """
+        starts, higher = dict(), []
+
+        for _, tier in itertools.groupby(
+                by_priority(apps, state), key=lambda app: state[app].priority):
+            tier_starts = []
+
+            for app in tier:
+                after = list(higher)
+                if app in stopping:
+                    after.append(stopping[app])
+
+                starts[app] = self.start_after(
+                    after, app, state[app].profile, state_version, tm,
+                    started)
+                tier_starts.append(starts[app])
+
+            # Higher tiers are awaited by previous tier itself.
+            higher = tier_starts
+
+        return starts
+
     @gen.coroutine
     def blessing_road(self, semaphore):
         """Scheduler control commands processing loop."""
-        stopped_by_control = set()
+        stopped_by_control = self.stopped_by_control
 
         while self.should_run():
             try:
@@ -1025,8 +1937,7 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
                 self.debug(info_message)
                 self.status.mark_ok(info_message)
 
-                command = yield self.control_queue.get()
-                self.control_queue.task_done()
+                command = yield self.next_command()
 
                 if not isinstance(command, DispatchMessage):
                     error_message = 'wrong command type in control subsystem'
@@ -1036,39 +1947,44 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
                     self.status.mark_failed(error_message)
                     continue
 
+                command = self.merge_pending(command)
+
                 self.debug('control task: {}', command._asdict())
                 self.status.mark_ok('processing control command')
                 self.ci_state.version = command.state_version
 
                 if command.runtime_reborn:
                     stopped_by_control.clear()
+                    self.restored_apps.clear()
+
+                    # Channels opened before runtime restart are dead,
+                    # re-open them before they are needed by control.
+                    self.channels_cache.invalidate()
+                    self.channels_cache.heal(self.prewarm_limit)
 
-                stopped_by_control = stopped_by_control - command.stop_again
+                stopped_by_control.difference_update(command.stop_again)
 
                 #
                 # Control commands follows
                 #
+                # Stops are run concurrently with starts of other apps, apps
+                # being stopped are started after their own stop only.
+                stopping = dict()
+
                 if self.context.config.stop_apps:  # False by default
 
                     self.status.mark_ok('stopping apps')
-                    tm = time.time()
-
-                    yield [
-                        self.stop_by_control(
-                            app,
-                            command.state_version,
-                            tm,
-                            stopped_by_control,
-                        )
-                        for app in command.to_stop
-                    ]
 
-                    self.debug('stopping hard, apps {}', command.to_hard_stop)
+                    to_stop = self.drop_superseded(
+                        command.to_stop,
+                        is_stop_superseded,
+                        'superseded_stops_skipped')
 
-                    yield self.stop_hard(
-                        self.channels_cache,
+                    stopping = self.stop_many(
+                        to_stop,
                         command.to_hard_stop,
-                        command.state_version
+                        command.state_version,
+                        stopped_by_control,
                     )
 
                 elif command.to_stop or command.to_hard_stop:
@@ -1093,15 +2009,77 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
 
                 started = set()
 
+                to_run = self.drop_superseded(
+                    (app for app in command.to_run if app in command.state),
+                    lambda app, newer: is_start_superseded(
+                        app, command.state[app], newer),
+                    'superseded_starts_skipped')
+
                 tm = time.time()
-                yield [
-                    self.start(
-                        app,
-                        command.state[app].profile, command.state_version,
-                        tm,
-                        started)
-                    for app in command.to_run if app in command.state
+
+                admitted, deferred_starts, reason = \
+                    self.admission.admit_starts(
+                        by_priority(to_run, command.state))
+                self.mark_deferred(
+                    [
+                        (app, command.state[app].profile, 0)
+                        for app in deferred_starts
+                    ],
+                    command.state_version, tm, 'start', reason)
+
+                to_run = set(admitted)
+
+                # Send control to every app in state if state was updated,
+                # otherwise to apps with workers mismatch only. Apps being
+                # started are controlled by own pipeline right after start.
+                to_control = set(command.state.viewkeys()) \
+                    if command.is_state_updated \
+                    else set(command.workers_mismatch)
+                to_control -= to_run
+                to_control -= set(deferred_starts)
+
+                # Roller could take apps after dispatch message was made.
+                rolling_apps = self.rolling_apps
+                to_control -= rolling_apps
+
+                to_control = self.drop_superseded(
+                    (app for app in to_control if app in command.state),
+                    lambda app, newer: is_control_superseded(
+                        app, command.state[app], newer),
+                    'superseded_controls_skipped')
+
+                if self.restored_apps and command.is_state_updated:
+                    to_control = self.skip_restored_controls(
+                        to_control, command.state)
+
+                # Note that set is updated inplace, as it is shared with
+                # running stop phase.
+                stopped_by_control.difference_update(
+                    (to_control | to_run) - rolling_apps)
+                self.debug('stopped_by_control {}', stopped_by_control)
+
+                self.metrics_cnt['to_control'] = len(to_control | to_run)
+
+                self.debug(
+                    'control command will be send for apps: {}', to_control)
+
+                self.status.mark_ok('starting apps and adjusting workers')
+
+                starts = self.start_by_priority(
+                    admitted, command.state, stopping, command.state_version,
+                    tm, started)
+
+                pipelines = [
+                    self.control_started(
+                        app, command.state[app], command.state_version,
+                        tm, starts[app], started)
+                    for app in admitted
                 ]
+                pipelines.append(
+                    self.control_running(
+                        to_control, command.state, command.state_version))
+
+                yield starts.values()
 
                 if started:
                     delta = time.time() - tm
@@ -1109,51 +2087,28 @@ class AppsElysium(LoggerMixin, MetricsMixin, LoopSentry):
                         'applications started in {:.3f}s: {}', delta, started
                     )
 
+                failed_to_start = to_run - started
+                if failed_to_start:  # pragma nocover
+                    self.warn(
+                        'control command will be skipped for '
+                        'failed to start apps: {}',
+                        failed_to_start)
+
                 # Reset the run lock, if some app need to be (re)started,
                 # it will be lock acquire attempt on next round.
                 yield semaphore.release_lock_holder(command.run_lock)
 
-                failed_to_start = command.to_run - started
-                started = started | command.workers_mismatch
+                yield pipelines
 
-                # Send control to every app in state, except known for
-                # start up fail.
-                to_control = set(command.state.viewkeys()) \
-                    if command.is_state_updated else started
+                yield stopping.values()
 
-                stopped_by_control = stopped_by_control - to_control
-                self.debug('stopped_by_control {}', stopped_by_control)
-
-                self.metrics_cnt['to_control'] = len(to_control)
                 self.metrics_cnt['stopped_by_control'] = \
                     len(stopped_by_control)
 
-                self.debug(
-                    'control command will be send for apps: {}', to_control)
-
-                if failed_to_start:  # pragma nocover
-                    self.warn(
-                        'control command will be skipped for '
-                        'failed to start apps: {}',
-                        failed_to_start)
-
-                self.status.mark_ok('adjusting workers count')
-                tm = time.time()
-                yield [
-                    self.adjust_by_channel(
-                        app,
-                        state_record.profile,
-                        int(state_record.workers),
-                        command.state_version, tm)
-                    for app, state_record in six.iteritems(command.state)
-                    if app in to_control and
-                    app not in failed_to_start
-                ]
-
                 self.ci_state.channels_cache_apps = self.channels_cache.apps()
 
                 self.metrics_cnt['state_updates'] += 1
-                self.metrics_cnt['ch_cache_size'] += len(self.channels_cache)
+                self.metrics_cnt['ch_cache_size'] = len(self.channels_cache)
 
                 yield self.submitter.post_committed_state()
 
@@ -2,16 +2,18 @@
 #
 #   - clear closed channels on get_ch (separate method?)
 #   - tests
-#   - metrics
 #
 import time
-from collections import namedtuple
-from itertools import ifilter
+from collections import OrderedDict, defaultdict, namedtuple
+from itertools import ifilter, islice
 
 from cocaine.services import Service
 
 from tornado import gen
 
+from .metrics import Histogram
+from .pipeline import acquire_slot
+
 
 @gen.coroutine
 def close_tx_safe(ch, logger=None):  # pragma nocover
@@ -67,21 +69,255 @@ class _AppsCache(object):
         return len(self.apps)
 
 
+class CloseReason(object):
+    REMOVED = 'removed'
+    STOPPED = 'stopped'
+    FAILED = 'failed'
+    SPOOLING = 'spooling'
+    RESTART = 'restart'
+    REOPENED = 'reopened'
+    LRU = 'lru'
+    IDLE = 'idle'
+    ORPHAN = 'orphan'
+
+
 class ChannelsCache(object):
-    def __init__(self, logger, node_service):
-        self.channels = dict()
+    """Apps control channels cache.
+
+    With `channels_cache` config section enabled cache is bounded: on
+    overflow of `max_size` least recently used channels are evicted, channels
+    idle for `idle_ttl_sec` and channels of apps not in desired state are
+    closed by `sweep`.
+
+    Channels failed on write or ack (or all of channels on runtime restart)
+    are suspected dead and could be re-opened in background with `heal`,
+    requests for such channels wait for re-open to complete.
+
+    Channels of apps to be controlled could be opened in advance with
+    `prewarm`.
+    """
+
+    AGE_BUCKETS_MS = tuple(
+        1000 * sec for sec in (10, 60, 300, 900, 3600, 6 * 3600, 24 * 3600))
+
+    def __init__(self, logger, node_service, config=None, clock=time.time):
+        # Ordered from least to most recently used.
+        self.channels = OrderedDict()
         self.logger = logger
         self.node_service = node_service
 
+        self._app_config = config
+        self._clock = clock
+
+        self.created_at = dict()
+        self.used_at = dict()
+
+        # Channels health.
+        self.last_ack_at = dict()
+        self.errors = dict()
+        self.suspected = set()
+        # Channels being opened in background (re-opened or pre-warmed).
+        self.opening = dict()
+        self.prewarmed = set()
+
+        # Maps close reason to count of closed channels.
+        self.closed = defaultdict(int)
+        self.health_cnt = defaultdict(int)
+
+        self.hits = 0
+        self.misses = 0
+
+        self.open_latency = Histogram()
+        self.close_latency = Histogram()
+        self.lifetime = Histogram(self.AGE_BUCKETS_MS)
+
+    @property
+    def bounded(self):
+        return \
+            self._app_config is not None and \
+            self._app_config.channels_cache.enabled
+
+    def _touch(self, app):
+        self.channels[app] = self.channels.pop(app)
+        self.used_at[app] = self._clock()
+
     @gen.coroutine
-    def close_and_remove(self, to_remove):
-        cnt = 0
+    def _open(self, app):
+        started = self._clock()
+        ch = yield self.node_service.control(app)
+        self.open_latency.observe(self._clock() - started)
+
+        raise gen.Return(ch)
+
+    @gen.coroutine
+    def _close(self, ch):
+        started = self._clock()
+        yield close_tx_safe(ch, self.logger)
+        self.close_latency.observe(self._clock() - started)
+
+    def _retire(self, app, reason):
+        """Account closing of cached channel of app."""
+        created_at = self.created_at.get(app)
+        if created_at is not None:
+            self.lifetime.observe(self._clock() - created_at)
+
+        self.closed[reason] += 1
+
+    @gen.coroutine
+    def close_and_remove(self, to_remove, reason=CloseReason.REMOVED):
+        """Remove channels of specified apps and close them concurrently.
+
+        Channels are removed from cache before closing, so no closing
+        channel would be returned by `get_ch`.
+
+        :param reason: close reason, one of `CloseReason` values
+        :type reason: str
+
+        :return: count of closed channels
+        :rtype: int
+        """
+        to_close = []
         for app in ifilter(lambda a: a in self.channels, to_remove):
             self.logger.debug('removing from ch.cache {}', app)
-            yield close_tx_safe(self.channels[app], self.logger)
-            del self.channels[app]
+            to_close.append(self.channels.pop(app))
+
+            self._retire(app, reason)
+
+            self.created_at.pop(app, None)
+            self.used_at.pop(app, None)
+            self.last_ack_at.pop(app, None)
+            self.errors.pop(app, None)
+            self.suspected.discard(app)
+            self.prewarmed.discard(app)
+
+        yield [self._close(ch) for ch in to_close]
+
+        raise gen.Return(len(to_close))
+
+    def mark_ack(self, app):
+        """Register successfully acked control of app."""
+        if app in self.channels:
+            self.last_ack_at[app] = self._clock()
+            self.suspected.discard(app)
+
+    def mark_error(self, app):
+        """Register failed (or not acked in time) control of app."""
+        if app in self.channels:
+            self.errors[app] = self.errors.get(app, 0) + 1
+            self.suspected.add(app)
+
+    def invalidate(self):
+        """Suspect all of channels dead, e.g. on runtime restart."""
+        self.suspected.update(self.channels.iterkeys())
+        self.health_cnt['invalidations'] += 1
+
+    def heal(self, limit=None):
+        """Start background re-open of suspected channels.
+
+        :param limit: concurrency limit made with `make_concurrency_limit`
+        :type limit: tornado.locks.Semaphore | None
+
+        :return: futures of re-opens in progress
+        :rtype: list[tornado.concurrent.Future]
+        """
+        for app in self.suspected - self.opening.viewkeys():
+            future = self._reopen(app, limit)
+            if not future.done():
+                self.opening[app] = future
+
+        return self.opening.values()
+
+    @gen.coroutine
+    def _reopen(self, app, limit):
+        self.logger.info('re-opening suspected channel for {}', app)
+
+        try:
+            with (yield acquire_slot(limit)):
+                ch = yield self._open(app)
+        except Exception as e:
+            self.logger.error('failed to re-open channel for {}: {}', app, e)
+            self.health_cnt['reopen_failures'] += 1
+
+            self.opening.pop(app, None)
+            yield self.close_and_remove([app], CloseReason.FAILED)
+
+            raise gen.Return(False)
+
+        self.opening.pop(app, None)
+
+        old = self.channels.get(app)
+        if old is None:  # removed while re-opening
+            yield self._close(ch)
+            raise gen.Return(False)
+
+        self._retire(app, CloseReason.REOPENED)
+
+        # Preserves LRU position of the channel.
+        self.channels[app] = ch
+
+        self.created_at[app] = self._clock()
+        self.errors.pop(app, None)
+        self.suspected.discard(app)
+
+        self.health_cnt['reopened'] += 1
+
+        yield self._close(old)
 
-        raise gen.Return(cnt)
+        raise gen.Return(True)
+
+    @gen.coroutine
+    def evict_overflow(self):
+        """Close least recently used channels above of `max_size`."""
+        if not self.bounded:
+            return
+
+        max_size = self._app_config.channels_cache.max_size
+        overflow = len(self.channels) - max_size
+        if not max_size or overflow <= 0:
+            return
+
+        to_evict = list(islice(self.channels.iterkeys(), overflow))
+        self.logger.info('ch.cache overflow, evicting {}', to_evict)
+
+        yield self.close_and_remove(to_evict, CloseReason.LRU)
+
+    @gen.coroutine
+    def sweep(self, desired_apps=None):
+        """Close idle channels and channels of apps not in desired state.
+
+        :param desired_apps: apps of desired state, if None channels are
+            not checked for being orphaned
+        :type desired_apps: set[str] | None
+
+        :return: count of closed channels
+        :rtype: int
+        """
+        if not self.bounded:
+            raise gen.Return(0)
+
+        orphans = set()
+        if desired_apps is not None:
+            orphans = self.channels.viewkeys() - desired_apps
+
+        idle = set()
+        idle_ttl_sec = self._app_config.channels_cache.idle_ttl_sec
+        if idle_ttl_sec:
+            now = self._clock()
+            idle = {
+                app for app, tm in self.used_at.iteritems()
+                if now - tm > idle_ttl_sec
+            } - orphans
+
+        if orphans or idle:
+            self.logger.info(
+                'ch.cache sweep, orphans {}, idle {}', orphans, idle)
+
+        orphans_closed, idle_closed = yield [
+            self.close_and_remove(orphans, CloseReason.ORPHAN),
+            self.close_and_remove(idle, CloseReason.IDLE),
+        ]
+
+        raise gen.Return(orphans_closed + idle_closed)
 
     @gen.coroutine
     def close_other(self, to_retain_set):
@@ -103,18 +339,100 @@ class ChannelsCache(object):
     def add_one(self, app, should_close=False):
         if should_close and app in self.channels:
             self.logger.debug('ch chache `add_one`: closing ch for {}', app)
-            yield close_tx_safe(self.channels[app], self.logger)
+            self._retire(app, CloseReason.REOPENED)
+            yield self._close(self.channels[app])
+
+        ch = yield self._open(app)
+        yield self._put(app, ch)
+
+        raise gen.Return(ch)
+
+    @gen.coroutine
+    def _put(self, app, ch):
+        self.channels.pop(app, None)
+        self.channels[app] = ch
+
+        self.created_at[app] = self.used_at[app] = self._clock()
+        self.errors.pop(app, None)
+        self.suspected.discard(app)
 
-        self.channels[app] = yield self.node_service.control(app)
-        raise gen.Return(self.channels[app])
+        yield self.evict_overflow()
+
+    @gen.coroutine
+    def prewarm(self, apps, limit=None):
+        """Open channels for apps lacking one concurrently.
+
+        :param apps: apps to be controlled soon
+        :type apps: iterable[str]
+
+        :param limit: concurrency limit made with `make_concurrency_limit`
+        :type limit: tornado.locks.Semaphore | None
+
+        :return: count of opened channels
+        :rtype: int
+        """
+        to_open = [
+            app for app in apps
+            if app not in self.channels and app not in self.opening
+        ]
+
+        if to_open:
+            self.logger.debug('ch.cache pre-warming channels for {}', to_open)
+
+        opened = []
+        for app in to_open:
+            future = self._prewarm_one(app, limit)
+            if not future.done():
+                self.opening[app] = future
+
+            opened.append(future)
+
+        opened = yield opened
+        raise gen.Return(sum(opened))
+
+    @gen.coroutine
+    def _prewarm_one(self, app, limit):
+        try:
+            with (yield acquire_slot(limit)):
+                ch = yield self._open(app)
+        except Exception as e:
+            self.logger.error('failed to pre-warm channel for {}: {}', app, e)
+            self.health_cnt['prewarm_failures'] += 1
+            raise gen.Return(False)
+        finally:
+            self.opening.pop(app, None)
+
+        if app in self.channels:  # opened by someone else meanwhile
+            yield self._close(ch)
+            raise gen.Return(False)
+
+        self.prewarmed.add(app)
+        self.health_cnt['prewarmed'] += 1
+
+        yield self._put(app, ch)
+
+        raise gen.Return(True)
 
     @gen.coroutine
     def get_ch(self, app, should_close=False):
+        opening = self.opening.get(app)
+        if opening is not None:
+            self.logger.debug('ch.cache.get_ch waits opening of {}', app)
+            yield opening
+
         if app in self.channels:
             self.logger.debug('ch.cache.get_ch hit for {}', app)
+            self.hits += 1
+            self._touch(app)
+
+            if app in self.prewarmed:
+                self.prewarmed.discard(app)
+                self.health_cnt['prewarm_hits'] += 1
+
             raise gen.Return(self.channels[app])
 
         self.logger.debug('ch.cache.get_ch miss for {}', app)
+        self.misses += 1
         ch = yield self.add_one(app, should_close)
 
         raise gen.Return(ch)
@@ -124,3 +442,75 @@ class ChannelsCache(object):
 
     def apps(self):
         return self.channels.keys()
+
+    def age_distribution(self):
+        """Histogram of channels ages."""
+        histogram = Histogram(self.AGE_BUCKETS_MS)
+
+        now = self._clock()
+        for tm in self.created_at.itervalues():
+            histogram.observe(now - tm)
+
+        return histogram.as_dict()
+
+    def describe(self):
+        """Per channel details.
+
+        :return: maps app to its channel age, idle time and health, all
+            times are in seconds
+        :rtype: dict[str, dict]
+        """
+        now = self._clock()
+
+        def since(tm):
+            return None if tm is None else round(now - tm, 3)
+
+        return {
+            app: dict(
+                age=since(self.created_at.get(app)),
+                idle=since(self.used_at.get(app)),
+                last_ack=since(self.last_ack_at.get(app)),
+                errors=self.errors.get(app, 0),
+                suspected=app in self.suspected,
+            )
+            for app in self.channels
+        }
+
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        if not requests:
+            return 0.0
+
+        return float(self.hits) / requests
+
+    def get_metrics(self):
+        return dict(
+            size=len(self.channels),
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hit_rate(),
+            open_latency=self.open_latency.as_dict(),
+            close_latency=self.close_latency.as_dict(),
+            lifetime=self.lifetime.as_dict(),
+            closed=dict(self.closed),
+            evicted_lru=self.closed.get(CloseReason.LRU, 0),
+            evicted_idle=self.closed.get(CloseReason.IDLE, 0),
+            evicted_orphan=self.closed.get(CloseReason.ORPHAN, 0),
+            age=self.age_distribution(),
+            suspected=len(self.suspected),
+            reopened=self.health_cnt['reopened'],
+            reopen_failures=self.health_cnt['reopen_failures'],
+            invalidations=self.health_cnt['invalidations'],
+            prewarmed=self.health_cnt['prewarmed'],
+            prewarm_hits=self.health_cnt['prewarm_hits'],
+            prewarm_failures=self.health_cnt['prewarm_failures'],
+            prewarm_hit_rate=self.prewarm_hit_rate(),
+        )
+
+    def prewarm_hit_rate(self):
+        """Part of pre-warmed channels used by control."""
+        prewarmed = self.health_cnt['prewarmed']
+        if not prewarmed:
+            return 0.0
+
+        return float(self.health_cnt['prewarm_hits']) / prewarmed
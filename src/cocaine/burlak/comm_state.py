@@ -2,12 +2,16 @@
 import time
 from collections import namedtuple
 
+from .journal import ChangeJournal
+from .records import IndexedRecords
+
 
 class States(object):
     STOPPED = 'STOPPED'
     SPOOLING = 'SPOOLING'
     STARTED = 'STARTED'
     FAILED = 'FAILED'
+    DEFERRED = 'DEFERRED'
 
 
 class Defaults(object):
@@ -23,13 +27,15 @@ class Defaults(object):
 
     INIT_STATE_VERSION = -1
 
+    JOURNAL_SIZE = 4096
+
 
 class CommittedState(object):
     """
     State record format:
         <app name> : (<STATE>, <WORKERS COUNT>, <TIMESTAMP>)
 
-        <STATE> - (STARTED|STOPPED|FAILED|PENDING_STOP)
+        <STATE> - (STARTED|STOPPED|FAILED|PENDING_STOP|SPOOLING|DEFERRED)
         <TIMESTAMP> - last state update time
     """
 
@@ -52,12 +58,16 @@ class CommittedState(object):
         'FAILED',
         'STOPPED',
         'PENDING_STOP',
+        'DEFERRED',
     )
 
-    def __init__(self):
+    def __init__(self, journal_size=Defaults.JOURNAL_SIZE):
         self.in_state = CommittedState.IncomingState(dict(), -1, 0)
 
-        self.state = dict()
+        self.state = IndexedRecords(
+            CommittedState.Record,
+            indexed_states=(States.FAILED,),
+            expirable_states=CommittedState.TO_EXPIRE)
         self.last_state_version = Defaults.INIT_STATE_VERSION
 
         # for now time when version was updated.
@@ -71,11 +81,56 @@ class CommittedState(object):
 
         self._metrics = dict()
 
+        # Maps flapping app to time it was detected flapping.
+        self.flapping = dict()
+
+        self.journal = ChangeJournal(journal_size)
+
+        # Runtime uuid committed state belongs to.
+        self.uuid = None
+
+        # Records as plain dictionaries, updated in place on access for
+        # records changed since previous access only.
+        self._named = dict()
+        self._named_at = self.state.mutations
+
     def as_dict(self):
         return self.state
 
+    @staticmethod
+    def named_record(record):
+        """Record as plain dictionary, `_asdict` makes heavier OrderedDict."""
+        return dict(zip(CommittedState.Record._fields, record))
+
     def as_named_dict(self):
-        return {app: rec._asdict() for app, rec in self.state.iteritems()}
+        """Records as dictionaries.
+
+        Result is cached and updated in place on access after state change,
+        so it shouldn't be modified or kept across state changes.
+        """
+        if self._named_at == self.state.mutations:
+            return self._named
+
+        changed = self.state.take_changed()
+
+        if changed is None:
+            # First view, changed records are tracked from now on.
+            self._named = {
+                app: self.named_record(record)
+                for app, record in self.state.iteritems()
+            }
+            self.state.track_changes()
+        else:
+            for app in changed:
+                record = self.state.get(app)
+                if record is None:
+                    self._named.pop(app, None)
+                else:
+                    self._named[app] = self.named_record(record)
+
+        self._named_at = self.state.mutations
+
+        return self._named
 
     def as_named_dict_ext(self):
         """Make structure with timestamp and version."""
@@ -88,13 +143,34 @@ class CommittedState(object):
 
     def reset_output_state(self):
         self.state.clear()
+        self.journal.reset()
         self.version = Defaults.INIT_STATE_VERSION
 
     def reset(self):
         self.reset_output_state()
+        self.flapping = dict()
         self.in_state = CommittedState.IncomingState(dict(), -1, 0)
         self.mark_dirty()
 
+    def restore(self, records, version, uuid, ch_apps):
+        """Load state saved before restart.
+
+        Restored state is marked dirty, so it would be written to feedback.
+
+        :param records: maps app to its record
+        :type records: dict[str, CommittedState.Record]
+        """
+        self.state.clear()
+        self.state.update(records)
+
+        self.journal.reset()
+
+        self.version = version
+        self.uuid = uuid
+        self.ch_apps = list(ch_apps)
+
+        self.mark_dirty()
+
     def clear(self):  # pragma nocover
         '''Alias for reset'''
         self.reset()
@@ -109,17 +185,24 @@ class CommittedState(object):
     def mark_dirty(self):
         self._flushed = False
 
+    def _set(self, app, *fields):
+        if not self.journal.enabled:
+            self.state.set(app, *fields)
+            self.journal.touch()
+            return
+
+        old, new = self.state.set(app, *fields)
+        self.journal.append(app, old, new)
+
     def mark_running(self, app, workers, profile, state_version, tm):
-        self.state.update(
-            {
-                app: CommittedState.Record(
-                    States.STARTED,
-                    workers,
-                    profile,
-                    state_version,
-                    Defaults.SUCCESS_DESCRIPTION,
-                    int(tm))
-            })
+        self._set(
+            app,
+            States.STARTED,
+            workers,
+            profile,
+            state_version,
+            Defaults.SUCCESS_DESCRIPTION,
+            int(tm))
 
         self.mark_dirty()
 
@@ -127,33 +210,62 @@ class CommittedState(object):
         if reason is None:
             reason = Defaults.FAILED_DESCRIPTION
 
-        self.state.update(
-            {
-                app: CommittedState.Record(
-                    States.FAILED,
-                    0,
-                    profile,
-                    state_version,
-                    reason,
-                    int(tm))
-            })
+        self._set(
+            app,
+            States.FAILED,
+            0,
+            profile,
+            state_version,
+            reason,
+            int(tm))
 
         self.mark_dirty()
 
     def mark_pending_start(self, app, workers, profile, state_version, tm):
-        self.state.update(
-            {
-                app: CommittedState.Record(
-                    States.SPOOLING,
-                    workers,
-                    profile,
-                    state_version,
-                    Defaults.PENDING_START_DESCRIPTION,
-                    int(tm)),
-            })
+        self._set(
+            app,
+            States.SPOOLING,
+            workers,
+            profile,
+            state_version,
+            Defaults.PENDING_START_DESCRIPTION,
+            int(tm))
+
+        self.mark_dirty()
+
+    def mark_deferred(self, app, workers, profile, state_version, tm, reason):
+        """Mark app start or workers increase as deferred.
+
+        Already started app preserves its state and workers count, only
+        description is updated with deferring reason.
+        """
+        state = States.DEFERRED
+
+        record = self.state.get(app)
+        if record and record.state == States.STARTED:
+            state, workers = record.state, record.workers
+
+        self._set(
+            app,
+            state,
+            workers,
+            profile,
+            state_version,
+            reason,
+            int(tm))
 
         self.mark_dirty()
 
+    def mark_flapping(self, flapping):
+        """Set apps with damped control due to workers flapping.
+
+        Flapping apps are not a part of feedback, so state isn't marked dirty.
+
+        :param flapping: maps app to time it was detected flapping
+        :type flapping: dict[str, float]
+        """
+        self.flapping = {app: int(tm) for app, tm in flapping.iteritems()}
+
     def mark_stopped(self, app, state_version, tm):
         _, workers, profile, _, description, _ = self.state.get(
             app,
@@ -167,16 +279,14 @@ class CommittedState(object):
             )
         )
 
-        self.state.update(
-            {
-                app: CommittedState.Record(
-                    States.STOPPED,
-                    workers,
-                    profile,
-                    state_version,
-                    description,
-                    int(tm)),
-            })
+        self._set(
+            app,
+            States.STOPPED,
+            workers,
+            profile,
+            state_version,
+            description,
+            int(tm))
 
         self.mark_dirty()
 
@@ -189,30 +299,44 @@ class CommittedState(object):
         self.remove_old_records(expire_span, self.TO_EXPIRE)
 
     def remove(self, app):
-        self.state.pop(app, {})
+        old = self.state.pop(app, None)
+
+        if old is not None:
+            self.journal.append(app, old, None)
 
     def remove_listed(self, apps):
         for a in apps:
             self.remove(a)
 
     def remove_old_records(self, expire_span, in_state):
-        now = time.time()
-        to_remove = [
-            app for app, last_state in self.state.iteritems()
-            if last_state.state in in_state
-            and last_state.time_stamp < now - expire_span
-        ]
+        if not self.state:
+            return
+
+        expired = self.state.pop_expired(in_state, time.time() - expire_span)
 
-        for app in to_remove:
-            del self.state[app]
+        for app, old in expired.iteritems():
+            self.journal.append(app, old, None)
+
+    def changes_since(self, seq):
+        """Committed state changes since journal sequence `seq`.
+
+        :return: journal entries or None if changes are not available and
+            the whole state should be refetched
+        :rtype: list[JournalEntry] | None
+        """
+        return self.journal.since(seq)
 
     @property
     def failed(self):
         return {
-            app: state for app, state in self.state.iteritems()
-            if state.state == 'FAILED'
+            app: self.state[app]
+            for app in self.state.apps_in(States.FAILED)
         }
 
+    def failed_apps(self, version=None):
+        """Apps failed with specified state version, or with any version."""
+        return self.state.apps_in(States.FAILED, version)
+
     @property
     def version(self):
         return self.last_state_version
@@ -279,35 +403,22 @@ class CommittedState(object):
             )
         )
 
-        self.state.update(
-            {
-                app: CommittedState.Record(
-                    'PENDING_STOP',
-                    workers,
-                    profile,
-                    state_version,
-                    Defaults.PENDING_STOP_DESCRIPTION,
-                    int(tm))
-            }
-        )
+        self._set(
+            app,
+            'PENDING_STOP',
+            workers,
+            profile,
+            state_version,
+            Defaults.PENDING_STOP_DESCRIPTION,
+            int(tm))
 
         self.mark_dirty()
 
     def running_apps_count(self):
-        return sum(
-            1 for _ in self.generate_subset(lambda x: x.state == 'STARTED')
-        )
+        return self.state.count(States.STARTED)
 
     def workers_count(self):
-        try:
-            return sum(
-                int(record.workers)
-                for _, record in self.generate_subset(
-                    lambda x: x.state == 'STARTED'
-                )
-            )
-        except Exception:  # pragma nocover
-            return 0
+        return self.state.workers(States.STARTED)
 
     def generate_subset(self, predicate):
         for app, record in self.as_dict().iteritems():
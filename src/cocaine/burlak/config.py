@@ -128,6 +128,218 @@ def make_semaphore_config(d):
     )
 
 
+def make_dispatch_config(d):
+    """Construct dispatch (apps control) config."""
+    DispatchConfig = namedtuple('DispatchConfig', [
+        'control_pipeline',
+        'max_concurrency',
+        'speculative_run_lock',
+        'merge_pending_rounds',
+    ])
+
+    return DispatchConfig(
+        control_pipeline=d.get(
+            'control_pipeline', Defaults.DISPATCH_CONTROL_PIPELINE),
+        max_concurrency=d.get(
+            'max_concurrency', Defaults.DISPATCH_MAX_CONCURRENCY),
+        speculative_run_lock=d.get(
+            'speculative_run_lock', Defaults.DISPATCH_SPECULATIVE_RUN_LOCK),
+        merge_pending_rounds=d.get(
+            'merge_pending_rounds', Defaults.DISPATCH_MERGE_PENDING_ROUNDS),
+    )
+
+
+def make_start_rate_limit_config(d):
+    """Construct applications start rate limit config."""
+    StartRateLimitConfig = namedtuple('StartRateLimitConfig', [
+        'enabled',
+        'rate',
+        'burst',
+        'profiles',
+    ])
+
+    return StartRateLimitConfig(
+        enabled=d.get('enabled', Defaults.START_RATE_LIMIT_ENABLED),
+        rate=d.get('rate', Defaults.START_RATE_LIMIT_RATE),
+        burst=d.get('burst', Defaults.START_RATE_LIMIT_BURST),
+        profiles=d.get('profiles', {}),
+    )
+
+
+def make_admission_config(d):
+    """Construct host load aware admission config."""
+    AdmissionConfig = namedtuple('AdmissionConfig', [
+        'enabled',
+        'cpu_load_high',
+        'mem_usable_low',
+        'loadavg_high',
+        'max_starts_under_pressure',
+        'max_increase_under_pressure',
+    ])
+
+    return AdmissionConfig(
+        enabled=d.get('enabled', Defaults.ADMISSION_ENABLED),
+        cpu_load_high=d.get(
+            'cpu_load_high', Defaults.ADMISSION_CPU_LOAD_HIGH),
+        mem_usable_low=d.get(
+            'mem_usable_low', Defaults.ADMISSION_MEM_USABLE_LOW),
+        loadavg_high=d.get(
+            'loadavg_high', Defaults.ADMISSION_LOADAVG_HIGH),
+        max_starts_under_pressure=d.get(
+            'max_starts_under_pressure',
+            Defaults.ADMISSION_MAX_STARTS_UNDER_PRESSURE),
+        max_increase_under_pressure=d.get(
+            'max_increase_under_pressure',
+            Defaults.ADMISSION_MAX_INCREASE_UNDER_PRESSURE),
+    )
+
+
+def make_profile_update_config(d):
+    """Construct rolling profile update config."""
+    ProfileUpdateConfig = namedtuple('ProfileUpdateConfig', [
+        'enabled',
+        'max_unavailable',
+        'wave_delay_sec',
+        'wave_timeout_sec',
+        'gate_poll_interval_sec',
+    ])
+
+    return ProfileUpdateConfig(
+        enabled=d.get('enabled', Defaults.PROFILE_UPDATE_ENABLED),
+        max_unavailable=d.get(
+            'max_unavailable', Defaults.PROFILE_UPDATE_MAX_UNAVAILABLE),
+        wave_delay_sec=d.get(
+            'wave_delay_sec', Defaults.PROFILE_UPDATE_WAVE_DELAY_SEC),
+        wave_timeout_sec=d.get(
+            'wave_timeout_sec', Defaults.PROFILE_UPDATE_WAVE_TIMEOUT_SEC),
+        gate_poll_interval_sec=d.get(
+            'gate_poll_interval_sec',
+            Defaults.PROFILE_UPDATE_GATE_POLL_INTERVAL_SEC),
+    )
+
+
+def make_ramp_config(d):
+    """Construct workers ramp-up config."""
+    RampConfig = namedtuple('RampConfig', [
+        'enabled',
+        'step',
+        'interval_sec',
+        'confirm_timeout_sec',
+    ])
+
+    return RampConfig(
+        enabled=d.get('enabled', Defaults.RAMP_ENABLED),
+        step=d.get('step', Defaults.RAMP_STEP),
+        interval_sec=d.get('interval_sec', Defaults.RAMP_INTERVAL_SEC),
+        confirm_timeout_sec=d.get(
+            'confirm_timeout_sec', Defaults.RAMP_CONFIRM_TIMEOUT_SEC),
+    )
+
+
+def make_spooling_config(d):
+    """Construct spooling apps fast retry config."""
+    SpoolingConfig = namedtuple('SpoolingConfig', [
+        'enabled',
+        'initial_delay_sec',
+        'max_delay_sec',
+        'backoff_factor',
+        'max_wait_sec',
+    ])
+
+    return SpoolingConfig(
+        enabled=d.get('enabled', Defaults.SPOOLING_RETRY_ENABLED),
+        initial_delay_sec=d.get(
+            'initial_delay_sec', Defaults.SPOOLING_INITIAL_DELAY_SEC),
+        max_delay_sec=d.get(
+            'max_delay_sec', Defaults.SPOOLING_MAX_DELAY_SEC),
+        backoff_factor=d.get(
+            'backoff_factor', Defaults.SPOOLING_BACKOFF_FACTOR),
+        max_wait_sec=d.get('max_wait_sec', Defaults.SPOOLING_MAX_WAIT_SEC),
+    )
+
+
+def make_flapping_config(d):
+    """Construct flapping apps control damping config."""
+    FlappingConfig = namedtuple('FlappingConfig', [
+        'enabled',
+        'window_sec',
+        'threshold',
+        'damp_interval_sec',
+    ])
+
+    return FlappingConfig(
+        enabled=d.get('enabled', Defaults.FLAPPING_DAMPING_ENABLED),
+        window_sec=d.get('window_sec', Defaults.FLAPPING_WINDOW_SEC),
+        threshold=d.get('threshold', Defaults.FLAPPING_THRESHOLD),
+        damp_interval_sec=d.get(
+            'damp_interval_sec', Defaults.FLAPPING_DAMP_INTERVAL_SEC),
+    )
+
+
+def make_smoothing_config(d):
+    """Construct incoming state smoothing config."""
+    SmoothingConfig = namedtuple('SmoothingConfig', [
+        'enabled',
+        'abs_threshold',
+        'rel_threshold',
+        'dwell_sec',
+    ])
+
+    return SmoothingConfig(
+        enabled=d.get('enabled', Defaults.SMOOTHING_ENABLED),
+        abs_threshold=d.get('abs_threshold', Defaults.SMOOTHING_ABS_THRESHOLD),
+        rel_threshold=d.get('rel_threshold', Defaults.SMOOTHING_REL_THRESHOLD),
+        dwell_sec=d.get('dwell_sec', Defaults.SMOOTHING_DWELL_SEC),
+    )
+
+
+def make_channels_cache_config(d):
+    """Construct control channels cache bounds config."""
+    ChannelsCacheConfig = namedtuple('ChannelsCacheConfig', [
+        'enabled',
+        'max_size',
+        'idle_ttl_sec',
+        'sweep_interval_sec',
+        'prewarm',
+        'prewarm_concurrency',
+    ])
+
+    return ChannelsCacheConfig(
+        enabled=d.get('enabled', Defaults.CHANNELS_CACHE_BOUNDED),
+        max_size=d.get('max_size', Defaults.CHANNELS_CACHE_MAX_SIZE),
+        idle_ttl_sec=d.get(
+            'idle_ttl_sec', Defaults.CHANNELS_CACHE_IDLE_TTL_SEC),
+        sweep_interval_sec=d.get(
+            'sweep_interval_sec', Defaults.CHANNELS_CACHE_SWEEP_INTERVAL_SEC),
+        prewarm=d.get('prewarm', Defaults.CHANNELS_CACHE_PREWARM),
+        prewarm_concurrency=d.get(
+            'prewarm_concurrency',
+            Defaults.CHANNELS_CACHE_PREWARM_CONCURRENCY),
+    )
+
+
+def make_committed_state_config(d):
+    """Construct committed state config."""
+    CommittedStateConfig = namedtuple('CommittedStateConfig', [
+        'journal_size',
+        'snapshot_enabled',
+        'snapshot_path',
+        'snapshot_interval_sec',
+        'snapshot_max_age_sec',
+    ])
+
+    return CommittedStateConfig(
+        journal_size=d.get(
+            'journal_size', Defaults.COMMITTED_STATE_JOURNAL_SIZE),
+        snapshot_enabled=d.get('snapshot_enabled', Defaults.SNAPSHOT_ENABLED),
+        snapshot_path=d.get('snapshot_path', Defaults.SNAPSHOT_PATH),
+        snapshot_interval_sec=d.get(
+            'snapshot_interval_sec', Defaults.SNAPSHOT_INTERVAL_SEC),
+        snapshot_max_age_sec=d.get(
+            'snapshot_max_age_sec', Defaults.SNAPSHOT_MAX_AGE_SEC),
+    )
+
+
 #
 # Should be compatible with tools secure section
 #
@@ -289,6 +501,10 @@ class Config(object):
             'type': 'boolean',
             'required': False,
         },
+        'supersede_stale_rounds': {
+            'type': 'boolean',
+            'required': False,
+        },
         'sentry_dsn': {
             'type': 'string',
             'required': False,
@@ -355,6 +571,303 @@ class Config(object):
                 },
             },
         },
+        'dispatch': {
+            'type': 'dict',
+            'required': False,
+            'schema': {
+                'control_pipeline': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'max_concurrency': {
+                    'type': 'integer',
+                    'min': 0,
+                    'required': False,
+                },
+                'speculative_run_lock': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'merge_pending_rounds': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+            },
+        },
+        'start_rate_limit': {
+            'type': 'dict',
+            'required': False,
+            'schema': {
+                'enabled': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'rate': {  # starts per second, 0 - unlimited
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+                'burst': {
+                    'type': 'integer',
+                    'min': 1,
+                    'required': False,
+                },
+                'profiles': {
+                    'type': 'dict',
+                    'required': False,
+                    'valueschema': {
+                        'type': 'dict',
+                        'schema': {
+                            'rate': {
+                                'type': 'number',
+                                'min': 0,
+                            },
+                            'burst': {
+                                'type': 'integer',
+                                'min': 1,
+                                'required': False,
+                            },
+                        },
+                    },
+                },
+            },
+        },
+        'admission': {
+            'type': 'dict',
+            'required': False,
+            'schema': {
+                'enabled': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'cpu_load_high': {  # ratio in [0, 1]
+                    'type': 'number',
+                    'min': 0,
+                    'max': 1,
+                    'required': False,
+                },
+                'mem_usable_low': {  # ratio in [0, 1]
+                    'type': 'number',
+                    'min': 0,
+                    'max': 1,
+                    'required': False,
+                },
+                'loadavg_high': {  # 0 - disabled
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+                'max_starts_under_pressure': {
+                    'type': 'integer',
+                    'min': 0,
+                    'required': False,
+                },
+                'max_increase_under_pressure': {
+                    'type': 'integer',
+                    'min': 0,
+                    'required': False,
+                },
+            },
+        },
+        'profile_update': {
+            'type': 'dict',
+            'required': False,
+            'schema': {
+                'enabled': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'max_unavailable': {
+                    'type': 'integer',
+                    'min': 1,
+                    'required': False,
+                },
+                'wave_delay_sec': {
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+                'wave_timeout_sec': {
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+                'gate_poll_interval_sec': {
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+            },
+        },
+        'ramp': {
+            'type': 'dict',
+            'required': False,
+            'schema': {
+                'enabled': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'step': {
+                    'type': 'integer',
+                    'min': 1,
+                    'required': False,
+                },
+                'interval_sec': {
+                    'type': 'number',
+                    'min': 0.1,
+                    'required': False,
+                },
+                'confirm_timeout_sec': {
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+            },
+        },
+        'spooling': {
+            'type': 'dict',
+            'required': False,
+            'schema': {
+                'enabled': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'initial_delay_sec': {
+                    'type': 'number',
+                    'min': 0.1,
+                    'required': False,
+                },
+                'max_delay_sec': {
+                    'type': 'number',
+                    'min': 0.1,
+                    'required': False,
+                },
+                'backoff_factor': {
+                    'type': 'number',
+                    'min': 1,
+                    'required': False,
+                },
+                'max_wait_sec': {
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+            },
+        },
+        'flapping': {
+            'type': 'dict',
+            'required': False,
+            'schema': {
+                'enabled': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'window_sec': {
+                    'type': 'number',
+                    'min': 1,
+                    'required': False,
+                },
+                'threshold': {
+                    'type': 'integer',
+                    'min': 2,
+                    'required': False,
+                },
+                'damp_interval_sec': {
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+            },
+        },
+        'smoothing': {
+            'type': 'dict',
+            'required': False,
+            'schema': {
+                'enabled': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'abs_threshold': {
+                    'type': 'integer',
+                    'min': 0,
+                    'required': False,
+                },
+                'rel_threshold': {
+                    'type': 'number',
+                    'min': 0,
+                    'max': 1,
+                    'required': False,
+                },
+                'dwell_sec': {
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+            },
+        },
+        'channels_cache': {
+            'type': 'dict',
+            'required': False,
+            'schema': {
+                'enabled': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'max_size': {
+                    'type': 'integer',
+                    'min': 0,
+                    'required': False,
+                },
+                'idle_ttl_sec': {
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+                'sweep_interval_sec': {
+                    'type': 'number',
+                    'min': 1,
+                    'required': False,
+                },
+                'prewarm': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'prewarm_concurrency': {
+                    'type': 'integer',
+                    'min': 0,
+                    'required': False,
+                },
+            },
+        },
+        'committed_state': {
+            'type': 'dict',
+            'required': False,
+            'schema': {
+                'journal_size': {
+                    'type': 'integer',
+                    'min': 0,
+                    'required': False,
+                },
+                'snapshot_enabled': {
+                    'type': 'boolean',
+                    'required': False,
+                },
+                'snapshot_path': {
+                    'type': 'string',
+                    'required': False,
+                },
+                'snapshot_interval_sec': {
+                    'type': 'number',
+                    'min': 1,
+                    'required': False,
+                },
+                'snapshot_max_age_sec': {
+                    'type': 'number',
+                    'min': 0,
+                    'required': False,
+                },
+            },
+        },
         'run.semaphore': {
             'type': 'dict',
             'required': False,
@@ -530,6 +1043,15 @@ class Config(object):
     def console_log_level(self, level):
         self._config['console_log_level'] = level
 
+    @property
+    def supersede_stale_rounds(self):
+        return self._config.get(
+            'supersede_stale_rounds', Defaults.SUPERSEDE_STALE_ROUNDS)
+
+    @supersede_stale_rounds.setter
+    def supersede_stale_rounds(self, flag):
+        self._config['supersede_stale_rounds'] = flag
+
     @property
     def status_web_path(self):
         return self._config.get('status_web_path', Defaults.STATUS_WEB_PATH)
@@ -595,6 +1117,56 @@ class Config(object):
         semaphore = self._config.get('run.semaphore', {})
         return make_semaphore_config(semaphore)
 
+    @property
+    def dispatch(self):
+        dispatch = self._config.get('dispatch', {})
+        return make_dispatch_config(dispatch)
+
+    @property
+    def start_rate_limit(self):
+        start_rate_limit = self._config.get('start_rate_limit', {})
+        return make_start_rate_limit_config(start_rate_limit)
+
+    @property
+    def admission(self):
+        admission = self._config.get('admission', {})
+        return make_admission_config(admission)
+
+    @property
+    def profile_update(self):
+        profile_update = self._config.get('profile_update', {})
+        return make_profile_update_config(profile_update)
+
+    @property
+    def ramp(self):
+        ramp = self._config.get('ramp', {})
+        return make_ramp_config(ramp)
+
+    @property
+    def spooling(self):
+        spooling = self._config.get('spooling', {})
+        return make_spooling_config(spooling)
+
+    @property
+    def flapping(self):
+        flapping = self._config.get('flapping', {})
+        return make_flapping_config(flapping)
+
+    @property
+    def smoothing(self):
+        smoothing = self._config.get('smoothing', {})
+        return make_smoothing_config(smoothing)
+
+    @property
+    def channels_cache(self):
+        channels_cache = self._config.get('channels_cache', {})
+        return make_channels_cache_config(channels_cache)
+
+    @property
+    def committed_state(self):
+        committed_state = self._config.get('committed_state', {})
+        return make_committed_state_config(committed_state)
+
     # TODO:
     #   refactor to single method?
     #   make *args format
@@ -34,6 +34,73 @@ class Defaults(object):
     STOP_APPS_NOT_IN_STATE = False
     PENDING_STOP_IN_STATE = False
 
+    SUPERSEDE_STALE_ROUNDS = False
+
+    DISPATCH_CONTROL_PIPELINE = False
+    # Max number of concurrent node requests within dispatch stage,
+    # 0 means unlimited.
+    DISPATCH_MAX_CONCURRENCY = 0
+    # Start run lock acquisition on state update with new apps, before
+    # running apps are fetched from node.
+    DISPATCH_SPECULATIVE_RUN_LOCK = False
+    # Merge rounds queued while dispatch was busy into single round.
+    DISPATCH_MERGE_PENDING_ROUNDS = False
+
+    START_RATE_LIMIT_ENABLED = False
+    START_RATE_LIMIT_RATE = 10  # starts per second
+    START_RATE_LIMIT_BURST = 20
+
+    ADMISSION_ENABLED = False
+    ADMISSION_CPU_LOAD_HIGH = 0.9
+    ADMISSION_MEM_USABLE_LOW = 0.1
+    ADMISSION_LOADAVG_HIGH = 0  # disabled
+    ADMISSION_MAX_STARTS_UNDER_PRESSURE = 0
+    ADMISSION_MAX_INCREASE_UNDER_PRESSURE = 0
+
+    PROFILE_UPDATE_ENABLED = False
+    PROFILE_UPDATE_MAX_UNAVAILABLE = 1
+    PROFILE_UPDATE_WAVE_DELAY_SEC = 10
+    PROFILE_UPDATE_WAVE_TIMEOUT_SEC = 300
+    PROFILE_UPDATE_GATE_POLL_INTERVAL_SEC = 5
+
+    RAMP_ENABLED = False
+    RAMP_STEP = 10  # workers
+    RAMP_INTERVAL_SEC = 5
+    RAMP_CONFIRM_TIMEOUT_SEC = 120
+
+    SPOOLING_RETRY_ENABLED = False
+    SPOOLING_INITIAL_DELAY_SEC = 1
+    SPOOLING_MAX_DELAY_SEC = 15
+    SPOOLING_BACKOFF_FACTOR = 2
+    SPOOLING_MAX_WAIT_SEC = 120
+
+    FLAPPING_DAMPING_ENABLED = False
+    FLAPPING_WINDOW_SEC = 300
+    FLAPPING_THRESHOLD = 3  # mismatches within window
+    FLAPPING_DAMP_INTERVAL_SEC = 60
+
+    SMOOTHING_ENABLED = False
+    SMOOTHING_ABS_THRESHOLD = 2  # workers
+    SMOOTHING_REL_THRESHOLD = 0.1
+    SMOOTHING_DWELL_SEC = 60
+
+    CHANNELS_CACHE_BOUNDED = False
+    CHANNELS_CACHE_MAX_SIZE = 1024  # 0 means unlimited
+    CHANNELS_CACHE_IDLE_TTL_SEC = 3600  # 0 means never expire
+    CHANNELS_CACHE_SWEEP_INTERVAL_SEC = 60
+    CHANNELS_CACHE_PREWARM = False
+    # Max number of concurrently opened channels, 0 means unlimited.
+    CHANNELS_CACHE_PREWARM_CONCURRENCY = 16
+
+    # Committed state changes kept for delta queries, 0 disables journal.
+    COMMITTED_STATE_JOURNAL_SIZE = 4096
+
+    SNAPSHOT_ENABLED = False
+    SNAPSHOT_PATH = '/var/lib/cocaine-orca/committed_state.json'
+    SNAPSHOT_INTERVAL_SEC = 30
+    # Older snapshot is not restored on startup.
+    SNAPSHOT_MAX_AGE_SEC = 3600
+
     SENTRY_DSN = ''
 
     EXPIRE_STOPPED_SEC = 900
@@ -0,0 +1,131 @@
+"""Damping of control for flapping applications.
+
+Workers mismatch of app with crashing (or constantly restarting) workers
+appears and disappears on every few runtime polls, and each appearance
+leads to control being resent to the app. Every transition of app into
+mismatch is counted as flap, app having `threshold` or more flaps within
+last `window_sec` seconds is considered flapping and is controlled not
+more often then once in `damp_interval_sec`. App stops flapping as soon as
+its flaps are out of the window.
+"""
+import time
+
+from collections import deque
+
+from .mixins import LoggerMixin, MetricsMixin
+
+
+class FlapDamper(LoggerMixin, MetricsMixin):
+    """Tracks workers mismatch flaps and damps control of flapping apps."""
+
+    def __init__(self, context, clock=time.time, **kwargs):
+        super(FlapDamper, self).__init__(context, **kwargs)
+
+        self._app_config = context.config
+        self._clock = clock
+
+        self.flaps = dict()
+        self.mismatched = set()
+        self.controlled_at = dict()
+
+        # Maps flapping app to time it was detected flapping.
+        self.flapping = dict()
+
+    @property
+    def _config(self):
+        return self._app_config.flapping
+
+    @property
+    def enabled(self):
+        return self._config.enabled
+
+    def clear(self):
+        self.flaps.clear()
+        self.mismatched.clear()
+        self.controlled_at.clear()
+        self.flapping.clear()
+
+    def _forget(self, app):
+        self.flaps.pop(app, None)
+        self.controlled_at.pop(app, None)
+        self.flapping.pop(app, None)
+
+    def _update_flapping(self, app, now):
+        flaps = self.flaps.get(app)
+
+        while flaps and now - flaps[0] > self._config.window_sec:
+            flaps.popleft()
+
+        if flaps and len(flaps) >= self._config.threshold:
+            if app not in self.flapping:
+                self.flapping[app] = now
+                self.metrics_cnt['flapping_detected'] += 1
+                self.warn(
+                    'app {} is flapping, {} workers mismatches in {}s',
+                    app, len(flaps), self._config.window_sec)
+            return
+
+        if not flaps:
+            self.flaps.pop(app, None)
+            self.controlled_at.pop(app, None)
+
+        if self.flapping.pop(app, None) is not None:
+            self.info('app {} is not flapping anymore', app)
+
+    def damp(self, workers_mismatch, state):
+        """Register workers mismatch poll result and filter out control of
+        flapping apps.
+
+        :param workers_mismatch: apps with workers count mismatch
+        :type workers_mismatch: set[str]
+
+        :param state: current state, tracking of apps not in it is dropped
+        :type state: dict[str, StateRecord]
+
+        :return: apps to be controlled on current iteration
+        :rtype: set[str]
+        """
+        if not self._config.enabled:
+            self.clear()
+            return workers_mismatch
+
+        now = self._clock()
+
+        for app in self.flaps.keys():
+            if app not in state:
+                self._forget(app)
+
+        for app in workers_mismatch - self.mismatched:
+            self.flaps.setdefault(app, deque()).append(now)
+            self.metrics_cnt['flaps'] += 1
+
+        self.mismatched = set(workers_mismatch)
+
+        for app in self.flaps.keys():
+            self._update_flapping(app, now)
+
+        to_control = set()
+        for app in workers_mismatch:
+            if app in self.flapping:
+                controlled_at = self.controlled_at.get(app)
+                if controlled_at is not None and \
+                        now - controlled_at < self._config.damp_interval_sec:
+                    self.metrics_cnt['damped_controls'] += 1
+                    continue
+
+                self.controlled_at[app] = now
+
+            to_control.add(app)
+
+        if workers_mismatch - to_control:
+            self.debug(
+                'control of flapping apps damped {}',
+                workers_mismatch - to_control)
+
+        return to_control
+
+    def get_count_metrics(self):
+        metrics = dict(super(FlapDamper, self).get_count_metrics())
+        metrics.update(flapping_apps=len(self.flapping))
+
+        return metrics
@@ -0,0 +1,84 @@
+"""Journal of committed state changes.
+
+Every committed state mutation is appended to a bounded ring with
+increasing sequence number, so readers could poll changes since last seen
+sequence instead of fetching whole state. When requested changes are
+already out of the ring (or journal was reset) reader should refetch the
+whole state.
+"""
+from collections import deque, namedtuple
+from itertools import islice
+
+
+JournalEntry = namedtuple('JournalEntry', [
+    'seq',
+    'app',
+    'old',
+    'new',
+])
+
+
+class ChangeJournal(object):
+    """Bounded ring of (seq, app, old record, new record) entries.
+
+    Removed record has `new` set to None, created one has None as `old`.
+    """
+
+    def __init__(self, size):
+        self.size = size
+
+        self.seq = 0
+        # Changes up to this sequence are not available after reset.
+        self._base = 0
+        self._entries = deque(maxlen=size)
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def touch(self):
+        """Account change without entry, used with disabled journal."""
+        self.seq += 1
+
+    def append(self, app, old, new):
+        if old == new:
+            return
+
+        self.seq += 1
+
+        if self.size:
+            self._entries.append(JournalEntry(self.seq, app, old, new))
+
+    def reset(self):
+        """Drop all entries, readers of current and older sequences have to
+        refetch.
+        """
+        self._entries.clear()
+
+        self.seq += 1
+        self._base = self.seq
+
+    @property
+    def first_seq(self):
+        """Sequence of the oldest available entry."""
+        return self._entries[0].seq if self._entries else self.seq + 1
+
+    def since(self, seq):
+        """Get changes with sequence greater than `seq`.
+
+        :param seq: last sequence seen by reader
+        :type seq: int
+
+        :return: entries in sequence order or None if some of requested
+            changes are not available anymore and the whole state should be
+            refetched
+        :rtype: list[JournalEntry] | None
+        """
+        if seq < self._base or seq > self.seq or seq + 1 < self.first_seq:
+            return None
+
+        # Sequences in the ring are contiguous.
+        return list(islice(self._entries, seq + 1 - self.first_seq, None))
+
+    def __len__(self):
+        return len(self._entries)
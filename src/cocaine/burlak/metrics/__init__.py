@@ -5,8 +5,9 @@ TODO(metrics):
   - For some metrics zero values returned on error, but this values could
     lead to wrong scheduling, it should be better to raise exception.
 """
+from .histogram import Histogram
 from .hub import Hub
 from .source import MetricsSource
 from .system import SystemMetrics
 
-__all__ = ['MetricsSource', 'Hub', 'SystemMetrics']
+__all__ = ['MetricsSource', 'Histogram', 'Hub', 'SystemMetrics']
@@ -0,0 +1,86 @@
+"""Fixed buckets histogram of durations.
+
+Buckets are cumulative (count of observations less or equal to bucket upper
+bound) to be easily flattened and aggregated by metrics collectors.
+"""
+import bisect
+
+
+class Histogram(object):
+    """Histogram of durations in milliseconds."""
+
+    DEFAULT_BUCKETS_MS = (
+        10, 50, 100, 250, 500,
+        1000, 2500, 5000, 10000, 30000, 60000,
+    )
+
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS):
+        """Histogram.
+
+        :param buckets_ms: buckets upper bounds in milliseconds
+        :type buckets_ms: tuple[int]
+        """
+        if not buckets_ms:
+            raise ValueError('histogram should have at least one bucket')
+
+        self._bounds = sorted(buckets_ms)
+
+        # Last one is for values above of the largest bound.
+        self._counts = [0] * (len(self._bounds) + 1)
+
+        self.count = 0
+        self.sum_ms = 0
+        self.max_ms = 0
+
+    def observe(self, value_sec):
+        """Add duration observation.
+
+        :param value_sec: duration in seconds
+        :type value_sec: float
+        """
+        value_ms = int(value_sec * 1000)
+
+        self._counts[bisect.bisect_left(self._bounds, value_ms)] += 1
+
+        self.count += 1
+        self.sum_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def quantile(self, q):
+        """Upper bound of the bucket with specified quantile.
+
+        Observations above of the largest bound are reported with max value.
+
+        :param q: quantile in [0, 1] range
+        :type q: float
+        """
+        if not self.count:
+            return 0
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self._bounds, self._counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_ms)
+
+        return self.max_ms
+
+    def as_dict(self):
+        buckets = dict()
+
+        seen = 0
+        for bound, count in zip(self._bounds, self._counts):
+            seen += count
+            buckets['le_{}'.format(bound)] = seen
+
+        buckets['le_inf'] = self.count
+
+        return dict(
+            count=self.count,
+            sum_ms=self.sum_ms,
+            max_ms=self.max_ms,
+            p50_ms=self.quantile(.5),
+            p99_ms=self.quantile(.99),
+            buckets=buckets,
+        )
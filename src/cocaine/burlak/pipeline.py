@@ -0,0 +1,233 @@
+"""Pipelined control commands sending.
+
+Control command is written to the app channel without waiting for acks of
+previously written commands, so only channel opening and writing stage is
+limited by concurrency setting, while acks are collected asynchronously and
+matched to the app and state version they were sent with.
+
+Note that timed out channel could receive stale ack later, so such channels
+should be closed by pipeline user.
+
+Control channel of an app is shared by all control writers (dispatch,
+workers ramp, spooling retries), acks aren't tagged, so write and its ack
+wait are serialized per app with `AppLocks`.
+"""
+import time
+from collections import namedtuple
+
+from tornado import gen
+from tornado import locks
+
+
+ControlTask = namedtuple('ControlTask', [
+    'app',
+    'workers',
+    'profile',
+    'state_version',
+])
+
+
+AckRecord = namedtuple('AckRecord', [
+    'task',
+    'sent_at',
+    'acked_at',
+])
+
+
+PipelineResult = namedtuple('PipelineResult', [
+    'acked',      # list of AckRecord
+    'failed',     # list of (ControlTask, exception) pairs
+    'timed_out',  # list of ControlTask
+])
+
+
+def make_concurrency_limit(limit):
+    """Make semaphore for specified concurrency limit.
+
+    :param limit: max concurrent tasks count, zero or less means unlimited
+    :type limit: int
+
+    :rtype: tornado.locks.Semaphore | None
+    """
+    return locks.Semaphore(limit) if limit > 0 else None
+
+
+class _Unlimited(object):
+    """Slot of unlimited concurrency."""
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+@gen.coroutine
+def acquire_slot(limit):
+    """Acquire slot of concurrency `limit`.
+
+    Should be used as `with (yield acquire_slot(limit)): ...`
+
+    :param limit: semaphore made with `make_concurrency_limit` or None
+    :type limit: tornado.locks.Semaphore | None
+    """
+    if limit is None:
+        raise gen.Return(_Unlimited())
+
+    slot = yield limit.acquire()
+    raise gen.Return(slot)
+
+
+@gen.coroutine
+def run_limited(limit, fn, *args, **kwargs):
+    """Run coroutine `fn` holding a slot of concurrency `limit`.
+
+    :param limit: semaphore made with `make_concurrency_limit` or None
+    :type limit: tornado.locks.Semaphore | None
+    """
+    with (yield acquire_slot(limit)):
+        result = yield fn(*args, **kwargs)
+
+    raise gen.Return(result)
+
+
+class _AppSlot(object):
+    """Acquired app lock, released on context exit."""
+
+    def __init__(self, app_locks, app):
+        self._app_locks = app_locks
+        self._app = app
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        self._app_locks.release(self._app)
+
+
+class AppLocks(object):
+    """Per app locks, lock is dropped as soon as nobody holds or waits it."""
+
+    def __init__(self):
+        # Maps app to [lock, count of holders and waiters].
+        self._locks = dict()
+
+    @gen.coroutine
+    def acquire(self, app):
+        """Acquire lock of the `app`.
+
+        Should be used as `with (yield app_locks.acquire(app)): ...`
+        """
+        entry = self._locks.setdefault(app, [locks.Lock(), 0])
+        entry[1] += 1
+
+        try:
+            yield entry[0].acquire()
+        except Exception:  # pragma nocover
+            self._unref(app)
+            raise
+
+        raise gen.Return(_AppSlot(self, app))
+
+    def release(self, app):
+        self._locks[app][0].release()
+        self._unref(app)
+
+    def _unref(self, app):
+        entry = self._locks[app]
+        entry[1] -= 1
+
+        if not entry[1]:
+            del self._locks[app]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+class ControlPipeline(object):
+    """Sends control commands to many channels with async acks collection."""
+
+    def __init__(
+            self, channels_cache, write_limit, ack_timeout, app_locks=None):
+        """ControlPipeline.
+
+        :param channels_cache: source of app control channels
+        :type channels_cache: chcache.ChannelsCache
+
+        :param write_limit: concurrency limit of channel open and write stage
+        :type write_limit: tornado.locks.Semaphore | None
+
+        :param ack_timeout: ack waiting timeout in seconds
+        :type ack_timeout: int | float
+
+        :param app_locks: locks serializing writes to app channel with other
+                          writers, taken before write limit slot
+        :type app_locks: AppLocks | None
+        """
+        self._channels_cache = channels_cache
+        self._write_limit = write_limit
+        self._ack_timeout = ack_timeout
+        self._app_locks = app_locks if app_locks is not None else AppLocks()
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @gen.coroutine
+    def _write(self, task):
+        ch = yield self._channels_cache.get_ch(task.app)
+        yield ch.tx.write(task.workers)
+
+        raise gen.Return(ch)
+
+    @gen.coroutine
+    def _send(self, task):
+        """Write command and wait for ack holding the app lock.
+
+        :return: (outcome, payload) pair, where outcome is one of `acked`,
+                 `failed` or `timed_out`
+        """
+        with (yield self._app_locks.acquire(task.app)):
+            outcome = yield self._send_locked(task)
+
+        raise gen.Return(outcome)
+
+    @gen.coroutine
+    def _send_locked(self, task):
+        try:
+            ch = yield run_limited(self._write_limit, self._write, task)
+        except Exception as e:
+            raise gen.Return(('failed', (task, e)))
+
+        sent_at = time.time()
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            yield ch.rx.get(timeout=self._ack_timeout)
+        except gen.TimeoutError:
+            raise gen.Return(('timed_out', task))
+        except Exception as e:
+            raise gen.Return(('failed', (task, e)))
+        finally:
+            self.in_flight -= 1
+
+        raise gen.Return(('acked', AckRecord(task, sent_at, time.time())))
+
+    @gen.coroutine
+    def send(self, tasks):
+        """Send control commands for all tasks.
+
+        :param tasks: commands to send, order of writes is preserved if
+                      concurrency is limited
+        :type tasks: list[ControlTask]
+
+        :rtype: PipelineResult
+        """
+        result = PipelineResult([], [], [])
+
+        outcomes = yield [self._send(task) for task in tasks]
+        for outcome, payload in outcomes:
+            getattr(result, outcome).append(payload)
+
+        raise gen.Return(result)
@@ -0,0 +1,177 @@
+"""Stepped ramp-up of applications workers count.
+
+Large workers increase written at once makes runtime spawn all of workers
+simultaneously, which leads to CPU and memory spikes affecting co-located
+apps. With ramp mode such increases are split into steps of `step` workers,
+next step is written not earlier then `interval_sec` after previous one and
+only after previous step is confirmed by runtime workers distribution (or
+`confirm_timeout_sec` has expired). Decreases are applied immediately.
+"""
+import time
+
+from collections import namedtuple
+
+from .mixins import LoggerMixin, MetricsMixin
+
+
+RampRecord = namedtuple('RampRecord', [
+    'profile',
+    'target',
+    'written',
+    'state_version',
+    'written_at',
+])
+
+
+class WorkersRamp(LoggerMixin, MetricsMixin):
+    """Splits large workers increases into steps."""
+
+    def __init__(self, context, workers_distribution, clock=time.time,
+                 **kwargs):
+        """WorkersRamp.
+
+        :param workers_distribution: runtime workers count per app
+        :type workers_distribution: dict[str, int]
+        """
+        super(WorkersRamp, self).__init__(context, **kwargs)
+
+        self._app_config = context.config
+        self.workers_distribution = workers_distribution
+        self._clock = clock
+
+        self.ramps = dict()
+
+    @property
+    def _config(self):
+        return self._app_config.ramp
+
+    @property
+    def enabled(self):
+        return self._config.enabled
+
+    def _start_ramp(self, app, profile, workers, state_version, base):
+        step = max(self._config.step, 1)
+
+        if workers - base <= step:
+            self.ramps.pop(app, None)
+            return workers
+
+        written = base + step
+        self.ramps[app] = RampRecord(
+            profile, workers, written, state_version, self._clock())
+
+        self.metrics_cnt['ramps_started'] += 1
+        self.info(
+            'ramping up workers of app {} from {} to {}, first step {}',
+            app, base, workers, written)
+
+        return written
+
+    def plan(self, to_adjust, state_version, current_workers, exempt=()):
+        """Replace large workers increases with their first step.
+
+        Apps with ramp in progress towards the same target are skipped, as
+        they would be advanced by `due_steps`.
+
+        :param to_adjust: list of (app, profile, workers) records
+        :type to_adjust: list[(str, str, int)]
+
+        :param current_workers: maps app to currently applied workers count
+        :type current_workers: callable
+
+        :param exempt: apps ramped from zero workers, e.g. just started ones
+        :type exempt: set[str]
+
+        :return: records to write right now
+        :rtype: list[(str, str, int)]
+        """
+        if not self._config.enabled:
+            self.ramps.clear()
+            return to_adjust
+
+        to_write = []
+        for app, profile, workers in to_adjust:
+            ramp = self.ramps.get(app)
+
+            if ramp is not None and app not in exempt:
+                if workers <= ramp.written:
+                    # Decrease (or fulfilled increase), apply immediately.
+                    del self.ramps[app]
+                    to_write.append((app, profile, workers))
+                    continue
+
+                self.ramps[app] = ramp._replace(
+                    profile=profile, target=workers,
+                    state_version=state_version)
+
+                self.metrics_cnt['ramp_controls_skipped'] += 1
+                continue
+
+            if app in exempt:
+                base = 0
+            else:
+                base = max(
+                    current_workers(app) or 0,
+                    self.workers_distribution.get(app, 0))
+
+            if workers <= base:
+                self.ramps.pop(app, None)
+                to_write.append((app, profile, workers))
+                continue
+
+            to_write.append((
+                app, profile,
+                self._start_ramp(app, profile, workers, state_version, base)))
+
+        return to_write
+
+    def due_steps(self, is_running):
+        """Find ramps ready to make next step and advance them.
+
+        :param is_running: predicate whether app is still running
+        :type is_running: callable
+
+        :return: (app, profile, workers, state_version) records to write
+        :rtype: list[(str, str, int, int)]
+        """
+        now = self._clock()
+        step = max(self._config.step, 1)
+
+        to_write = []
+        for app, ramp in self.ramps.items():
+            if not is_running(app):
+                self.debug('app {} is not running, dropping its ramp', app)
+                del self.ramps[app]
+                continue
+
+            if now - ramp.written_at < self._config.interval_sec:
+                continue
+
+            if self.workers_distribution.get(app, 0) < ramp.written:
+                if now - ramp.written_at < self._config.confirm_timeout_sec:
+                    continue
+
+                self.warn(
+                    'ramp step {} of app {} is not confirmed in {:.1f}s, '
+                    'advancing anyway',
+                    ramp.written, app, now - ramp.written_at)
+                self.metrics_cnt['ramp_confirm_timeouts'] += 1
+
+            written = min(ramp.written + step, ramp.target)
+            if written >= ramp.target:
+                del self.ramps[app]
+                self.metrics_cnt['ramps_completed'] += 1
+            else:
+                self.ramps[app] = ramp._replace(
+                    written=written, written_at=now)
+
+            self.metrics_cnt['ramp_steps'] += 1
+            to_write.append((app, ramp.profile, written, ramp.state_version))
+
+        return to_write
+
+    def get_count_metrics(self):
+        metrics = dict(super(WorkersRamp, self).get_count_metrics())
+        metrics.update(in_progress=len(self.ramps))
+
+        return metrics
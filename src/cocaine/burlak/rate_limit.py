@@ -0,0 +1,162 @@
+"""Rate limiting of applications start.
+
+Every `node.start_app` spawns isolates, so mass start (e.g. on fresh node)
+could overload process spawner of the host. Starts are throttled with global
+token bucket and optional per-profile buckets, as spawn cost differs a lot
+for different isolation profiles.
+"""
+import time
+
+from tornado import gen
+
+from .mixins import MetricsMixin
+
+
+class TokenBucket(object):
+    """Classical token bucket with reservation semantics.
+
+    Token could be reserved in advance, so bucket level could go below zero,
+    delay to wait for reserved token is returned to caller.
+    """
+
+    def __init__(self, rate, burst, clock=time.time):
+        """TokenBucket.
+
+        :param rate: tokens refill rate per second
+        :type rate: float
+
+        :param burst: bucket capacity
+        :type burst: int
+        """
+        if rate <= 0:
+            raise ValueError('rate should be greater then zero')
+
+        self._rate = float(rate)
+        self._burst = max(float(burst), 1.0)
+        self._clock = clock
+
+        self._tokens = self._burst
+        self._last = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def reserve(self):
+        """Reserve one token.
+
+        :return: delay in seconds to wait before token could be used
+        :rtype: float
+        """
+        self._refill()
+        self._tokens -= 1
+
+        if self._tokens >= 0:
+            return 0.0
+
+        return -self._tokens / self._rate
+
+    @property
+    def tokens(self):
+        """Currently available tokens, negative if some are reserved."""
+        self._refill()
+        return self._tokens
+
+    def as_dict(self):
+        return dict(
+            rate=self._rate,
+            burst=self._burst,
+            tokens=self.tokens,
+        )
+
+
+class StartRateLimiter(MetricsMixin):
+    """Limits rate of applications start with global and profile buckets."""
+
+    def __init__(self, config, clock=time.time, **kwargs):
+        """StartRateLimiter.
+
+        :param config: start rate limit config
+        :type config: config.StartRateLimitConfig
+        """
+        super(StartRateLimiter, self).__init__(**kwargs)
+
+        self._enabled = config.enabled
+
+        self._global = TokenBucket(config.rate, config.burst, clock) \
+            if config.rate > 0 else None
+
+        self._profiles = {
+            profile: TokenBucket(
+                limit['rate'], limit.get('burst', config.burst), clock)
+            for profile, limit in config.profiles.iteritems()
+            if limit.get('rate', 0) > 0
+        }
+
+        self.last_wait_sec = 0.0
+        self.max_wait_sec = 0.0
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    def reserve(self, profile):
+        """Reserve start slot for app with specified profile.
+
+        :return: delay in seconds to wait before start
+        :rtype: float
+        """
+        delays = [0.0]
+
+        if self._global is not None:
+            delays.append(self._global.reserve())
+
+        if profile in self._profiles:
+            delays.append(self._profiles[profile].reserve())
+
+        return max(delays)
+
+    @gen.coroutine
+    def acquire(self, profile):
+        """Wait until app with specified profile is allowed to start."""
+        if not self._enabled:
+            return
+
+        delay = self.reserve(profile)
+
+        self.metrics_cnt['starts_admitted'] += 1
+        self.last_wait_sec = delay
+        self.max_wait_sec = max(self.max_wait_sec, delay)
+
+        if delay > 0:
+            self.metrics_cnt['starts_delayed'] += 1
+            self.metrics_cnt['waiting'] += 1
+            try:
+                yield gen.sleep(delay)
+            finally:
+                self.metrics_cnt['waiting'] -= 1
+
+            self.metrics_cnt['wait_time_ms'] += int(delay * 1000)
+
+    def as_dict(self):
+        """Current buckets state and wait times."""
+        return dict(
+            enabled=self._enabled,
+            last_wait_sec=self.last_wait_sec,
+            max_wait_sec=self.max_wait_sec,
+            buckets=dict(
+                all=self._global.as_dict() if self._global else {},
+                profiles={
+                    profile: bucket.as_dict()
+                    for profile, bucket in self._profiles.iteritems()
+                },
+            ),
+        )
+
+    def get_count_metrics(self):
+        metrics = dict(super(StartRateLimiter, self).get_count_metrics())
+        metrics.update(self.as_dict())
+
+        return metrics
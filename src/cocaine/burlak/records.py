@@ -0,0 +1,253 @@
+"""Committed state records with aggregates, index and expiry queue.
+
+Per state records count and workers sum are maintained on every change, apps
+in `indexed_states` are also indexed by state version, so aggregates are
+available without full scan.
+
+Mutations are counted, and once `track_changes` is called apps changed
+since last `take_changed` call are tracked as well, so views derived from
+records (e.g. serialized ones) could be updated incrementally. Tracking is
+off by default, so storage without derived views doesn't pay for it.
+
+Records in `expirable_states` are queued in a heap by their time stamp, so
+expiration touches only records which are due. Heap entries are invalidated
+lazily: entry is valid while it matches time stamp queued for the app.
+"""
+import heapq
+
+from collections import MutableMapping, defaultdict
+
+
+class IndexedRecords(MutableMapping):
+    """Maps app to its committed state record.
+
+    Records are constructed with `record_type`, which should accept
+    (state, workers, profile, state_version, state_description, time_stamp)
+    fields in that order.
+
+    Apps in one of `indexed_states` are indexed by state version, see
+    `apps_in`, records in one of `expirable_states` could be expired with
+    `pop_expired`.
+    """
+
+    # Heap is rebuilt when stale entries outnumber valid ones by this factor.
+    STALE_FACTOR = 2
+    MIN_HEAP_TO_COMPACT = 1024
+
+    def __init__(self, record_type, indexed_states=(), expirable_states=()):
+        self._record_type = record_type
+        self._indexed_states = tuple(indexed_states)
+        self._expirable_states = frozenset(expirable_states)
+
+        self.mutations = 0
+        # None while changes are not tracked.
+        self._changed = None
+
+        self._reset()
+
+    def _reset(self):
+        self._records = dict()
+
+        self._counts = defaultdict(int)
+        self._workers_sum = defaultdict(int)
+        self._by_version = {state: dict() for state in self._indexed_states}
+
+        # Heap of (time_stamp, app) and time stamp of valid entry per app.
+        self._expiry = []
+        self._queued = dict()
+
+    def _account(self, app, record, sign):
+        state = record.state
+
+        self._counts[state] += sign
+        self._workers_sum[state] += sign * record.workers
+
+        if not self._counts[state]:
+            del self._counts[state]
+            del self._workers_sum[state]
+
+        by_version = self._by_version.get(state)
+        if by_version is None:
+            return
+
+        if sign > 0:
+            by_version.setdefault(record.state_version, set()).add(app)
+            return
+
+        apps = by_version[record.state_version]
+        apps.discard(app)
+        if not apps:
+            del by_version[record.state_version]
+
+    def set(self, app, state, workers, profile, state_version, description,
+            time_stamp):
+        """Set record fields.
+
+        :return: previous record (None if there wasn't any) and new record
+        :rtype: (record_type | None, record_type)
+        """
+        record = self._record_type(
+            state, workers, profile, state_version, description, time_stamp)
+
+        old = self._records.get(app)
+        self._records[app] = record
+
+        if old is not None and old.state == state and \
+                state not in self._by_version:
+            # Common case of workers update, only workers sum is changed.
+            self._workers_sum[state] += workers - old.workers
+        else:
+            if old is not None:
+                self._account(app, old, -1)
+
+            self._account(app, record, 1)
+
+        self._mark_changed(app)
+
+        if state in self._expirable_states:
+            self._enqueue(app, time_stamp)
+        else:
+            self._queued.pop(app, None)
+
+        return old, record
+
+    def _mark_changed(self, app):
+        self.mutations += 1
+
+        if self._changed is not None:
+            self._changed.add(app)
+
+    def track_changes(self):
+        """Start tracking of changed apps, see `take_changed`."""
+        if self._changed is None:
+            self._changed = set()
+
+    def take_changed(self):
+        """Get apps changed (set or removed) since previous call.
+
+        :return: changed apps or None if changes are not tracked
+        :rtype: set[str] | None
+        """
+        if self._changed is None:
+            return None
+
+        changed, self._changed = self._changed, set()
+        return changed
+
+    def _enqueue(self, app, time_stamp):
+        if self._queued.get(app) == time_stamp:
+            return
+
+        self._queued[app] = time_stamp
+        heapq.heappush(self._expiry, (time_stamp, app))
+
+        if len(self._expiry) > self.MIN_HEAP_TO_COMPACT and \
+                len(self._expiry) > self.STALE_FACTOR * len(self._queued):
+            self._expiry = [(ts, a) for a, ts in self._queued.iteritems()]
+            heapq.heapify(self._expiry)
+
+    def count(self, state):
+        """Number of records in `state`."""
+        return self._counts.get(state, 0)
+
+    def workers(self, state):
+        """Sum of workers of records in `state`."""
+        return self._workers_sum.get(state, 0)
+
+    def apps_in(self, state, version=None):
+        """Apps in one of indexed states.
+
+        :param state: one of `indexed_states`
+        :type state: str
+
+        :param version: if specified, only apps with that state version are
+            returned
+        :type version: int | None
+
+        :rtype: set[str]
+        """
+        by_version = self._by_version[state]
+
+        if version is not None:
+            return set(by_version.get(version, ()))
+
+        return set().union(*by_version.itervalues())
+
+    def pop_expired(self, states, before):
+        """Remove records in one of `states` updated before specified time.
+
+        Only records in `expirable_states` are considered, complexity
+        depends on number of due records, not on the whole records count.
+
+        :param states: state names
+        :type states: iterable[str]
+
+        :param before: timestamp
+        :type before: int | float
+
+        :return: removed records
+        :rtype: dict[str, record_type]
+        """
+        states = frozenset(states)
+
+        expired, keep = [], []
+        while self._expiry and self._expiry[0][0] < before:
+            time_stamp, app = heapq.heappop(self._expiry)
+
+            if self._queued.get(app) != time_stamp:
+                continue
+
+            # Unqueued, so duplicate entry of the app is skipped.
+            del self._queued[app]
+
+            if self._records[app].state in states:
+                expired.append(app)
+            else:
+                keep.append((time_stamp, app))
+
+        for time_stamp, app in keep:
+            self._enqueue(app, time_stamp)
+
+        removed = dict()
+        for app in expired:
+            removed[app] = self._records[app]
+            del self[app]
+
+        return removed
+
+    def __getitem__(self, app):
+        return self._records[app]
+
+    def __setitem__(self, app, record):
+        self.set(app, *record)
+
+    def __delitem__(self, app):
+        record = self._records.pop(app)
+        self._account(app, record, -1)
+
+        self._queued.pop(app, None)
+        self._mark_changed(app)
+
+    def __contains__(self, app):
+        return app in self._records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, app, default=None):
+        return self._records.get(app, default)
+
+    def iteritems(self):
+        return self._records.iteritems()
+
+    def clear(self):
+        if self._records:
+            self.mutations += 1
+
+            if self._changed is not None:
+                self._changed.update(self._records)
+
+        self._reset()
@@ -0,0 +1,289 @@
+"""Rolling restart of applications with changed profile.
+
+Profile change could be applied only by application restart, so such apps
+are restarted in waves with `stop -> start with new profile -> control`
+sequence. Wave size is limited by `max_unavailable` setting, next wave is
+started only after apps of previous one have reported target workers count
+in workers distribution (or wave timeout has expired) and `wave_delay_sec`
+has passed.
+
+As apps are started by restart, wave starts are made under cluster run
+lock (holder is shared with `StateAggregator`), which is released right after
+starts as dispatch does, readiness is awaited without the lock. Wave without
+acquired lock is postponed.
+"""
+import time
+
+from collections import OrderedDict, namedtuple
+
+from tornado import gen
+from tornado import locks
+
+from .chcache import CloseReason
+from .loop_sentry import LoopSentry
+from .mixins import LoggerMixin, MetricsMixin
+
+
+RollTask = namedtuple('RollTask', [
+    'app',
+    'profile',
+    'workers',
+    'state_version',
+])
+
+
+class ProfileRoller(LoggerMixin, MetricsMixin, LoopSentry):
+    """Applies profile changes with rolling restart."""
+
+    TASK_NAME = 'profile_roller'
+
+    def __init__(self, context, workers_distribution, **kwargs):
+        """ProfileRoller.
+
+        :param workers_distribution: runtime workers count per app, updated
+                                     by `StateAggregator` on runtime polls
+        :type workers_distribution: dict[str, int]
+        """
+        super(ProfileRoller, self).__init__(context, **kwargs)
+
+        self.context = context
+        self.sentry_wrapper = context.sentry_wrapper
+        self.workers_distribution = workers_distribution
+
+        self.pending = OrderedDict()
+        self.in_progress = set()
+
+        self._condition = locks.Condition()
+
+        self.status = context.shared_status.register(ProfileRoller.TASK_NAME)
+
+    @property
+    def enabled(self):
+        return self.context.config.profile_update.enabled
+
+    @property
+    def busy(self):
+        """Apps waiting for restart or restarting right now."""
+        return set(self.pending.iterkeys()) | self.in_progress
+
+    def schedule(self, to_update, state, state_version):
+        """Schedule restart of apps with changed profile.
+
+        Pending apps which have gone from the state are dropped, targets of
+        other pending apps are updated to specified state.
+
+        :param to_update: apps with changed profile
+        :type to_update: set[str]
+
+        :param state: current state
+        :type state: dict[str, StateRecord]
+        """
+        for app in list(self.pending.iterkeys()):
+            if app not in state:
+                self.info('app {} has gone, cancelling its restart', app)
+                del self.pending[app]
+                continue
+
+            record = state[app]
+            self.pending[app] = RollTask(
+                app, record.profile, record.workers, state_version)
+
+        for app in sorted(to_update):
+            record = state[app]
+
+            self.pending.pop(app, None)
+            self.pending[app] = RollTask(
+                app, record.profile, record.workers, state_version)
+
+        if to_update:
+            self.info('profile update scheduled for apps {}', to_update)
+            self.metrics_cnt['scheduled'] += len(to_update)
+
+            self._condition.notify()
+
+        self.metrics_cnt['pending'] = len(self.pending)
+
+    def clear(self):
+        """Drop all pending restarts, e.g. on state reset."""
+        self.pending.clear()
+        self.metrics_cnt['pending'] = 0
+
+    def postpone(self, wave):
+        """Return not started wave to the head of pending queue.
+
+        Targets scheduled for wave apps in the meantime take precedence.
+        """
+        pending = OrderedDict((task.app, task) for task in wave)
+        pending.update(self.pending)
+
+        self.pending = pending
+        self.metrics_cnt['pending'] = len(self.pending)
+
+    def next_wave(self):
+        """Take next wave of apps to restart."""
+        max_unavailable = max(
+            self.context.config.profile_update.max_unavailable, 1)
+
+        wave = []
+        while self.pending and len(wave) < max_unavailable:
+            _, task = self.pending.popitem(last=False)
+            wave.append(task)
+
+        self.metrics_cnt['pending'] = len(self.pending)
+
+        return wave
+
+    @gen.coroutine
+    def restart(self, elysium, task, tm):
+        """Restart app with new profile.
+
+        :type elysium: burlak.AppsElysium
+
+        :return: whether app was started with new profile
+        :rtype: bool
+        """
+        self.info(
+            'restarting app {} with profile {}', task.app, task.profile)
+
+        yield elysium.channels_cache.close_and_remove(
+            [task.app], CloseReason.RESTART)
+        yield elysium.slay(task.app, task.state_version, tm)
+
+        # Stale workers count of app with previous profile shouldn't be
+        # taken as readiness mark.
+        self.workers_distribution.pop(task.app, None)
+
+        started = set()
+        yield elysium.start(
+            task.app, task.profile, task.state_version, tm, started)
+
+        if task.app not in started:
+            self.metrics_cnt['restart_failed'] += 1
+            raise gen.Return(False)
+
+        raise gen.Return(True)
+
+    @gen.coroutine
+    def control(self, elysium, task, tm):
+        """Send target workers count to restarted app."""
+        yield elysium.adjust_by_channel(
+            task.app, task.profile, task.workers, task.state_version, tm)
+
+        self.metrics_cnt['restarted'] += 1
+
+    @gen.coroutine
+    def wait_for_wave(self, wave):
+        """Wait until apps of the wave report target workers count.
+
+        :return: whether all apps are ready before timeout
+        :rtype: bool
+        """
+        config = self.context.config.profile_update
+        deadline = time.time() + config.wave_timeout_sec
+
+        while self.should_run():
+            not_ready = [
+                task.app for task in wave
+                if self.workers_distribution.get(task.app) != task.workers
+            ]
+
+            if not not_ready:
+                raise gen.Return(True)
+
+            if time.time() >= deadline:
+                self.warn(
+                    'wave readiness timeout, apps not ready {}', not_ready)
+                self.metrics_cnt['wave_timeouts'] += 1
+
+                raise gen.Return(False)
+
+            self.status.mark_ok('waiting for wave apps to be ready')
+            yield gen.sleep(config.gate_poll_interval_sec)
+
+        raise gen.Return(False)
+
+    @gen.coroutine
+    def roll_wave(self, elysium, semaphore, run_lock, wave):
+        """Restart apps of the wave under cluster run lock.
+
+        Lock is released once restarts are done, before control is sent.
+
+        :param run_lock: run lock holder shared with `StateAggregator`
+        :type run_lock: semaphore.LockHolder
+
+        :return: restarted apps tasks or None if wave was postponed, as run
+                 lock wasn't acquired
+        :rtype: list[RollTask] | None
+        """
+        if not run_lock.has_lock:
+            yield semaphore.try_to_acquire_lock(run_lock)
+
+        if not run_lock.has_lock:
+            self.info(
+                'no run lock, postponing wave of apps {}', self.in_progress)
+            self.metrics_cnt['run_lock_misses'] += 1
+
+            self.postpone(wave)
+            raise gen.Return(None)
+
+        self.status.mark_ok('restarting apps wave')
+        self.info('restarting wave of apps {}', self.in_progress)
+
+        tm = time.time()
+        try:
+            restarted = yield [
+                self.restart(elysium, task, tm) for task in wave]
+        finally:
+            yield semaphore.release_lock_holder(run_lock)
+
+        restarted = [task for task, ok in zip(wave, restarted) if ok]
+        yield [self.control(elysium, task, tm) for task in restarted]
+
+        raise gen.Return(restarted)
+
+    @gen.coroutine
+    def roll(self, elysium, semaphore, run_lock):
+        """Profile updates processing loop.
+
+        :param elysium: apps control unit
+        :type elysium: burlak.AppsElysium
+
+        :param semaphore: cluster run lock source
+        :type semaphore: semaphore.Semaphore
+
+        :param run_lock: run lock holder shared with `StateAggregator`
+        :type run_lock: semaphore.LockHolder
+        """
+        config = self.context.config.profile_update
+
+        while self.should_run():
+            try:
+                if not self.pending:
+                    self.status.mark_ok('waiting for profile updates')
+                    yield self._condition.wait(
+                        timeout=time.time() + config.wave_delay_sec)
+                    continue
+
+                wave = self.next_wave()
+                self.in_progress = {task.app for task in wave}
+
+                restarted = yield self.roll_wave(
+                    elysium, semaphore, run_lock, wave)
+                if restarted is None:
+                    yield gen.sleep(config.gate_poll_interval_sec)
+                    continue
+
+                yield self.wait_for_wave(restarted)
+
+                self.metrics_cnt['waves'] += 1
+                yield elysium.submitter.post_committed_state()
+
+                yield gen.sleep(config.wave_delay_sec)
+            except Exception as e:
+                self.error('failed to restart apps wave: {}', e)
+                self.sentry_wrapper.capture_exception()
+                self.status.mark_warn('failed to restart apps wave')
+
+                yield gen.sleep(self.context.config.async_error_timeout_sec)
+            finally:
+                self.in_progress = set()
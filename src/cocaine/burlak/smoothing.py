@@ -0,0 +1,158 @@
+"""Hysteresis for incoming state workers changes.
+
+Scheduler sometimes oscillates apps workers targets around some value,
+following every such change leads to control writes and workers churn. With
+smoothing enabled workers change which is below `abs_threshold` workers or
+below `rel_threshold` of current workers count is held and applied only if
+it persists for `dwell_sec` seconds. Large changes, scale to zero, profile
+changes and new apps are passed through immediately.
+"""
+import time
+
+from collections import namedtuple
+
+from .mixins import LoggerMixin, MetricsMixin
+
+
+HeldRecord = namedtuple('HeldRecord', [
+    'record',
+    'since',
+])
+
+
+class StateSmoother(LoggerMixin, MetricsMixin):
+    """Holds small workers changes of incoming state."""
+
+    def __init__(self, context, clock=time.time, **kwargs):
+        super(StateSmoother, self).__init__(context, **kwargs)
+
+        self._app_config = context.config
+        self._clock = clock
+
+        # Last state records passed to dispatch.
+        self.effective = dict()
+        self.held = dict()
+
+    @property
+    def _config(self):
+        return self._app_config.smoothing
+
+    @property
+    def enabled(self):
+        return self._config.enabled
+
+    def clear(self):
+        self.effective.clear()
+        self.held.clear()
+
+    def is_small_change(self, current, workers):
+        if not workers or not current:
+            return False
+
+        delta = abs(workers - current)
+
+        return \
+            delta < self._config.abs_threshold or \
+            float(delta) / current < self._config.rel_threshold
+
+    def _drop_held(self, app):
+        if self.held.pop(app, None) is not None:
+            self.metrics_cnt['avoided_writes'] += 1
+
+    def _pass(self, app, record):
+        self.effective[app] = record
+        return record
+
+    def _hold(self, app, record, current, now):
+        held = self.held.get(app)
+
+        if held is None:
+            held = HeldRecord(record, now)
+            self.metrics_cnt['held_changes'] += 1
+        else:
+            if held.record.workers != record.workers:
+                self.metrics_cnt['avoided_writes'] += 1
+
+            held = held._replace(record=record)
+
+        if now - held.since >= self._config.dwell_sec:
+            self.held.pop(app, None)
+            self.metrics_cnt['released_changes'] += 1
+            return self._pass(app, record)
+
+        self.held[app] = held
+
+        return self._pass(app, record._replace(workers=current.workers))
+
+    def smooth(self, state):
+        """Make state to be dispatched from incoming one.
+
+        :param state: incoming state
+        :type state: dict[str, StateRecord]
+
+        :return: state with small workers changes replaced by currently
+            effective workers count
+        :rtype: dict[str, StateRecord]
+        """
+        if not self._config.enabled:
+            self.clear()
+            return state
+
+        now = self._clock()
+
+        for app in self.effective.keys():
+            if app not in state:
+                del self.effective[app]
+                self._drop_held(app)
+
+        smoothed = dict()
+        for app, record in state.iteritems():
+            current = self.effective.get(app)
+
+            if current is None or current.profile != record.profile or \
+                    current.workers == record.workers or \
+                    not self.is_small_change(current.workers, record.workers):
+                self._drop_held(app)
+                smoothed[app] = self._pass(app, record)
+                continue
+
+            smoothed[app] = self._hold(app, record, current, now)
+
+        if self.held:
+            self.debug('workers changes on hold {}', self.held)
+
+        return smoothed
+
+    def release(self, state):
+        """Get held changes persisted for `dwell_sec`.
+
+        :param state: currently dispatched state
+        :type state: dict[str, StateRecord]
+
+        :return: records to be applied to dispatched state
+        :rtype: dict[str, StateRecord]
+        """
+        now = self._clock()
+
+        released = dict()
+        for app, held in self.held.items():
+            if now - held.since < self._config.dwell_sec:
+                continue
+
+            del self.held[app]
+
+            if app in state:
+                released[app] = self._pass(app, held.record)
+
+        if released:
+            self.info(
+                'applying held workers changes for apps {}', released.keys())
+            self.metrics_cnt['released_changes'] += len(released)
+
+        return released
+
+    def get_count_metrics(self):
+        metrics = dict(super(StateSmoother, self).get_count_metrics())
+        metrics.update(held_apps=len(self.held))
+
+        return metrics
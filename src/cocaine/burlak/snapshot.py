@@ -0,0 +1,284 @@
+"""Durable local snapshot of committed state.
+
+Committed state, last applied state version, runtime uuid, apps stopped by
+control and apps with opened channels are periodically saved to local file,
+so after restart orca resumes with correct feedback and could skip controls
+which were already applied before restart.
+
+File is written atomically (temporary file, fsync and rename) from a
+separate thread. Snapshot which is too old, malformed or written with other
+format version is not restored, malformed one is moved aside.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+
+from .comm_state import CommittedState
+from .loop_sentry import LoopSentry
+from .mixins import LoggerMixin, MetricsMixin
+
+
+FORMAT_VERSION = 1
+
+CORRUPTED_SUFFIX = '.corrupted'
+TMP_SUFFIX = '.tmp'
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def run_in_thread(fn, *args):
+    """Run blocking `fn` in a separate thread.
+
+    :rtype: tornado.concurrent.Future
+    """
+    future = Future()
+    io_loop = IOLoop.current()
+
+    def run():
+        try:
+            result = fn(*args)
+        except Exception:
+            io_loop.add_callback(future.set_exc_info, sys.exc_info())
+        else:
+            io_loop.add_callback(future.set_result, result)
+
+    thread = threading.Thread(target=run, name='snapshot')
+    thread.daemon = True
+    thread.start()
+
+    return future
+
+
+def write_atomically(path, payload):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    data = json.dumps(payload)
+
+    tmp_path = path + TMP_SUFFIX
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.rename(tmp_path, path)
+
+    return len(data)
+
+
+def parse_snapshot(data):
+    """Validate snapshot content and convert it to restorable form.
+
+    :raises SnapshotError: on malformed snapshot
+    """
+    try:
+        payload = json.loads(data)
+
+        if payload['format'] != FORMAT_VERSION:
+            raise SnapshotError(
+                'unsupported format {}'.format(payload['format']))
+
+        records = {
+            app: CommittedState.Record(
+                str(state),
+                int(workers),
+                profile,
+                int(state_version),
+                description,
+                int(time_stamp))
+            for app, (
+                state, workers, profile, state_version, description,
+                time_stamp,
+            ) in payload['state'].iteritems()
+        }
+
+        return dict(
+            saved_at=float(payload['saved_at']),
+            version=int(payload['version']),
+            uuid=payload['uuid'],
+            records=records,
+            stopped_by_control=set(payload['stopped_by_control']),
+            channels_apps=list(payload['channels_apps']),
+        )
+    except SnapshotError:
+        raise
+    except Exception as e:
+        raise SnapshotError('{}: {}'.format(type(e).__name__, e))
+
+
+class StateSnapshot(LoggerMixin, MetricsMixin, LoopSentry):
+    """Saves and restores committed state snapshot."""
+
+    def __init__(
+            self, context, committed_state, apps_elysium, clock=time.time,
+            **kwargs):
+        super(StateSnapshot, self).__init__(context, **kwargs)
+
+        self._app_config = context.config
+        self.sentry_wrapper = context.sentry_wrapper
+
+        self.ci_state = committed_state
+        self.apps_elysium = apps_elysium
+
+        self._clock = clock
+
+        # Fingerprint of last saved content, used to skip unchanged writes.
+        self._saved = None
+        self.saved_at = None
+
+    @property
+    def _config(self):
+        return self._app_config.committed_state
+
+    @property
+    def enabled(self):
+        return self._config.snapshot_enabled
+
+    @property
+    def path(self):
+        return self._config.snapshot_path
+
+    def _fingerprint(self):
+        return (
+            self.ci_state.journal.seq,
+            self.ci_state.version,
+            self.ci_state.uuid,
+            frozenset(self.apps_elysium.stopped_by_control),
+            tuple(self.ci_state.channels_cache_apps),
+        )
+
+    def make_payload(self):
+        return dict(
+            format=FORMAT_VERSION,
+            saved_at=self._clock(),
+            version=self.ci_state.version,
+            uuid=self.ci_state.uuid,
+            state={
+                app: tuple(record)
+                for app, record in self.ci_state.as_dict().iteritems()
+            },
+            stopped_by_control=list(self.apps_elysium.stopped_by_control),
+            channels_apps=list(self.ci_state.channels_cache_apps),
+        )
+
+    @gen.coroutine
+    def save(self):
+        """Write snapshot if anything has changed since last one."""
+        fingerprint = self._fingerprint()
+        if fingerprint == self._saved:
+            self.metrics_cnt['snapshots_skipped'] += 1
+            return
+
+        # Payload is built within IO loop, as state is not thread safe.
+        payload = self.make_payload()
+
+        started = time.time()
+        size = yield run_in_thread(write_atomically, self.path, payload)
+
+        self._saved = fingerprint
+        self.saved_at = payload['saved_at']
+
+        self.metrics_cnt['snapshots_saved'] += 1
+        self.metrics_cnt['snapshot_size'] = size
+
+        self.debug(
+            'state snapshot with {} apps saved in {:.3f}s',
+            len(payload['state']), time.time() - started)
+
+    def _move_aside(self):
+        try:
+            os.rename(self.path, self.path + CORRUPTED_SUFFIX)
+        except OSError as e:  # pragma nocover
+            self.error('failed to move aside broken snapshot: {}', e)
+
+    def load(self):
+        """Read snapshot from disk.
+
+        :return: snapshot content or None if it couldn't be used
+        :rtype: dict | None
+        """
+        try:
+            with open(self.path) as f:
+                data = f.read()
+        except IOError as e:
+            self.info('no state snapshot loaded: {}', e)
+            return None
+
+        try:
+            snapshot = parse_snapshot(data)
+        except SnapshotError as e:
+            self.error('state snapshot {} is broken: {}', self.path, e)
+            self.metrics_cnt['snapshots_corrupted'] += 1
+            self._move_aside()
+            return None
+
+        age = self._clock() - snapshot['saved_at']
+        if age > self._config.snapshot_max_age_sec:
+            self.info('state snapshot is too old ({:.0f}s), skipped', age)
+            self.metrics_cnt['snapshots_expired'] += 1
+            return None
+
+        return snapshot
+
+    def restore(self):
+        """Restore committed state from snapshot, if any.
+
+        Should be called on startup before control loops are run.
+
+        :return: True if state was restored
+        :rtype: bool
+        """
+        if not self.enabled:
+            return False
+
+        snapshot = self.load()
+        if snapshot is None:
+            return False
+
+        self.ci_state.restore(
+            snapshot['records'],
+            snapshot['version'],
+            snapshot['uuid'],
+            snapshot['channels_apps'])
+        self.apps_elysium.restore(
+            snapshot['records'].viewkeys(), snapshot['stopped_by_control'])
+
+        self.metrics_cnt['snapshots_restored'] += 1
+        self.info(
+            'restored state snapshot version {} with {} apps, age {:.0f}s',
+            snapshot['version'], len(snapshot['records']),
+            self._clock() - snapshot['saved_at'])
+
+        return True
+
+    @gen.coroutine
+    def snapshot_loop(self):
+        while self.should_run():
+            yield gen.sleep(self._config.snapshot_interval_sec)
+
+            if not self.enabled:
+                continue
+
+            try:
+                yield self.save()
+            except Exception as e:  # pragma nocover
+                self.error('failed to save state snapshot: {}', e)
+                self.metrics_cnt['snapshot_failures'] += 1
+                self.sentry_wrapper.capture_exception()
+
+    def get_count_metrics(self):
+        metrics = dict(super(StateSnapshot, self).get_count_metrics())
+
+        if self.saved_at is not None:
+            metrics.update(snapshot_age_sec=self._clock() - self.saved_at)
+
+        return metrics
@@ -0,0 +1,148 @@
+"""Fast retry of control for apps in spooling state.
+
+Control sent to the app which is still spooling (e.g. its image is being
+downloaded) fails with invalid state error, such app is marked as SPOOLING
+in committed state and would be controlled again on next aggregation cycle
+only. As spooling usually takes seconds, control of such apps is retried
+with backing-off interval, starting from `initial_delay_sec` up to
+`max_delay_sec`. Apps still spooling after `max_wait_sec` are left to the
+regular aggregation cycle.
+"""
+import time
+
+from collections import namedtuple
+
+from .metrics import Histogram
+from .mixins import LoggerMixin, MetricsMixin
+
+
+SpoolingRecord = namedtuple('SpoolingRecord', [
+    'profile',
+    'workers',
+    'state_version',
+    'since',
+    'delay',
+    'next_at',
+])
+
+
+class SpoolingWatcher(LoggerMixin, MetricsMixin):
+    """Keeps track of spooling apps and their retry schedule."""
+
+    def __init__(self, context, clock=time.time, **kwargs):
+        super(SpoolingWatcher, self).__init__(context, **kwargs)
+
+        self._app_config = context.config
+        self._clock = clock
+
+        self.pending = dict()
+
+        self.spooling_time = Histogram()
+
+    @property
+    def _config(self):
+        return self._app_config.spooling
+
+    @property
+    def enabled(self):
+        return self._config.enabled
+
+    def watch(self, app, profile, workers, state_version):
+        """Schedule control retry for spooling app.
+
+        If app is already watched only control target is updated.
+        """
+        if not self._config.enabled:
+            return
+
+        record = self.pending.get(app)
+        if record is not None:
+            self.pending[app] = record._replace(
+                profile=profile, workers=workers, state_version=state_version)
+            return
+
+        now = self._clock()
+        delay = self._config.initial_delay_sec
+
+        self.pending[app] = SpoolingRecord(
+            profile, workers, state_version, now, delay, now + delay)
+
+        self.metrics_cnt['spooling_detected'] += 1
+
+    def forget(self, app):
+        """Stop watching app without recording spooling time.
+
+        Apps controlled by regular round should be `resolved` instead.
+        """
+        self.pending.pop(app, None)
+
+    def due(self):
+        """Get apps to retry control now.
+
+        Apps spooling longer then `max_wait_sec` are dropped.
+
+        :rtype: list[(str, SpoolingRecord)]
+        """
+        now = self._clock()
+
+        to_retry = []
+        for app, record in self.pending.items():
+            if now - record.since > self._config.max_wait_sec:
+                self.warn(
+                    'app {} is spooling for {:.1f}s, leaving it to '
+                    'aggregation cycle', app, now - record.since)
+
+                self.metrics_cnt['spooling_gave_up'] += 1
+                del self.pending[app]
+                continue
+
+            if record.next_at <= now:
+                to_retry.append((app, record))
+
+        return to_retry
+
+    def backoff(self, app):
+        """Postpone next retry of still spooling app."""
+        record = self.pending.get(app)
+        if record is None:
+            return
+
+        delay = min(
+            record.delay * self._config.backoff_factor,
+            self._config.max_delay_sec)
+
+        self.pending[app] = record._replace(
+            delay=delay, next_at=self._clock() + delay)
+
+        self.metrics_cnt['spooling_retries'] += 1
+
+    def resolved(self, app):
+        """Stop watching app which has left spooling state.
+
+        :return: time spent in spooling state in seconds
+        :rtype: float
+        """
+        record = self.pending.pop(app, None)
+        if record is None:
+            return 0.0
+
+        spent = self._clock() - record.since
+
+        self.spooling_time.observe(spent)
+        self.metrics_cnt['spooling_recovered'] += 1
+
+        return spent
+
+    def get_count_metrics(self):
+        now = self._clock()
+
+        metrics = dict(super(SpoolingWatcher, self).get_count_metrics())
+        metrics.update(
+            spooling_apps=len(self.pending),
+            longest_spooling_sec=max(
+                [now - record.since for record in self.pending.itervalues()]
+                or [0]),
+            spooling_time=self.spooling_time.as_dict(),
+        )
+
+        return metrics
@@ -38,6 +38,8 @@ def make_web_app_v1(opts):
     app = web.Application([
         (make_url(opts.prefix, API_V1, r'state'), StateV1Handler,
             dict(committed_state=opts.committed_state)),
+        (make_url(opts.prefix, API_V1, r'state/changes'), StateChangesHandler,
+            dict(committed_state=opts.committed_state)),
         (make_url(opts.prefix, API_V1, r'incoming_state'), IncomingStateHandle,
             dict(committed_state=opts.committed_state)),
         (opts.prefix + r'/state', StateHandler,
@@ -45,7 +47,9 @@ def make_web_app_v1(opts):
         (make_url(opts.prefix, API_V1, r'failed'), FailedStateHandle,
             dict(committed_state=opts.committed_state)),
         (make_url(opts.prefix, API_V1, r'channels'), ChannelsHandle,
-            dict(committed_state=opts.committed_state)),
+            dict(
+                committed_state=opts.committed_state,
+                channels_cache=opts.apps_elysium.channels_cache)),
         (make_url(opts.prefix, API_V1, r'distribution(/?[^/]*)'),
             WorkersDistribution,
             dict(workers_distribution=opts.workers_distribution)),
@@ -168,9 +172,54 @@ class StateV1Handler(web.RequestHandler):
             state_to_client = state
 
         state_with_meta['state'] = state_to_client
+
+        # Not a part of feedback payload, exposed for web clients only.
+        state_with_meta.update(
+            flapping=self.committed_state.flapping,
+            seq=self.committed_state.journal.seq,
+        )
+
         self.write(state_with_meta)
 
 
+class StateChangesHandler(web.RequestHandler):
+    '''Committed state changes since specified journal sequence
+
+    If requested changes are not available anymore, `refetch` flag is set and
+    client should get the whole state (with its `seq`) from `state` handler.
+
+    '''
+    def initialize(self, committed_state):
+        self.committed_state = committed_state
+
+    @gen.coroutine
+    def get(self):
+        try:
+            since = int(self.get_argument('since'))
+        except ValueError:
+            raise web.HTTPError(400, 'since should be integer')
+
+        changes = self.committed_state.changes_since(since)
+        seq = self.committed_state.journal.seq
+
+        if changes is None:
+            self.write(dict(refetch=True, seq=seq, changes=[]))
+            return
+
+        self.write(dict(
+            refetch=False,
+            seq=seq,
+            changes=[
+                dict(
+                    seq=entry.seq,
+                    app=entry.app,
+                    old=entry.old._asdict() if entry.old else None,
+                    new=entry.new._asdict() if entry.new else None,
+                ) for entry in changes
+            ],
+        ))
+
+
 class ZeroControlHandler(web.RequestHandler):
     def initialize(self, apps_elysium):
         self.apps_elysium = apps_elysium
@@ -191,10 +240,7 @@ class FailedStateHandle(web.RequestHandler):
     def get(self):
         version = self.committed_state.version
 
-        failed = [
-            app for app, state in self.committed_state.failed.iteritems()
-            if state.state_version == version
-        ]
+        failed = sorted(self.committed_state.failed_apps(version))
 
         self.write(dict(failed=failed, version=version))
         self.flush()
@@ -267,11 +313,16 @@ class WorkersDistribution(web.RequestHandler):
 
 
 class ChannelsHandle(web.RequestHandler):
-    '''Display apps with opened control channels
+    '''Display apps with opened control channels and cache metrics
     '''
-    def initialize(self, committed_state):
+    def initialize(self, committed_state, channels_cache):
         self.committed_state = committed_state
+        self.channels_cache = channels_cache
 
     @gen.coroutine
     def get(self):
-        self.write(dict(apps=self.committed_state.channels_cache_apps))
+        self.write(dict(
+            apps=self.committed_state.channels_cache_apps,
+            channels=self.channels_cache.describe(),
+            metrics=self.channels_cache.get_metrics(),
+        ))
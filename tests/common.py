@@ -3,6 +3,9 @@ Mostly copy-pasted from darkvoice/tests/common.py
 '''
 from collections import namedtuple
 
+from cocaine.burlak.config import Config
+from cocaine.burlak.context import Context, LoggerSetup
+
 import mock
 
 from tornado import gen
@@ -33,12 +36,12 @@ def make_mock_channels_list_with(sequence):
     return [make_future(MockChannel(v)) for v in sequence]
 
 
-def make_mock_control_channel_with(*v):
-    return make_future(MockControlChannel(*v))
+def make_mock_control_channel_with(*v, **kwargs):
+    return make_future(MockControlChannel(*v, **kwargs))
 
 
-def make_mock_control_list_with(sequence):
-    return [make_mock_control_channel_with([v]) for v in sequence]
+def make_mock_control_list_with(sequence, **kwargs):
+    return [make_mock_control_channel_with([v], **kwargs) for v in sequence]
 
 
 def make_logger_mock(mocker):
@@ -64,10 +67,14 @@ class MockChannel(object):
 
 
 class MockControlChannel(object):
-    def __init__(self, *values):
+    def __init__(self, *values, **kwargs):
+        # Control channel is persistent, tests expecting more than one ack
+        # per value should specify `acks` count explicitly.
+        acks = kwargs.get('acks', len(values))
+
         self.rx = mock.Mock()
         self.rx.get = \
-            mock.Mock(side_effect=[make_future(0) for v in values])
+            mock.Mock(side_effect=[make_future(0) for _ in xrange(acks)])
 
         self.tx = mock.Mock()
 
@@ -86,3 +93,25 @@ class MockSemaphore(object):
     @gen.coroutine
     def release_lock_holder(self, lock):
         lock.lock = None
+
+
+class Clock(object):
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_context(mocker, section, **overrides):
+    '''Make context with config `section` set to `overrides`'''
+    config = Config(mocker.Mock())
+    config._config[section] = overrides
+
+    return Context(
+        LoggerSetup(make_logger_mock(mocker), False),
+        config,
+        '0',
+        mocker.Mock(),
+        mocker.Mock(),
+    )
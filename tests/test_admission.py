@@ -0,0 +1,98 @@
+from cocaine.burlak.admission import AdmissionController
+from cocaine.burlak.metrics import Hub
+
+import pytest
+
+from .common import make_context
+
+
+ADMISSION_CONFIG = dict(
+    enabled=True,
+    cpu_load_high=0.8,
+    mem_usable_low=0.2,
+    loadavg_high=10,
+)
+
+
+@pytest.fixture
+def hub():
+    return Hub()
+
+
+def make_controller(mocker, hub, **kwargs):
+    admission_config = dict(ADMISSION_CONFIG)
+    admission_config.update(kwargs)
+
+    context = make_context(mocker, 'admission', **admission_config)
+
+    return AdmissionController(context, hub)
+
+
+@pytest.mark.parametrize(
+    'system,under_pressure',
+    [
+        ({}, False),
+        ({'cpu.load': 0.5, 'mem.usable': 0.5, 'loadavg': [1, 1, 1]}, False),
+        ({'cpu.load': 0.9, 'mem.usable': 0.5}, True),
+        ({'cpu.load': 0.5, 'mem.usable': 0.1}, True),
+        ({'cpu.load': 0.5, 'loadavg': [11, 1, 1]}, True),
+    ]
+)
+def test_pressure(mocker, hub, system, under_pressure):
+    hub.system = system
+    controller = make_controller(mocker, hub)
+
+    assert (controller.pressure() is not None) == under_pressure
+
+
+def test_disabled(mocker, hub):
+    hub.system = {'cpu.load': 1.0}
+    controller = make_controller(mocker, hub, enabled=False)
+
+    assert controller.pressure() is None
+    assert controller.admit_starts(['a', 'b']) == (['a', 'b'], [], None)
+
+
+def test_admit_starts(mocker, hub):
+    hub.system = {'cpu.load': 1.0}
+    controller = make_controller(mocker, hub, max_starts_under_pressure=1)
+
+    admitted, deferred, reason = controller.admit_starts(['a', 'b', 'c'])
+
+    assert admitted == ['a']
+    assert deferred == ['b', 'c']
+    assert 'cpu load' in reason
+    assert controller.get_count_metrics()['deferred_starts'] == 2
+
+
+@pytest.mark.parametrize('step', [0, 2])
+def test_admit_controls(mocker, hub, step):
+    hub.system = {'mem.usable': 0.0}
+    controller = make_controller(
+        mocker, hub, max_increase_under_pressure=step)
+
+    current = dict(up=1, down=10, same=3, new=1)
+    to_adjust = [
+        ('up', 'p', 5),
+        ('down', 'p', 2),
+        ('same', 'p', 3),
+        ('unknown', 'p', 100),
+        ('new', 'p', 10),
+    ]
+
+    admission = controller.admit_controls(
+        to_adjust, current.get, exempt={'new'})
+
+    assert admission.reason
+    assert ('down', 'p', 2) in admission.admitted
+    assert ('same', 'p', 3) in admission.admitted
+    assert ('unknown', 'p', 100) in admission.admitted
+    assert ('new', 'p', 10) in admission.admitted
+
+    if step:
+        assert ('up', 'p', 3) in admission.admitted
+        assert admission.throttled == [('up', 'p', 5)]
+        assert not admission.deferred
+    else:
+        assert admission.deferred == [('up', 'p', 5)]
+        assert not admission.throttled
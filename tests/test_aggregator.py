@@ -0,0 +1,120 @@
+from cocaine.burlak import burlak
+from cocaine.burlak.comm_state import CommittedState
+from cocaine.burlak.config import Config
+from cocaine.burlak.context import Context, LoggerSetup
+from cocaine.burlak.semaphore import LockHolder
+
+import pytest
+
+from tornado import queues
+
+from .common import ASYNC_TESTS_TIMEOUT, MockSemaphore
+from .common import make_future, make_logger_mock
+
+
+STATE = dict(
+    app1=burlak.StateRecord(1, 'p1'),
+    app2=burlak.StateRecord(2, 'p2'),
+)
+
+
+def make_aggregator(mocker, prewarmer=None, **dispatch):
+    config = Config(mocker.Mock())
+    config._config['dispatch'] = dispatch
+
+    context = Context(
+        LoggerSetup(make_logger_mock(mocker), False),
+        config,
+        '0',
+        mocker.Mock(),
+        mocker.Mock(),
+    )
+
+    return burlak.StateAggregator(
+        context,
+        mocker.Mock(),
+        CommittedState(),
+        queues.Queue(), queues.Queue(), mocker.Mock(),
+        1,
+        dict(),
+        prewarmer=prewarmer,
+    )
+
+
+def test_speculation_disabled(mocker):
+    aggregator = make_aggregator(mocker)
+
+    assert aggregator.speculate_run_lock(
+        MockSemaphore(), LockHolder(), STATE, set()) is None
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_speculate_run_lock(mocker):
+    aggregator = make_aggregator(mocker, speculative_run_lock=True)
+    semaphore = MockSemaphore()
+    run_lock = LockHolder()
+
+    # Nothing new to start.
+    assert aggregator.speculate_run_lock(
+        semaphore, run_lock, STATE, {'app1', 'app2'}) is None
+
+    speculation = aggregator.speculate_run_lock(
+        semaphore, run_lock, STATE, {'app1'})
+
+    yield speculation
+    assert run_lock.has_lock
+
+    aggregator.account_run_lock_speculation(run_lock, {'app2'})
+
+    # Already in run lock state.
+    assert aggregator.speculate_run_lock(
+        semaphore, run_lock, STATE, set()) is None
+
+    aggregator.account_run_lock_speculation(run_lock, set())
+    aggregator.account_run_lock_speculation(LockHolder(), {'app2'})
+
+    metrics = aggregator.get_count_metrics()
+
+    assert metrics['run_lock_speculations'] == 1
+    assert metrics['run_lock_speculation_hits'] == 1
+    assert metrics['run_lock_speculation_misses'] == 1
+    assert metrics['run_lock_speculation_failures'] == 1
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_prewarm_on_state_arrival(mocker):
+    events = []
+
+    prewarmer = mocker.Mock()
+    prewarmer.prewarm_channels = mocker.Mock(
+        side_effect=lambda apps: events.append(('prewarm', apps)))
+
+    aggregator = make_aggregator(mocker, prewarmer)
+
+    def get_running_apps_set():
+        events.append('running_apps')
+        return make_future({'app1', 'app3'})
+
+    aggregator.get_running_apps_set = mocker.Mock(
+        side_effect=get_running_apps_set)
+
+    for version in xrange(2):
+        yield aggregator.input_queue.put(
+            burlak.StateUpdateMessage(
+                {
+                    app: dict(workers=record.workers, profile=record.profile)
+                    for app, record in STATE.iteritems()
+                },
+                version,
+                'uuid'))
+
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, True, False])
+    yield aggregator.process_loop(MockSemaphore())
+
+    # Channels are pre-warmed before node is queried, for apps in state
+    # known to be running.
+    assert events == [
+        ('prewarm', set()), 'running_apps',
+        ('prewarm', {'app1'}), 'running_apps',
+    ]
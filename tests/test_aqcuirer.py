@@ -37,7 +37,7 @@ states_list = [
     (dict(
         app3=dict(workers=3, profile='SomeProfile3'),
         app4=dict(workers=4, profile='SomeProfile4'),
-        app5=dict(workers=5, profile='SomeProfile5'),
+        app5=dict(workers=5, profile='SomeProfile5', priority=10),
     ), 1),
 ]
 
@@ -110,7 +110,8 @@ def test_state_subscribe_input(acq, mocker):
         assert isinstance(inp, burlak.StateUpdateMessage)
 
         awaited_state = {
-            app: burlak.StateRecord(val['workers'], val['profile'])
+            app: burlak.StateRecord(
+                val['workers'], val['profile'], val.get('priority', 0))
             for app, val in state.iteritems()
         }
 
@@ -143,3 +144,25 @@ def test_state_broken_input(acq, mocker):
         cnt += 1
 
     assert cnt == len(states_list_broken)
+
+
+def test_invalid_priority_defaults(mocker):
+    logger = mocker.Mock()
+
+    state = burlak.transmute_and_filter_state(
+        dict(
+            app1=dict(workers=1, profile='p1', priority=None),
+            app2=dict(workers=2, profile='p2', priority='high'),
+            app3=dict(workers=3, profile='p3', priority='7'),
+            app4=dict(workers=4, profile='p4'),
+        ),
+        logger,
+    )
+
+    assert state == dict(
+        app1=burlak.StateRecord(1, 'p1', burlak.DEFAULT_APP_PRIORITY),
+        app2=burlak.StateRecord(2, 'p2', burlak.DEFAULT_APP_PRIORITY),
+        app3=burlak.StateRecord(3, 'p3', 7),
+        app4=burlak.StateRecord(4, 'p4', burlak.DEFAULT_APP_PRIORITY),
+    )
+    assert logger.warn.call_count == 2
@@ -1,10 +1,15 @@
 from cocaine.burlak import ChannelsCache
-from cocaine.burlak.chcache import _AppsCache
+from cocaine.burlak.chcache import CloseReason, _AppsCache
+from cocaine.burlak.config import Config
+from cocaine.burlak.pipeline import make_concurrency_limit
 from cocaine.services import Service
 
 import pytest
 
-from .common import ASYNC_TESTS_TIMEOUT, make_mock_channel_with
+from tornado.concurrent import Future
+
+from .common import ASYNC_TESTS_TIMEOUT, Clock, MockChannel
+from .common import make_future, make_mock_channel_with
 
 
 TEST_CONTROL_VALUE = 42
@@ -28,6 +33,26 @@ def ch_cache(mocker):
     return ChannelsCache(logger, node)
 
 
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_bounded_cache(mocker, clock, **kwargs):
+    config = Config(mocker.Mock())
+
+    channels_cache_config = dict(
+        enabled=True, max_size=3, idle_ttl_sec=100, sweep_interval_sec=10)
+    channels_cache_config.update(kwargs)
+    config._config['channels_cache'] = channels_cache_config
+
+    node = mocker.Mock()
+    node.control = mocker.Mock(
+        side_effect=lambda app: make_mock_channel_with(0))
+
+    return ChannelsCache(mocker.Mock(), node, config, clock)
+
+
 @pytest.fixture
 def app_cache(mocker):
     Service.control = mocker.Mock()
@@ -51,6 +76,17 @@ def test_close_all(ch_cache):
     assert not ch_cache.channels
 
 
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_close_and_remove(ch_cache):
+    channels = yield [ch_cache.get_ch(app) for app in apps_list]
+
+    removed = yield ch_cache.close_and_remove(['app0', 'app1', 'unknown'])
+
+    assert removed == 2
+    assert sorted(ch_cache.apps()) == ['app2', 'app3']
+    assert channels[0].tx.close.called
+
+
 @pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
 def test_close_all_with_flag(ch_cache):
     yield [ch_cache.get_ch(app) for app in apps_list]
@@ -101,3 +137,231 @@ def test_retain(ch_cache, apps, to_retain):
     ch_cache.close_other(to_retain)
     if ch_cache.apps():
         assert set(ch_cache.apps()) == set(to_retain)
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_lru_eviction(mocker, clock):
+    cache = make_bounded_cache(mocker, clock)
+
+    channels = yield [cache.get_ch(app) for app in apps_list[:3]]
+
+    # Most recently used now.
+    yield cache.get_ch('app0')
+    yield cache.get_ch('app3')
+
+    assert cache.apps() == ['app2', 'app0', 'app3']
+    assert channels[1].tx.close.called
+    assert cache.get_metrics()['evicted_lru'] == 1
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_unbounded(mocker, clock):
+    cache = make_bounded_cache(mocker, clock, enabled=False)
+
+    yield [cache.get_ch(app) for app in apps_list]
+    clock.now += 1000
+
+    closed = yield cache.sweep(set())
+
+    assert closed == 0
+    assert len(cache) == len(apps_list)
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_sweep(mocker, clock):
+    cache = make_bounded_cache(mocker, clock, max_size=0)
+
+    yield [cache.get_ch(app) for app in apps_list]
+
+    clock.now += 60
+    yield cache.get_ch('app1')
+
+    clock.now += 60
+
+    # Not known desired state, idle channels only.
+    closed = yield cache.sweep()
+
+    assert closed == 3
+    assert cache.apps() == ['app1']
+
+    yield cache.get_ch('app2')
+
+    closed = yield cache.sweep({'app2'})
+
+    assert closed == 1
+    assert cache.apps() == ['app2']
+
+    metrics = cache.get_metrics()
+
+    assert metrics['size'] == 1
+    assert metrics['evicted_idle'] == 3
+    assert metrics['evicted_orphan'] == 1
+    assert metrics['age']['count'] == 1
+    assert metrics['age']['buckets']['le_10000'] == 1
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_heal(mocker, clock):
+    cache = make_bounded_cache(mocker, clock, enabled=False)
+
+    channels = yield [cache.get_ch(app) for app in apps_list[:2]]
+
+    clock.now += 10
+    cache.mark_ack('app0')
+    cache.mark_error('app1')
+    cache.mark_error('unknown')
+
+    assert cache.last_ack_at == dict(app0=10)
+    assert cache.errors == dict(app1=1)
+    assert cache.suspected == {'app1'}
+
+    yield cache.heal()
+
+    ch = yield cache.get_ch('app1')
+
+    assert ch is not channels[1]
+    assert channels[1].tx.close.called
+    assert cache.apps() == ['app0', 'app1']
+    assert not cache.suspected
+    assert not cache.errors
+
+    # Runtime restart.
+    cache.invalidate()
+    assert cache.suspected == {'app0', 'app1'}
+
+    cache.node_service.control.side_effect = \
+        lambda app: make_mock_channel_with(0) if app == 'app0' \
+        else make_future(Exception('boom'))
+
+    yield cache.heal()
+
+    assert cache.apps() == ['app0']
+    assert not cache.suspected
+
+    metrics = cache.get_metrics()
+
+    assert metrics['reopened'] == 2
+    assert metrics['reopen_failures'] == 1
+    assert metrics['invalidations'] == 1
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_heal_limited(mocker, clock):
+    cache = make_bounded_cache(mocker, clock, enabled=False)
+
+    yield [cache.get_ch(app) for app in apps_list]
+
+    reopened = [Future() for _ in apps_list]
+    cache.node_service.control.reset_mock()
+    cache.node_service.control.side_effect = reopened
+
+    # Runtime restart.
+    cache.invalidate()
+    healing = cache.heal(make_concurrency_limit(2))
+
+    assert len(healing) == len(apps_list)
+    assert cache.node_service.control.call_count == 2
+
+    for future in reopened:
+        future.set_result(MockChannel(0))
+
+    yield healing
+
+    assert cache.node_service.control.call_count == len(apps_list)
+    assert not cache.suspected
+    assert cache.get_metrics()['reopened'] == len(apps_list)
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_get_ch_waits_reopen(mocker, clock):
+    cache = make_bounded_cache(mocker, clock, enabled=False)
+
+    old = yield cache.get_ch('app')
+    cache.mark_error('app')
+
+    reopened = Future()
+    cache.node_service.control.side_effect = lambda app: reopened
+
+    cache.heal()
+    assert 'app' in cache.opening
+
+    getting = cache.get_ch('app')
+    assert not getting.done()
+
+    new = MockChannel(0)
+    reopened.set_result(new)
+
+    ch = yield getting
+
+    assert ch is new
+    assert old.tx.close.called
+    assert not cache.opening
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_prewarm(mocker, clock):
+    cache = make_bounded_cache(mocker, clock, enabled=False)
+
+    yield cache.get_ch('app0')
+
+    cache.node_service.control.side_effect = \
+        lambda app: make_future(Exception('not running')) \
+        if app == 'app3' else make_mock_channel_with(0)
+
+    opened = yield cache.prewarm(apps_list, make_concurrency_limit(2))
+
+    assert opened == 2
+    assert sorted(cache.apps()) == ['app0', 'app1', 'app2']
+
+    yield cache.get_ch('app1')
+    yield cache.get_ch('app1')
+
+    metrics = cache.get_metrics()
+
+    assert metrics['prewarmed'] == 2
+    assert metrics['prewarm_hits'] == 1
+    assert metrics['prewarm_failures'] == 1
+    assert metrics['prewarm_hit_rate'] == 0.5
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_get_ch_waits_prewarm(mocker, clock):
+    cache = make_bounded_cache(mocker, clock, enabled=False)
+
+    opening = Future()
+    cache.node_service.control.side_effect = lambda app: opening
+
+    prewarming = cache.prewarm(['app'])
+    getting = cache.get_ch('app')
+
+    new = MockChannel(0)
+    opening.set_result(new)
+
+    yield prewarming
+    ch = yield getting
+
+    assert ch is new
+    assert cache.node_service.control.call_count == 1
+    assert cache.get_metrics()['prewarm_hits'] == 1
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_instrumentation(mocker, clock):
+    cache = make_bounded_cache(mocker, clock, enabled=False)
+
+    yield [cache.get_ch(app) for app in apps_list[:2]]
+    yield cache.get_ch('app0')
+
+    clock.now += 30
+    yield cache.close_and_remove(['app0'], CloseReason.STOPPED)
+    yield cache.close_and_remove(['app1'])
+
+    metrics = cache.get_metrics()
+
+    assert (metrics['hits'], metrics['misses']) == (1, 2)
+    assert metrics['hit_rate'] == 1.0 / 3
+    assert metrics['open_latency']['count'] == 2
+    assert metrics['close_latency']['count'] == 2
+    assert metrics['lifetime']['count'] == 2
+    assert metrics['lifetime']['max_ms'] == 30000
+    assert metrics['closed'] == dict(stopped=1, removed=1)
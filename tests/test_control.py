@@ -1,19 +1,25 @@
 # TODO: app control tests
 from cocaine.burlak import burlak
-from cocaine.burlak.chcache import ChannelsCache, _AppsCache
+from cocaine.burlak.chcache import ChannelsCache, CloseReason, _AppsCache
 from cocaine.burlak.comm_state import CommittedState
 from cocaine.burlak.config import Config
 from cocaine.burlak.context import Context, LoggerSetup
+from cocaine.burlak.pipeline import make_concurrency_limit
+from cocaine.burlak.ramp import RampRecord
+from cocaine.burlak.rolling import ProfileRoller
 from cocaine.burlak.semaphore import LockHolder
+from cocaine.exceptions import ServiceError
 
 
 import pytest
 
+from tornado import gen
 from tornado import queues
+from tornado.concurrent import Future
 
 from .common import ASYNC_TESTS_TIMEOUT
 from .common import MockSemaphore
-from .common import make_logger_mock
+from .common import make_future, make_logger_mock
 from .common import make_mock_channel_with, make_mock_channels_list_with
 from .common import make_mock_control_list_with
 
@@ -42,6 +48,10 @@ to_run_apps = [
 ]
 
 
+def make_fresh_channel(*_args, **_kwargs):
+    return make_mock_channel_with(0)
+
+
 def count_apps(list_of_dict):
     return sum(map(len, (d for d in list_of_dict)))
 
@@ -55,6 +65,7 @@ def semaphore(mocker):
 def elysium(mocker):
 
     config = Config(mocker.Mock())
+
     sentry_wrapper = mocker.Mock()
 
     mocker.patch.object(
@@ -120,7 +131,7 @@ def test_stop_by_control(elysium, mocker):
     mocker.patch.object(
         ChannelsCache,
         'get_ch',
-        return_value=make_mock_channel_with(0)
+        side_effect=make_fresh_channel
     )
 
     yield elysium.blessing_road(MockSemaphore())
@@ -195,7 +206,7 @@ def test_run(elysium, mocker):
     mocker.patch.object(
         ChannelsCache,
         'get_ch',
-        return_value=make_mock_channel_with(0)
+        side_effect=make_fresh_channel
     )
 
     yield elysium.blessing_road(MockSemaphore())
@@ -234,7 +245,7 @@ def test_control(elysium, semaphore, mocker):
     mocker.patch.object(
         ChannelsCache,
         'get_ch',
-        return_value=make_mock_channel_with(0)
+        side_effect=make_fresh_channel
     )
 
     yield elysium.blessing_road(MockSemaphore())
@@ -294,8 +305,10 @@ def test_control_exceptions(elysium, semaphore, mocker):
         if isinstance(it, Exception):
             except_count += 1
 
+    # Channels are cached, app is controlled once per round it is in.
     elysium.node_service.control = mocker.Mock(
-        side_effect=make_mock_control_list_with(except_sequence)
+        side_effect=make_mock_control_list_with(
+            except_sequence, acks=len(to_run_apps) - 1)
     )
 
     yield elysium.blessing_road(semaphore)
@@ -373,3 +386,709 @@ def skipped_test_gapped_control(elysium, semaphore, mocker):
 
     assert _AppsCache.make_control_ch.call_count == \
         len(set(app for task in to_run_apps for app in task))
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_merged_start_and_control(elysium, mocker):
+    elysium.context.config.supersede_stale_rounds = True
+    elysium.context.config._config['dispatch'] = dict(
+        merge_pending_rounds=True)
+
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, False])
+
+    stale_state = dict(
+        run1=burlak.StateRecord(1, 't1'),
+        run2=burlak.StateRecord(2, 't2'),
+        run3=burlak.StateRecord(3, 't3'),
+    )
+    newest_state = dict(
+        run2=burlak.StateRecord(2, 't2'),
+        run3=burlak.StateRecord(5, 't3'),
+        run4=burlak.StateRecord(4, 't4'),
+    )
+
+    # As in aggregator, run lock holder is shared by all rounds.
+    run_lock = LockHolder()
+    semaphore = MockSemaphore()
+    yield semaphore.try_to_acquire_lock(run_lock)
+
+    for state, version, to_run in [
+            (stale_state, 1, {'run4'}),
+            (stale_state, 2, set(stale_state.iterkeys())),
+            (newest_state, 3, set())]:
+        yield elysium.control_queue.put(
+            burlak.DispatchMessage(
+                state,
+                version, True,
+                set(), set(), to_run,
+                False,
+                set(), set(),
+                run_lock,
+            )
+        )
+
+    mocker.patch.object(
+        ChannelsCache,
+        'get_ch',
+        side_effect=make_fresh_channel
+    )
+
+    yield elysium.blessing_road(semaphore)
+
+    started = {
+        args[0] for args, _ in elysium.node_service.start_app.call_args_list}
+    assert started == {'run2', 'run3', 'run4'}
+
+    metrics = elysium.get_count_metrics()
+
+    assert metrics['merged_rounds'] == 1
+    assert metrics['merged_commands'] == 2
+    assert metrics['merged_commands_max'] == 3
+    assert not run_lock.has_lock
+
+    assert elysium.ci_state.as_dict()['run3'].workers == 5
+    assert elysium.ci_state.version == 3
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_superseded_while_starting(elysium, mocker):
+    elysium.context.config.supersede_stale_rounds = True
+
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, True, False])
+
+    stale_state = dict(
+        run1=burlak.StateRecord(1, 't1'),
+        run2=burlak.StateRecord(2, 't2'),
+    )
+    newest_state = dict(
+        run1=burlak.StateRecord(1, 't1'),
+        run2=burlak.StateRecord(5, 't2'),
+    )
+
+    def start_app(app, profile):
+        # Newer state arrives while apps are starting.
+        if app == 'run1':
+            elysium.control_queue.put_nowait(
+                burlak.DispatchMessage(
+                    newest_state,
+                    2, True,
+                    set(), set(), set(),
+                    False,
+                    set(), set(),
+                    LockHolder(),
+                )
+            )
+
+        return make_mock_channel_with(0)
+
+    elysium.node_service.start_app = mocker.Mock(side_effect=start_app)
+
+    yield elysium.control_queue.put(
+        burlak.DispatchMessage(
+            stale_state,
+            1, True,
+            set(), set(), set(stale_state.iterkeys()),
+            False,
+            set(), set(),
+            LockHolder(),
+        )
+    )
+
+    mocker.patch.object(
+        ChannelsCache,
+        'get_ch',
+        side_effect=make_fresh_channel
+    )
+
+    yield elysium.blessing_road(MockSemaphore())
+
+    metrics = elysium.get_count_metrics()
+
+    # `run2` target has been changed, its stale control is skipped.
+    assert metrics['superseded_controls_skipped'] == 1
+    assert elysium.ci_state.as_dict()['run2'].workers == 5
+    assert elysium.ci_state.version == 2
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_merged_stop(elysium, mocker):
+    elysium.context.config._config['dispatch'] = dict(
+        merge_pending_rounds=True)
+    elysium.context.config._config['stop_apps'] = True
+
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, False])
+
+    state = dict(app1=burlak.StateRecord(1, 't1'))
+
+    yield elysium.control_queue.put(
+        burlak.DispatchMessage(
+            dict(),
+            1, True,
+            set(), {'app1', 'app2'}, set(),
+            False,
+            set(), set(),
+            LockHolder(),
+        )
+    )
+    yield elysium.control_queue.put(
+        burlak.DispatchMessage(
+            state,
+            2, True,
+            set(), set(), set(),
+            False,
+            set(), set(),
+            LockHolder(),
+        )
+    )
+
+    mocker.patch.object(
+        ChannelsCache,
+        'get_ch',
+        side_effect=make_fresh_channel
+    )
+
+    yield elysium.blessing_road(MockSemaphore())
+
+    # `app1` has reappeared in newest state.
+    assert elysium.get_count_metrics()['merged_commands'] == 1
+    assert elysium.get_count_metrics()['apps_stopped_by_control'] == 1
+    assert elysium.ci_state.as_dict()['app1'].state == 'STARTED'
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_adjust_many_timeouts(elysium, mocker):
+    elysium.context.config._config['dispatch'] = dict(control_pipeline=True)
+    mocker.patch.object(burlak, 'DEFAULT_RETRY_EXP_BASE_SEC', 0)
+
+    channels = dict(
+        app1=make_mock_channel_with(0),
+        app2=make_mock_channel_with(gen.TimeoutError()),
+        app3=make_mock_channel_with(gen.TimeoutError()),
+    )
+
+    mocker.patch.object(
+        ChannelsCache,
+        'get_ch',
+        side_effect=lambda app: channels.pop(app, make_fresh_channel())
+    )
+    mocker.patch.object(
+        ChannelsCache, 'close_and_remove', return_value=make_future(0))
+
+    yield elysium.adjust_many(
+        [('app1', 'p1', 1), ('app2', 'p2', 2), ('app3', 'p3', 3)], 1, 0)
+
+    metrics = elysium.get_count_metrics()
+
+    assert metrics['control_pipeline_acked'] == 1
+    assert metrics['control_ack_timeouts'] == 2
+    assert elysium.sentry_wrapper.capture_message.call_count == 1
+
+    # Timed out channels are closed before retry.
+    assert ChannelsCache.close_and_remove.call_count == 1
+
+    closed, reason = ChannelsCache.close_and_remove.call_args[0]
+    assert sorted(closed) == ['app2', 'app3']
+    assert reason == CloseReason.FAILED
+
+    # Timed out apps have been retried successfully.
+    assert {
+        app: record.workers
+        for app, record in elysium.ci_state.as_dict().iteritems()
+        if record.state == 'STARTED'
+    } == dict(app1=1, app2=2, app3=3)
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_starts_deferred_under_pressure(elysium, mocker):
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, False])
+
+    elysium.context.config._config['admission'] = dict(enabled=True)
+    elysium.admission._hub.system = {'cpu.load': 1.0}
+
+    state = dict(
+        run1=burlak.StateRecord(1, 't1'),
+        run2=burlak.StateRecord(2, 't2'),
+    )
+
+    yield elysium.control_queue.put(
+        burlak.DispatchMessage(
+            state,
+            1, True,
+            set(), set(), set(state.iterkeys()),
+            False,
+            set(), set(),
+            LockHolder(),
+        )
+    )
+
+    mocker.patch.object(
+        ChannelsCache,
+        'get_ch',
+        side_effect=make_fresh_channel
+    )
+
+    yield elysium.blessing_road(MockSemaphore())
+
+    assert elysium.node_service.start_app.call_count == 0
+    assert ChannelsCache.get_ch.call_count == 0
+
+    for app in state:
+        record = elysium.ci_state.as_dict()[app]
+
+        assert record.state == 'DEFERRED'
+        assert 'cpu load' in record.state_description
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_ramp_steps_postponed_under_pressure(elysium, mocker):
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, False] * 2)
+    mocker.patch.object(
+        ChannelsCache, 'get_ch', side_effect=make_fresh_channel)
+
+    elysium.context.config._config['ramp'] = dict(
+        enabled=True, step=10, interval_sec=0, confirm_timeout_sec=0)
+    elysium.context.config._config['admission'] = dict(enabled=True)
+    elysium.admission._hub.system = {'cpu.load': 1.0}
+
+    elysium.ci_state.mark_running('app', 10, 'p', 1, 0)
+    elysium.ramp.ramps['app'] = RampRecord('p', 100, 10, 1, 0)
+
+    yield elysium.ramp_up()
+
+    assert ChannelsCache.get_ch.call_count == 0
+    assert elysium.ramp.ramps['app'].written == 10
+    assert elysium.get_count_metrics()['ramp_steps_postponed'] == 1
+
+    # Pressure has gone.
+    elysium.admission._hub.system = {'cpu.load': 0.1}
+
+    yield elysium.ramp_up()
+
+    assert ChannelsCache.get_ch.call_count == 1
+    assert elysium.ramp.ramps['app'].written == 20
+    assert elysium.ci_state.as_dict()['app'].workers == 20
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_control_right_after_start(elysium, mocker):
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, False])
+
+    slow_start = Future()
+
+    def start_app(app, profile):
+        if app == 'slow':
+            ch = mocker.Mock()
+            ch.rx.get = mocker.Mock(return_value=slow_start)
+            return make_future(ch)
+
+        return make_mock_channel_with(0)
+
+    elysium.node_service.start_app = mocker.Mock(side_effect=start_app)
+
+    state = dict(
+        fast=burlak.StateRecord(1, 't1'),
+        slow=burlak.StateRecord(2, 't2'),
+    )
+
+    yield elysium.control_queue.put(
+        burlak.DispatchMessage(
+            state,
+            1, True,
+            set(), set(), set(state.iterkeys()),
+            False,
+            set(), set(),
+            LockHolder(),
+        )
+    )
+
+    mocker.patch.object(
+        ChannelsCache,
+        'get_ch',
+        side_effect=make_fresh_channel
+    )
+
+    road = elysium.blessing_road(MockSemaphore())
+    yield gen.sleep(0.01)
+
+    # Freshly started app is controlled while other one is still starting.
+    assert elysium.ci_state.as_dict()['fast'].workers == 1
+    assert 'slow' not in elysium.ci_state.as_dict()
+
+    slow_start.set_result(0)
+    yield road
+
+    assert elysium.ci_state.as_dict()['slow'].workers == 2
+    assert elysium.get_count_metrics()['time_to_first_worker']['count'] == 2
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_stop_and_start_overlap(elysium, mocker):
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, False])
+
+    elysium.context.config._config['stop_apps'] = True
+
+    slow_pause = Future()
+
+    pause_ch = mocker.Mock()
+    pause_ch.rx.get = mocker.Mock(return_value=slow_pause)
+    elysium.node_service.pause_app = mocker.Mock(
+        return_value=make_future(pause_ch))
+
+    state = dict(
+        broken=burlak.StateRecord(1, 't1'),
+        fresh=burlak.StateRecord(2, 't2'),
+    )
+
+    yield elysium.control_queue.put(
+        burlak.DispatchMessage(
+            state,
+            1, True,
+            {'broken'}, set(), set(state.iterkeys()),
+            False,
+            set(), set(),
+            LockHolder(),
+        )
+    )
+
+    mocker.patch.object(
+        ChannelsCache,
+        'get_ch',
+        side_effect=make_fresh_channel
+    )
+
+    road = elysium.blessing_road(MockSemaphore())
+    yield gen.sleep(0.01)
+
+    def started_apps():
+        return {
+            args[0]
+            for args, _ in elysium.node_service.start_app.call_args_list
+        }
+
+    # Independent app isn't waiting for stop phase, broken app is restarted
+    # only after it has been stopped.
+    assert started_apps() == {'fresh'}
+    elysium.node_service.pause_app.assert_called_once_with('broken')
+
+    slow_pause.set_result(0)
+    yield road
+
+    assert started_apps() == {'broken', 'fresh'}
+    assert elysium.ci_state.as_dict()['broken'].workers == 1
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_stop_hard_per_app(elysium, mocker):
+    stuck_close = Future()
+
+    elysium.channels_cache.close_and_remove = mocker.Mock(
+        side_effect=lambda apps, reason:
+            stuck_close if apps == ['stuck'] else make_future(1))
+    elysium.node_service.pause_app = mocker.Mock(
+        side_effect=make_fresh_channel)
+
+    stopping = elysium.stop_hard(elysium.channels_cache, {'stuck', 'ok'}, 1)
+    yield gen.sleep(0.01)
+
+    # Stuck channel close doesn't delay pause of other app.
+    elysium.node_service.pause_app.assert_called_once_with('ok')
+
+    stuck_close.set_result(1)
+    yield stopping
+
+    assert elysium.node_service.pause_app.call_count == 2
+    assert elysium.get_count_metrics()['stopped_hard'] == 2
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_stop_many_per_app(elysium, mocker):
+    slow_control = Future()
+
+    elysium.adjust_by_channel = mocker.Mock(return_value=slow_control)
+    elysium.channels_cache.close_and_remove = mocker.Mock(
+        return_value=make_future(1))
+    elysium.node_service.pause_app = mocker.Mock(
+        side_effect=make_fresh_channel)
+
+    stopping = elysium.stop_many({'slow'}, {'broken'}, 1, set())
+    yield gen.sleep(0.01)
+
+    # Hard stop of other app isn't waiting for slow control stop.
+    elysium.node_service.pause_app.assert_called_once_with('broken')
+    assert stopping['broken'].done()
+    assert not stopping['slow'].done()
+
+    slow_control.set_result(None)
+    yield stopping.values()
+
+    assert elysium.ci_state.as_dict()['slow'].state == 'STOPPED'
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_priority_order(elysium, mocker):
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, False])
+
+    elysium.concurrency_limit = make_concurrency_limit(1)
+
+    state = dict(
+        batch=burlak.StateRecord(1, 't1'),
+        critical=burlak.StateRecord(2, 't2', 100),
+        important=burlak.StateRecord(3, 't3', 10),
+        other=burlak.StateRecord(4, 't4'),
+    )
+
+    yield elysium.control_queue.put(
+        burlak.DispatchMessage(
+            state,
+            1, True,
+            set(), set(), set(state.iterkeys()),
+            False,
+            set(), set(),
+            LockHolder(),
+        )
+    )
+
+    mocker.patch.object(
+        ChannelsCache,
+        'get_ch',
+        side_effect=make_fresh_channel
+    )
+
+    yield elysium.blessing_road(MockSemaphore())
+
+    assert [
+        args[0] for args, _ in elysium.node_service.start_app.call_args_list
+    ] == ['critical', 'important', 'batch', 'other']
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_start_by_priority_tiers(elysium, mocker):
+    elysium.concurrency_limit = make_concurrency_limit(0)
+
+    slow_start = Future()
+
+    def start_app(app, profile):
+        if app == 'critical':
+            ch = mocker.Mock()
+            ch.rx.get = mocker.Mock(return_value=slow_start)
+            return make_future(ch)
+
+        return make_mock_channel_with(0)
+
+    elysium.node_service.start_app = mocker.Mock(side_effect=start_app)
+
+    state = dict(
+        critical=burlak.StateRecord(1, 't1', 100),
+        batch=burlak.StateRecord(2, 't2'),
+        other=burlak.StateRecord(3, 't3'),
+    )
+
+    started = set()
+    starts = elysium.start_by_priority(
+        list(state), state, dict(), 1, 0, started)
+    yield gen.sleep(0.01)
+
+    # Lower priority apps are waiting for higher priority start, even
+    # without concurrency limit.
+    elysium.node_service.start_app.assert_called_once_with('critical', 't1')
+
+    slow_start.set_result(0)
+    yield starts.values()
+
+    assert started == {'critical', 'batch', 'other'}
+
+
+def test_control_not_superseded_by_priority():
+    record = burlak.StateRecord(1, 't1')
+    newer = burlak.SupersedingPlan(
+        dict(app=burlak.StateRecord(1, 't1', 100)), set(), True)
+
+    assert not burlak.is_control_superseded('app', record, newer)
+
+    newer.state['app'] = burlak.StateRecord(2, 't1', 100)
+    assert burlak.is_control_superseded('app', record, newer)
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_spooling_fast_retry(elysium, mocker):
+    elysium.context.config._config['spooling'] = dict(enabled=True)
+
+    spooling_error = ServiceError('node', 'spooling', 6)
+
+    channels = [
+        make_mock_channel_with(spooling_error),
+        make_mock_channel_with(spooling_error),
+        make_mock_channel_with(0),
+    ]
+
+    mocker.patch.object(
+        ChannelsCache,
+        'get_ch',
+        side_effect=lambda app: channels.pop(0)
+    )
+    mocker.patch.object(
+        ChannelsCache, 'close_and_remove', return_value=make_future(0))
+
+    yield elysium.adjust_by_channel('app', 'p', 3, 1, 0)
+
+    assert elysium.ci_state.as_dict()['app'].state == 'SPOOLING'
+
+    record = elysium.spooling.pending['app']
+    assert record.workers == 3
+
+    recovered = yield elysium.retry_spooling('app', record)
+
+    assert not recovered
+    assert elysium.spooling.pending['app'].delay > record.delay
+
+    recovered = yield elysium.retry_spooling('app', record)
+
+    assert recovered
+    assert not elysium.spooling.pending
+
+    committed = elysium.ci_state.as_dict()['app']
+    assert (committed.state, committed.workers) == ('STARTED', 3)
+
+    metrics = elysium.spooling.get_count_metrics()
+    assert metrics['spooling_recovered'] == 1
+    assert metrics['spooling_time']['count'] == 1
+
+
+@pytest.mark.parametrize('control_pipeline', [False, True])
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_spooling_resolved_by_round(elysium, mocker, control_pipeline):
+    elysium.context.config._config['spooling'] = dict(enabled=True)
+    elysium.context.config._config['dispatch'] = dict(
+        control_pipeline=control_pipeline)
+
+    elysium.ci_state.mark_pending_start('app', 3, 'p', 1, 0)
+    elysium.spooling.watch('app', 'p', 3, 1)
+
+    mocker.patch.object(
+        ChannelsCache, 'get_ch', side_effect=make_fresh_channel)
+
+    yield elysium.adjust_many([('app', 'p', 3)], 2, 0)
+
+    assert not elysium.spooling.pending
+
+    metrics = elysium.spooling.get_count_metrics()
+    assert metrics['spooling_recovered'] == 1
+    assert metrics['spooling_time']['count'] == 1
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_spooling_retry_skips_stopped(elysium, mocker):
+    elysium.context.config._config['spooling'] = dict(enabled=True)
+
+    elysium.ci_state.mark_pending_start('app', 3, 'p', 1, 0)
+    elysium.spooling.watch('app', 'p', 3, 1)
+    elysium.ci_state.mark_stopped('app', 2, 0)
+
+    mocker.patch.object(ChannelsCache, 'get_ch')
+
+    recovered = yield elysium.retry_spooling(
+        'app', elysium.spooling.pending['app'])
+
+    assert not recovered
+    assert not elysium.spooling.pending
+    assert not ChannelsCache.get_ch.called
+
+
+def test_prewarm_channels(elysium, mocker):
+    mocker.patch.object(ChannelsCache, 'prewarm')
+
+    elysium.prewarm_channels({'running'})
+    assert not ChannelsCache.prewarm.called
+
+    elysium.context.config._config['channels_cache'] = dict(prewarm=True)
+    elysium.prewarm_channels({'running'})
+
+    ChannelsCache.prewarm.assert_called_once_with(
+        {'running'}, elysium.prewarm_limit)
+
+
+def test_skip_restored_controls(elysium):
+    elysium.ci_state.mark_running('same', 2, 'p', 1, 1)
+    elysium.ci_state.mark_running('scaled', 2, 'p', 1, 1)
+    elysium.ci_state.mark_failed('failed', 'p', 1, 1)
+    elysium.ci_state.mark_running('gone', 2, 'p', 1, 1)
+
+    elysium.restore(['same', 'scaled', 'failed', 'gone'], {'stopped'})
+
+    assert elysium.stopped_by_control == {'stopped'}
+
+    state = dict(
+        same=burlak.StateRecord(2, 'p'),
+        scaled=burlak.StateRecord(3, 'p'),
+        failed=burlak.StateRecord(2, 'p'),
+        new=burlak.StateRecord(1, 'p'),
+    )
+    # App missing in state is kept for the caller to deal with.
+    to_control = set(state) | {'gone'}
+
+    assert elysium.skip_restored_controls(to_control, state) == \
+        {'scaled', 'failed', 'new', 'gone'}
+    assert elysium.get_count_metrics()['restored_controls_skipped'] == 1
+
+    # Only the first state update after restore is filtered.
+    assert elysium.skip_restored_controls(to_control, state) == to_control
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_rolling_apps_not_controlled(elysium, mocker):
+    elysium.context.config._config['profile_update'] = dict(enabled=True)
+
+    workers_distribution = dict()
+    roller = ProfileRoller(elysium.context, workers_distribution)
+    elysium.roller = roller
+
+    aggregator = burlak.StateAggregator(
+        elysium.context,
+        elysium.node_service,
+        elysium.ci_state,
+        queues.Queue(), elysium.control_queue,
+        elysium.submitter,
+        0.01,
+        workers_distribution,
+        roller=roller)
+    aggregator.get_running_apps_set = mocker.Mock(
+        side_effect=lambda: make_future({'app1', 'app2'}))
+
+    for version, profile in enumerate(['old', 'new']):
+        yield aggregator.input_queue.put(
+            burlak.StateUpdateMessage(
+                dict(
+                    app1=dict(workers=1, profile=profile),
+                    app2=dict(workers=2, profile='p'),
+                ),
+                version,
+                'uuid'))
+
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, True, False])
+    yield aggregator.process_loop(MockSemaphore())
+
+    assert roller.busy == {'app1'}
+
+    # Round of the first state is already applied.
+    yield elysium.control_queue.get()
+    elysium.control_queue.task_done()
+
+    elysium.stopped_by_control.update({'app1', 'app2'})
+    elysium.control_running = mocker.Mock(return_value=make_future(None))
+
+    mocker.patch.object(
+        burlak.LoopSentry, 'should_run', side_effect=[True, False])
+    yield elysium.blessing_road(MockSemaphore())
+
+    elysium.control_running.assert_called_once_with(
+        {'app2'}, mocker.ANY, 1)
+    assert elysium.stopped_by_control == {'app1'}
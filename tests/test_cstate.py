@@ -158,3 +158,90 @@ def test_workers_count(init_state):
         for record in init_state.as_dict().itervalues()
         if record.state == 'STARTED'
     )
+
+
+def test_aggregates_maintained(init_state):
+    init_state.mark_running('app2', 5, 'a', 4, 10)
+    init_state.mark_failed('app3', 'b', 4, 10)
+    init_state.mark_failed('app4', 'b', 3, 10)
+
+    assert init_state.running_apps_count() == 3
+    assert init_state.workers_count() == 1 + 5 + 3
+
+    assert init_state.failed_apps(4) == {'app3'}
+    assert init_state.failed_apps() == {'app3', 'app4'}
+    assert sorted(init_state.failed) == ['app3', 'app4']
+
+    init_state.mark_running('app3', 2, 'b', 5, 10)
+    init_state.remove('app1')
+
+    assert init_state.running_apps_count() == 3
+    assert init_state.workers_count() == 5 + 2 + 3
+    assert init_state.failed_apps(4) == set()
+
+    init_state.reset()
+
+    assert init_state.running_apps_count() == 0
+    assert init_state.workers_count() == 0
+    assert init_state.failed_apps() == set()
+
+
+def test_mark_deferred(init_state):
+    init_state.mark_deferred('app1', 10, 'a', 4, 100, 'deferred: high load')
+    init_state.mark_deferred('app7', 3, 'x', 4, 100, 'deferred: high load')
+
+    started = init_state.as_dict()['app1']
+    assert started.state == 'STARTED'
+    assert started.workers == mixed_state['app1'][1]
+    assert started.state_description == 'deferred: high load'
+
+    deferred = init_state.as_dict()['app7']
+    assert deferred.state == 'DEFERRED'
+    assert deferred.workers == 3
+
+
+def test_mark_flapping(init_state):
+    init_state.mark_flushed()
+    init_state.mark_flapping(dict(app1=10.5))
+
+    assert init_state.flapping == dict(app1=10)
+
+    # Feedback payload is kept intact.
+    assert init_state.flushed
+    assert sorted(init_state.as_named_dict_ext()) == \
+        ['metrics', 'state', 'timestamp', 'version']
+
+    init_state.reset()
+    assert init_state.flapping == dict()
+
+
+def test_named_dict_cached(init_state, mocker):
+    # Changes are tracked only once view is built.
+    assert init_state.state.take_changed() is None
+
+    named = init_state.as_named_dict()
+    app3 = named['app3']
+
+    assert all(type(record) is dict for record in named.itervalues())
+
+    mocker.patch.object(
+        CommittedState, 'named_record',
+        side_effect=CommittedState.named_record)
+
+    assert init_state.as_named_dict() is named
+    assert not CommittedState.named_record.called
+
+    init_state.mark_failed('app1', 'a', 4, 10)
+    init_state.remove('app2')
+
+    updated = init_state.as_named_dict()
+
+    # View is updated in place, for changed records only.
+    assert updated is named
+    assert CommittedState.named_record.call_count == 1
+    assert updated['app1']['state'] == 'FAILED'
+    assert 'app2' not in updated
+    assert updated['app3'] is app3
+
+    init_state.reset()
+    assert init_state.as_named_dict() == dict()
@@ -0,0 +1,98 @@
+from cocaine.burlak.flapping import FlapDamper
+
+import pytest
+
+from .common import Clock, make_context
+
+
+FLAPPING_CONFIG = dict(
+    enabled=True,
+    window_sec=100,
+    threshold=3,
+    damp_interval_sec=40,
+)
+
+STATE = dict(app=None, stable=None)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_damper(mocker, clock, **kwargs):
+    flapping_config = dict(FLAPPING_CONFIG)
+    flapping_config.update(kwargs)
+
+    context = make_context(mocker, 'flapping', **flapping_config)
+
+    return FlapDamper(context, clock)
+
+
+def poll(damper, clock, mismatch, state=STATE, step=10):
+    clock.now += step
+    return damper.damp(set(mismatch), state)
+
+
+def test_disabled(mocker, clock):
+    damper = make_damper(mocker, clock, enabled=False)
+
+    for _ in xrange(10):
+        assert poll(damper, clock, {'app'}) == {'app'}
+        assert poll(damper, clock, set()) == set()
+
+    assert not damper.flapping
+
+
+def test_persistent_mismatch_not_flapping(mocker, clock):
+    damper = make_damper(mocker, clock)
+
+    for _ in xrange(10):
+        assert poll(damper, clock, {'stable'}) == {'stable'}
+
+    assert not damper.flapping
+    assert damper.get_count_metrics()['flaps'] == 1
+
+
+def test_damping(mocker, clock):
+    damper = make_damper(mocker, clock)
+
+    # Two flaps, not flapping yet.
+    for _ in xrange(2):
+        assert poll(damper, clock, {'app', 'stable'}) == {'app', 'stable'}
+        assert poll(damper, clock, {'stable'}) == {'stable'}
+
+    # Third flap, control is still sent on detection.
+    assert poll(damper, clock, {'app', 'stable'}) == {'app', 'stable'}
+    assert damper.flapping == dict(app=50)
+
+    # Damped for `damp_interval_sec` now.
+    assert poll(damper, clock, {'stable'}) == {'stable'}
+    assert poll(damper, clock, {'app', 'stable'}) == {'stable'}
+    assert poll(damper, clock, {'app', 'stable'}) == {'stable'}
+    assert poll(damper, clock, {'app', 'stable'}) == {'app', 'stable'}
+
+    metrics = damper.get_count_metrics()
+
+    assert metrics['flapping_apps'] == 1
+    assert metrics['flapping_detected'] == 1
+    assert metrics['damped_controls'] == 2
+
+    # Flaps are out of the window.
+    assert poll(damper, clock, {'app'}, step=100) == {'app'}
+    assert not damper.flapping
+
+
+def test_forget_removed(mocker, clock):
+    damper = make_damper(mocker, clock)
+
+    for _ in xrange(3):
+        poll(damper, clock, {'app'})
+        poll(damper, clock, set())
+
+    assert 'app' in damper.flapping
+
+    poll(damper, clock, set(), state=dict(stable=None))
+
+    assert not damper.flapping
+    assert not damper.flaps
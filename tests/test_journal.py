@@ -0,0 +1,88 @@
+from cocaine.burlak.comm_state import CommittedState
+from cocaine.burlak.journal import ChangeJournal
+
+
+Record = CommittedState.Record
+
+
+def test_journal_since():
+    journal = ChangeJournal(3)
+
+    assert journal.since(0) == []
+
+    for i in xrange(1, 5):
+        journal.append('app{}'.format(i), None, i)
+
+    # Same record is not a change.
+    journal.append('app1', 1, 1)
+
+    assert journal.seq == 4
+    assert [e.app for e in journal.since(2)] == ['app3', 'app4']
+    assert journal.since(4) == []
+
+    # Entry 1 is out of the ring.
+    assert journal.since(0) is None
+    assert journal.since(5) is None
+
+    journal.reset()
+
+    # Reader at last sequence has to refetch as well.
+    assert journal.seq == 5
+    assert journal.since(4) is None
+    assert journal.since(5) == []
+
+
+def test_journal_disabled():
+    journal = ChangeJournal(0)
+    journal.append('app', None, 1)
+
+    assert journal.since(1) == []
+    assert journal.since(0) is None
+
+    journal.touch()
+    assert journal.since(1) is None
+
+
+def test_journal_disabled_state():
+    state = CommittedState(journal_size=0)
+    state.mark_running('app', 2, 'p', 1, 10)
+
+    assert state.changes_since(0) is None
+    assert state.changes_since(1) == []
+
+
+def test_committed_state_changes(mocker):
+    state = CommittedState()
+
+    state.mark_running('app1', 2, 'p', 1, 10)
+    state.mark_failed('app2', 'p', 1, 10)
+    state.mark_stopped('app1', 2, 20)
+    state.remove('app2')
+    state.remove('app3')
+
+    mocker.patch('time.time', return_value=100)
+    state.remove_expired(10)
+
+    assert [
+        (e.seq, e.app, e.old and e.old.state, e.new and e.new.state)
+        for e in state.changes_since(1)
+    ] == [
+        (2, 'app2', None, 'FAILED'),
+        (3, 'app1', 'STARTED', 'STOPPED'),
+        (4, 'app2', 'FAILED', None),
+        (5, 'app1', 'STOPPED', None),
+    ]
+
+    assert state.journal.seq == 5
+
+    state.reset()
+    assert state.changes_since(5) is None
+    assert state.changes_since(6) == []
+
+
+def test_committed_state_restore():
+    state = CommittedState()
+    state.mark_running('app', 2, 'p', 1, 10)
+
+    state.restore(dict(), 2, 'uuid', [])
+    assert state.changes_since(1) is None
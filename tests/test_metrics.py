@@ -10,6 +10,7 @@ from cocaine.burlak.context import Context, LoggerSetup
 from cocaine.burlak.defaults import Defaults
 from cocaine.burlak.metrics.ewma import EWMA
 from cocaine.burlak.metrics.exceptions import MetricsException
+from cocaine.burlak.metrics.histogram import Histogram
 from cocaine.burlak.metrics.hub import Hub
 from cocaine.burlak.metrics.procfs import Cpu, Loadavg, Memory, Network
 from cocaine.burlak.metrics.procfs import IfSpeed
@@ -520,6 +521,30 @@ def test_ewma_time_constant(dt, tau):
     EWMA.alpha(dt, tau)
 
 
+def test_histogram():
+    histogram = Histogram((10, 100, 1000))
+
+    assert histogram.quantile(.5) == 0
+
+    for value_sec in [0.005, 0.01, 0.05, 0.5, 2.0]:
+        histogram.observe(value_sec)
+
+    as_dict = histogram.as_dict()
+
+    assert as_dict['buckets'] == dict(
+        le_10=2, le_100=3, le_1000=4, le_inf=5)
+    assert as_dict['count'] == 5
+    assert as_dict['sum_ms'] == 2565
+    assert as_dict['max_ms'] == 2000
+    assert as_dict['p50_ms'] == 100
+    assert as_dict['p99_ms'] == 2000
+
+
+@pytest.mark.xfail(raises=ValueError)
+def test_histogram_no_buckets():
+    Histogram(())
+
+
 @pytest.mark.parametrize('system,apps,metrics', [
     ({'a': 1, 'b': 2}, {}, {'system': {'a': 1, 'b': 2}, 'applications': {}})
 ])
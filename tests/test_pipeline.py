@@ -0,0 +1,134 @@
+from cocaine.burlak.pipeline import \
+    AppLocks, ControlPipeline, ControlTask, acquire_slot, \
+    make_concurrency_limit
+
+import pytest
+
+from tornado import gen
+
+from .common import ASYNC_TESTS_TIMEOUT, MockChannel, make_future
+
+
+TEST_VERSION = 42
+
+
+@pytest.fixture
+def channels(mocker):
+    channels = dict(
+        app1=MockChannel(0),
+        app2=MockChannel(gen.TimeoutError()),
+        app3=MockChannel(Exception('broken', 'channel')),
+        app4=MockChannel(0),
+    )
+
+    cache = mocker.Mock()
+    cache.get_ch = mocker.Mock(
+        side_effect=lambda app: make_future(channels[app]))
+
+    return channels, cache
+
+
+def make_tasks(apps):
+    return [
+        ControlTask(app, i, 'profile', TEST_VERSION)
+        for i, app in enumerate(apps)
+    ]
+
+
+@pytest.mark.parametrize('limit', [0, 1, 3])
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_pipeline_outcomes(channels, limit):
+    channels, cache = channels
+    pipeline = ControlPipeline(cache, make_concurrency_limit(limit), 1)
+
+    tasks = make_tasks(sorted(channels))
+    result = yield pipeline.send(tasks)
+
+    assert [ack.task.app for ack in result.acked] == ['app1', 'app4']
+    assert all(
+        ack.task.state_version == TEST_VERSION for ack in result.acked)
+
+    assert [task.app for task, _ in result.failed] == ['app3']
+    assert [task.app for task in result.timed_out] == ['app2']
+
+    for task in tasks:
+        channels[task.app].tx.write.assert_called_once_with(task.workers)
+
+    assert pipeline.in_flight == 0
+    assert 1 <= pipeline.max_in_flight <= len(tasks)
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_pipeline_open_failure(mocker):
+    cache = mocker.Mock()
+    cache.get_ch = mocker.Mock(
+        return_value=make_future(Exception('no', 'channel')))
+
+    pipeline = ControlPipeline(cache, make_concurrency_limit(2), 1)
+    result = yield pipeline.send(make_tasks(['app1', 'app2']))
+
+    assert not result.acked
+    assert not result.timed_out
+    assert [task.app for task, _ in result.failed] == ['app1', 'app2']
+    assert pipeline.max_in_flight == 0
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_pipeline_serializes_app_writes(mocker):
+    events = []
+
+    @gen.coroutine
+    def ack(timeout=None):
+        yield gen.sleep(0.01)
+        events.append('ack')
+
+    def write(workers):
+        events.append(('write', workers))
+        return make_future(0)
+
+    ch = mocker.Mock()
+    ch.tx.write = mocker.Mock(side_effect=write)
+    ch.rx.get = mocker.Mock(side_effect=ack)
+
+    cache = mocker.Mock()
+    cache.get_ch = mocker.Mock(return_value=make_future(ch))
+
+    app_locks = AppLocks()
+    pipeline = ControlPipeline(
+        cache, make_concurrency_limit(0), 1, app_locks)
+
+    @gen.coroutine
+    def other_writer():
+        with (yield app_locks.acquire('app1')):
+            yield ch.tx.write(100)
+            yield ch.rx.get()
+
+    result, _ = yield [
+        pipeline.send(make_tasks(['app1'])),
+        other_writer(),
+    ]
+
+    assert [ack.task.app for ack in result.acked] == ['app1']
+    assert events == [('write', 0), 'ack', ('write', 100), 'ack']
+    assert not app_locks
+
+
+@pytest.mark.parametrize('limit,expected_max', [(0, 3), (2, 2)])
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_acquire_slot(limit, expected_max):
+    limit = make_concurrency_limit(limit)
+    stats = dict(running=0, max_running=0)
+
+    @gen.coroutine
+    def task():
+        with (yield acquire_slot(limit)):
+            stats['running'] += 1
+            stats['max_running'] = max(
+                stats['max_running'], stats['running'])
+
+            yield gen.sleep(0.01)
+            stats['running'] -= 1
+
+    yield [task() for _ in xrange(3)]
+
+    assert stats['max_running'] == expected_max
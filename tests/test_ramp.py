@@ -0,0 +1,110 @@
+from cocaine.burlak.ramp import WorkersRamp
+
+import pytest
+
+from .common import Clock, make_context
+
+
+RAMP_CONFIG = dict(
+    enabled=True,
+    step=10,
+    interval_sec=5,
+    confirm_timeout_sec=60,
+)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_ramp(mocker, clock, workers_distribution, **kwargs):
+    ramp_config = dict(RAMP_CONFIG)
+    ramp_config.update(kwargs)
+
+    context = make_context(mocker, 'ramp', **ramp_config)
+
+    return WorkersRamp(context, workers_distribution, clock)
+
+
+def test_disabled(mocker, clock):
+    ramp = make_ramp(mocker, clock, dict(), enabled=False)
+    to_adjust = [('app', 'p', 100)]
+
+    assert ramp.plan(to_adjust, 1, lambda app: 1) == to_adjust
+    assert not ramp.ramps
+
+
+def test_plan(mocker, clock):
+    applied = dict(big=2, small=2, down=50)
+    ramp = make_ramp(mocker, clock, dict(big=2, small=2, down=50))
+
+    to_write = ramp.plan(
+        [
+            ('big', 'p', 200),
+            ('small', 'p', 5),
+            ('down', 'p', 10),
+            ('new', 'p', 30),
+        ],
+        1,
+        applied.get,
+        exempt={'new'},
+    )
+
+    assert sorted(to_write) == [
+        ('big', 'p', 12),
+        ('down', 'p', 10),
+        ('new', 'p', 10),
+        ('small', 'p', 5),
+    ]
+    assert set(ramp.ramps) == {'big', 'new'}
+    assert ramp.ramps['big'].target == 200
+
+    # Mismatch against the same target doesn't interfere with the ramp.
+    assert ramp.plan([('big', 'p', 200)], 2, applied.get) == []
+    assert ramp.ramps['big'].state_version == 2
+
+    # Decreases are applied immediately, cancelling the ramp.
+    assert ramp.plan([('big', 'p', 4)], 3, applied.get) == [('big', 'p', 4)]
+    assert 'big' not in ramp.ramps
+
+
+def test_due_steps(mocker, clock):
+    workers_distribution = dict(app=2)
+    ramp = make_ramp(mocker, clock, workers_distribution)
+
+    assert ramp.plan([('app', 'p', 25)], 1, lambda app: 2) == \
+        [('app', 'p', 12)]
+
+    def is_running(app):
+        return True
+
+    # Neither interval passed, nor step confirmed.
+    assert ramp.due_steps(is_running) == []
+
+    clock.now += 5
+    assert ramp.due_steps(is_running) == []
+
+    workers_distribution['app'] = 12
+    assert ramp.due_steps(is_running) == [('app', 'p', 22, 1)]
+
+    # Not confirmed step is advanced after confirm timeout.
+    clock.now += 60
+    assert ramp.due_steps(is_running) == [('app', 'p', 25, 1)]
+    assert not ramp.ramps
+
+    metrics = ramp.get_count_metrics()
+
+    assert metrics['ramps_completed'] == 1
+    assert metrics['ramp_confirm_timeouts'] == 1
+    assert metrics['in_progress'] == 0
+
+
+def test_due_steps_drops_stopped(mocker, clock):
+    ramp = make_ramp(mocker, clock, dict())
+    ramp.plan([('app', 'p', 100)], 1, lambda app: 0)
+
+    clock.now += 100
+
+    assert ramp.due_steps(lambda app: False) == []
+    assert not ramp.ramps
@@ -0,0 +1,91 @@
+from cocaine.burlak.config import make_start_rate_limit_config
+from cocaine.burlak.rate_limit import StartRateLimiter, TokenBucket
+
+import pytest
+
+from .common import ASYNC_TESTS_TIMEOUT, Clock
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_bucket_burst(clock):
+    bucket = TokenBucket(2, 3, clock)
+
+    assert [bucket.reserve() for _ in xrange(3)] == [0, 0, 0]
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+    clock.now += 1.0
+    assert bucket.tokens == pytest.approx(0.0)
+
+
+def test_bucket_refill_is_capped(clock):
+    bucket = TokenBucket(10, 2, clock)
+    clock.now += 100
+
+    assert bucket.tokens == 2
+
+
+def test_bucket_wrong_rate(clock):
+    with pytest.raises(ValueError):
+        TokenBucket(0, 1, clock)
+
+
+def test_limiter_profiles(clock):
+    limiter = StartRateLimiter(
+        make_start_rate_limit_config(dict(
+            enabled=True,
+            rate=100,
+            burst=100,
+            profiles=dict(
+                heavy=dict(rate=1, burst=1),
+                light=dict(rate=0),
+            ),
+        )),
+        clock,
+    )
+
+    assert limiter.reserve('light') == 0
+    assert limiter.reserve('unknown') == 0
+
+    assert limiter.reserve('heavy') == 0
+    assert limiter.reserve('heavy') == pytest.approx(1.0)
+    assert limiter.reserve('heavy') == pytest.approx(2.0)
+
+    buckets = limiter.as_dict()['buckets']
+
+    assert set(buckets['profiles']) == {'heavy'}
+    assert buckets['all']['rate'] == 100
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_limiter_acquire(clock):
+    limiter = StartRateLimiter(
+        make_start_rate_limit_config(dict(enabled=True, rate=100, burst=1)),
+        clock,
+    )
+
+    yield limiter.acquire('some')
+    yield limiter.acquire('some')
+
+    metrics = limiter.get_count_metrics()
+
+    assert metrics['starts_admitted'] == 2
+    assert metrics['starts_delayed'] == 1
+    assert metrics['waiting'] == 0
+    assert metrics['max_wait_sec'] == pytest.approx(0.01)
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_limiter_disabled(clock):
+    limiter = StartRateLimiter(
+        make_start_rate_limit_config(dict(rate=1, burst=1)), clock)
+
+    for _ in xrange(10):
+        yield limiter.acquire('some')
+
+    assert not limiter.enabled
+    assert limiter.get_count_metrics().get('starts_admitted', 0) == 0
@@ -0,0 +1,129 @@
+from cocaine.burlak.comm_state import CommittedState
+from cocaine.burlak.records import IndexedRecords
+
+
+Record = CommittedState.Record
+
+
+def test_indexed_records():
+    records = IndexedRecords(Record, expirable_states=('STOPPED', 'FAILED'))
+
+    old, record = records.set('app1', 'STARTED', 10, 'p1', 3, 'success', 100)
+    records['app2'] = Record('FAILED', 0, 'p1', 4, 'boom', 200)
+
+    assert old is None
+    assert record is records['app1']
+
+    assert records['app1'] == Record('STARTED', 10, 'p1', 3, 'success', 100)
+    assert records == dict(
+        app1=Record('STARTED', 10, 'p1', 3, 'success', 100),
+        app2=Record('FAILED', 0, 'p1', 4, 'boom', 200),
+    )
+
+    assert records.get('unknown') is None
+    assert 'app2' in records
+
+    del records['app2']
+    assert len(records) == 1
+
+    records.set('app3', 'STOPPED', 0, 'p3', 5, 'stopped', 300)
+
+    records.set('app1', 'STOPPED', 0, 'p1', 6, 'stopped', 50)
+
+    assert records.pop_expired(['STOPPED', 'UNKNOWN'], 100).keys() == ['app1']
+    assert 'app1' not in records
+    assert records.pop_expired(['STOPPED'], 1000).keys() == ['app3']
+
+    records.clear()
+    assert not records
+
+
+def test_indexed_records_aggregates():
+    records = IndexedRecords(Record, indexed_states=('FAILED',))
+
+    records.set('app1', 'STARTED', 10, 'p1', 3, 'success', 100)
+    records.set('app2', 'STARTED', 5, 'p1', 3, 'success', 100)
+    records.set('app3', 'FAILED', 0, 'p1', 3, 'boom', 100)
+
+    assert (records.count('STARTED'), records.workers('STARTED')) == (2, 15)
+    assert records.count('STOPPED') == 0
+    assert records.apps_in('FAILED', 3) == {'app3'}
+
+    records.set('app2', 'FAILED', 0, 'p1', 4, 'boom', 100)
+    records.set('app1', 'STARTED', 7, 'p1', 4, 'success', 100)
+
+    assert (records.count('STARTED'), records.workers('STARTED')) == (1, 7)
+    assert records.apps_in('FAILED', 4) == {'app2'}
+    assert records.apps_in('FAILED') == {'app2', 'app3'}
+
+    del records['app3']
+    assert records.apps_in('FAILED', 3) == set()
+    assert records.count('FAILED') == 1
+
+    records.clear()
+    assert records.count('STARTED') == 0
+    assert records.apps_in('FAILED') == set()
+
+
+def test_indexed_records_expiry():
+    records = IndexedRecords(Record, expirable_states=('STOPPED', 'FAILED'))
+
+    records.set('app1', 'STOPPED', 0, 'p1', 1, 'stopped', 10)
+    records.set('app2', 'FAILED', 0, 'p1', 1, 'boom', 20)
+    records.set('app3', 'STARTED', 1, 'p1', 1, 'success', 5)
+
+    # Restarted and re-stopped apps are not due with their old time stamps.
+    records.set('app1', 'STARTED', 1, 'p1', 2, 'success', 30)
+    records.set('app2', 'FAILED', 0, 'p1', 2, 'boom', 40)
+
+    assert records.pop_expired(['STOPPED', 'FAILED'], 35).keys() == []
+
+    # Due record in other state is kept queued.
+    assert records.pop_expired(['STOPPED'], 100).keys() == []
+    assert records.pop_expired(['FAILED'], 100).keys() == ['app2']
+
+    assert sorted(records) == ['app1', 'app3']
+    assert not records._queued
+
+    # Requeued with the same time stamp.
+    records.set('app1', 'STOPPED', 0, 'p1', 3, 'stopped', 50)
+    records.set('app1', 'STARTED', 1, 'p1', 4, 'success', 50)
+    records.set('app1', 'STOPPED', 0, 'p1', 5, 'stopped', 50)
+
+    assert records.pop_expired(['STOPPED'], 100).keys() == ['app1']
+
+
+def test_indexed_records_expiry_heap_compaction(mocker):
+    mocker.patch.object(IndexedRecords, 'MIN_HEAP_TO_COMPACT', 4)
+    records = IndexedRecords(Record, expirable_states=('STOPPED',))
+
+    for tm in xrange(100):
+        records.set('app', 'STOPPED', 0, 'p1', 1, 'stopped', tm)
+
+    assert len(records._expiry) <= 4 + 1
+    assert records.pop_expired(['STOPPED'], 100).keys() == ['app']
+
+
+def test_indexed_records_changes():
+    records = IndexedRecords(Record)
+
+    records.set('app0', 'STARTED', 10, 'p1', 3, 'success', 100)
+
+    # Not tracked yet.
+    assert records.mutations == 1
+    assert records.take_changed() is None
+
+    records.track_changes()
+
+    records.set('app1', 'STARTED', 10, 'p1', 3, 'success', 100)
+    records.set('app2', 'STARTED', 10, 'p1', 3, 'success', 100)
+    del records['app1']
+
+    assert records.mutations == 4
+    assert records.take_changed() == {'app1', 'app2'}
+    assert records.take_changed() == set()
+
+    records.clear()
+
+    assert records.mutations == 5
+    assert records.take_changed() == {'app0', 'app2'}
@@ -0,0 +1,201 @@
+from cocaine.burlak import burlak
+from cocaine.burlak.chcache import CloseReason
+from cocaine.burlak.rolling import ProfileRoller
+from cocaine.burlak.semaphore import LockHolder
+
+import pytest
+
+from tornado import gen
+
+from .common import ASYNC_TESTS_TIMEOUT, make_context, make_future
+
+
+PROFILE_UPDATE_CONFIG = dict(
+    enabled=True,
+    max_unavailable=2,
+    wave_delay_sec=0,
+    wave_timeout_sec=0.05,
+    gate_poll_interval_sec=0.01,
+)
+
+state = dict(
+    app1=burlak.StateRecord(1, 'new1'),
+    app2=burlak.StateRecord(2, 'new2'),
+    app3=burlak.StateRecord(3, 'new3'),
+)
+
+
+@pytest.fixture
+def roller(mocker):
+    context = make_context(mocker, 'profile_update', **PROFILE_UPDATE_CONFIG)
+
+    return ProfileRoller(context, dict(app1=1, app2=2, app3=3))
+
+
+@pytest.fixture
+def elysium(mocker):
+    elysium = mocker.Mock()
+
+    def start(app, profile, state_version, tm, started):
+        if profile != 'broken':
+            started.add(app)
+        return make_future(None)
+
+    elysium.channels_cache.close_and_remove = mocker.Mock(
+        return_value=make_future(0))
+    elysium.slay = mocker.Mock(return_value=make_future(None))
+    elysium.start = mocker.Mock(side_effect=start)
+    elysium.adjust_by_channel = mocker.Mock(return_value=make_future(None))
+
+    return elysium
+
+
+def test_schedule_waves(roller):
+    roller.schedule({'app2', 'app3', 'app1'}, state, 1)
+
+    assert roller.enabled
+    assert roller.busy == {'app1', 'app2', 'app3'}
+
+    # Newer state drops gone app and refreshes targets of pending ones.
+    newer = dict(app2=burlak.StateRecord(5, 'new2'))
+    roller.schedule(set(), newer, 2)
+
+    assert list(roller.pending) == ['app2']
+    assert roller.pending['app2'].workers == 5
+    assert roller.pending['app2'].state_version == 2
+
+    roller.schedule({'app1', 'app3'}, state, 3)
+
+    assert [t.app for t in roller.next_wave()] == ['app2', 'app1']
+    assert [t.app for t in roller.next_wave()] == ['app3']
+    assert roller.next_wave() == []
+
+    roller.schedule({'app1'}, state, 4)
+    roller.clear()
+
+    assert not roller.busy
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_restart(roller, elysium):
+    roller.schedule({'app1'}, state, 1)
+    task = roller.next_wave()[0]
+
+    restarted = yield roller.restart(elysium, task, 0)
+
+    assert restarted
+    assert 'app1' not in roller.workers_distribution
+
+    elysium.channels_cache.close_and_remove.assert_called_once_with(
+        ['app1'], CloseReason.RESTART)
+    elysium.slay.assert_called_once_with('app1', 1, 0)
+    assert not elysium.adjust_by_channel.called
+
+    yield roller.control(elysium, task, 0)
+
+    elysium.adjust_by_channel.assert_called_once_with(
+        'app1', 'new1', 1, 1, 0)
+    assert roller.get_count_metrics()['restarted'] == 1
+
+    assert elysium.start.call_args[0][:4] == ('app1', 'new1', 1, 0)
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_restart_failed(roller, elysium):
+    roller.schedule(
+        {'app1'}, dict(app1=burlak.StateRecord(1, 'broken')), 1)
+
+    restarted = yield roller.restart(elysium, roller.next_wave()[0], 0)
+
+    assert not restarted
+    assert not elysium.adjust_by_channel.called
+    assert roller.get_count_metrics()['restart_failed'] == 1
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_wait_for_wave(roller):
+    roller.schedule({'app1', 'app2'}, state, 1)
+    wave = roller.next_wave()
+
+    ready = yield roller.wait_for_wave(wave)
+    assert ready
+
+    roller.workers_distribution.pop('app2')
+
+    ready = yield roller.wait_for_wave(wave)
+    assert not ready
+    assert roller.get_count_metrics()['wave_timeouts'] == 1
+
+
+class LockCounter(object):
+    """Semaphore granting `grants` locks, tracks locks being held."""
+
+    def __init__(self, grants):
+        self.grants = grants
+        self.held = 0
+
+    @gen.coroutine
+    def try_to_acquire_lock(self, lock):
+        if self.grants:
+            self.grants -= 1
+            self.held += 1
+            lock.lock = 'lock'
+
+    @gen.coroutine
+    def release_lock_holder(self, lock):
+        if lock.has_lock:
+            self.held -= 1
+            lock.lock = None
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_roll_wave_under_run_lock(roller, elysium):
+    semaphore = LockCounter(1)
+    run_lock = LockHolder()
+    held = dict(start=[], control=[])
+
+    def start(app, profile, state_version, tm, started):
+        held['start'].append(semaphore.held)
+        started.add(app)
+        return make_future(None)
+
+    def adjust_by_channel(*args):
+        held['control'].append(semaphore.held)
+        return make_future(None)
+
+    elysium.start.side_effect = start
+    elysium.adjust_by_channel.side_effect = adjust_by_channel
+
+    roller.schedule({'app1', 'app2', 'app3'}, state, 1)
+    wave = roller.next_wave()
+
+    restarted = yield roller.roll_wave(elysium, semaphore, run_lock, wave)
+
+    # Lock is released right after starts, control is sent without it.
+    assert [task.app for task in restarted] == ['app1', 'app2']
+    assert held == dict(start=[1, 1], control=[0, 0])
+    assert not run_lock.has_lock
+
+    # No lock, wave is returned to the head of pending queue, newer target
+    # wins.
+    wave = roller.next_wave()
+    roller.schedule({'app3'}, dict(app3=burlak.StateRecord(7, 'new3')), 2)
+
+    restarted = yield roller.roll_wave(elysium, semaphore, run_lock, wave)
+
+    assert restarted is None
+    assert elysium.start.call_count == 2
+    assert list(roller.pending) == ['app3']
+    assert roller.pending['app3'].workers == 7
+    assert roller.get_count_metrics()['run_lock_misses'] == 1
+
+    # Lock already held by aggregator is reused.
+    run_lock.lock = 'aggregator lock'
+    semaphore.held += 1
+
+    restarted = yield roller.roll_wave(
+        elysium, semaphore, run_lock, roller.next_wave())
+
+    assert [task.app for task in restarted] == ['app3']
+    assert held['start'][-1] == 1
+    assert semaphore.held == 0
@@ -0,0 +1,118 @@
+from cocaine.burlak.burlak import StateRecord
+from cocaine.burlak.smoothing import StateSmoother
+
+import pytest
+
+from .common import Clock, make_context
+
+
+SMOOTHING_CONFIG = dict(
+    enabled=True,
+    abs_threshold=2,
+    rel_threshold=0.1,
+    dwell_sec=30,
+)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_smoother(mocker, clock, **kwargs):
+    smoothing_config = dict(SMOOTHING_CONFIG)
+    smoothing_config.update(kwargs)
+
+    context = make_context(mocker, 'smoothing', **smoothing_config)
+
+    return StateSmoother(context, clock)
+
+
+def make_state(**workers):
+    return {
+        app: StateRecord(count, 'p')
+        for app, count in workers.iteritems()
+    }
+
+
+def smoothed_workers(smoother, **workers):
+    return {
+        app: record.workers
+        for app, record in smoother.smooth(make_state(**workers)).iteritems()
+    }
+
+
+def test_disabled(mocker, clock):
+    smoother = make_smoother(mocker, clock, enabled=False)
+
+    assert smoothed_workers(smoother, app=10) == dict(app=10)
+    assert smoothed_workers(smoother, app=11) == dict(app=11)
+    assert not smoother.effective
+
+
+def test_pass_through(mocker, clock):
+    smoother = make_smoother(mocker, clock)
+
+    assert smoothed_workers(smoother, small=5, big=100, zero=3) == \
+        dict(small=5, big=100, zero=3)
+
+    # Large changes and scale to zero are applied immediately.
+    assert smoothed_workers(smoother, small=9, big=120, zero=0) == \
+        dict(small=9, big=120, zero=0)
+
+    # Below both thresholds.
+    assert smoothed_workers(smoother, small=10, big=125, zero=1) == \
+        dict(small=9, big=120, zero=1)
+
+    assert set(smoother.held) == {'small', 'big'}
+
+    # Profile change is applied immediately.
+    smoothed = smoother.smooth(dict(small=StateRecord(10, 'new')))
+    assert smoothed['small'] == StateRecord(10, 'new')
+    assert not smoother.held
+
+    metrics = smoother.get_count_metrics()
+
+    assert metrics['held_changes'] == 2
+    assert metrics['avoided_writes'] == 2
+    assert metrics['held_apps'] == 0
+
+
+def test_oscillation(mocker, clock):
+    smoother = make_smoother(mocker, clock)
+
+    smoothed_workers(smoother, app=10)
+
+    for workers in [11, 10, 11, 9, 10]:
+        clock.now += 10
+        assert smoothed_workers(smoother, app=workers) == dict(app=10)
+
+    metrics = smoother.get_count_metrics()
+
+    assert metrics['held_changes'] == 2
+    assert metrics['avoided_writes'] == 3
+    assert 'released_changes' not in metrics
+
+
+def test_dwell(mocker, clock):
+    smoother = make_smoother(mocker, clock)
+
+    state = smoother.smooth(make_state(app=10, other=1))
+    state = smoother.smooth(make_state(app=11, other=1))
+
+    assert state['app'].workers == 10
+
+    clock.now += 29
+    assert smoother.release(state) == dict()
+
+    clock.now += 1
+    assert smoother.release(state) == dict(app=StateRecord(11, 'p'))
+    assert not smoother.held
+
+    # Change persisted in the next state update is applied.
+    smoother.smooth(make_state(app=12))
+
+    clock.now += 30
+    assert smoothed_workers(smoother, app=12) == dict(app=12)
+
+    assert smoother.get_count_metrics()['released_changes'] == 2
@@ -0,0 +1,112 @@
+import os
+
+from cocaine.burlak.comm_state import CommittedState
+from cocaine.burlak.snapshot import StateSnapshot
+
+import pytest
+
+from .common import ASYNC_TESTS_TIMEOUT, Clock, make_context
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_snapshot(mocker, clock, path, committed_state=None, **kwargs):
+    snapshot_config = dict(
+        snapshot_enabled=True,
+        snapshot_path=str(path),
+        snapshot_max_age_sec=100,
+    )
+    snapshot_config.update(kwargs)
+
+    context = make_context(mocker, 'committed_state', **snapshot_config)
+
+    apps_elysium = mocker.Mock()
+    apps_elysium.stopped_by_control = set()
+
+    if committed_state is None:
+        committed_state = CommittedState()
+
+    return StateSnapshot(context, committed_state, apps_elysium, clock)
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_save_and_restore(mocker, clock, tmpdir):
+    path = tmpdir.join('state', 'snapshot.json')
+
+    ci_state = CommittedState()
+    ci_state.mark_running('app1', 3, 'p1', 7, 10)
+    ci_state.mark_failed('app2', 'p2', 7, 10, 'boom')
+    ci_state.version = 7
+    ci_state.uuid = 'uuid'
+    ci_state.channels_cache_apps = ['app1']
+
+    snapshot = make_snapshot(mocker, clock, path, ci_state)
+    snapshot.apps_elysium.stopped_by_control.add('app3')
+
+    yield snapshot.save()
+    yield snapshot.save()
+
+    metrics = snapshot.get_count_metrics()
+    assert (metrics['snapshots_saved'], metrics['snapshots_skipped']) == (1, 1)
+    assert not os.path.exists(str(path) + '.tmp')
+
+    clock.now += 50
+
+    restored = make_snapshot(mocker, clock, path)
+    assert restored.restore()
+
+    assert restored.ci_state.as_dict() == ci_state.as_dict()
+    assert restored.ci_state.version == 7
+    assert restored.ci_state.uuid == 'uuid'
+    assert restored.ci_state.channels_cache_apps == ['app1']
+    assert not restored.ci_state.flushed
+
+    restored.apps_elysium.restore.assert_called_once_with(
+        {'app1', 'app2'}, {'app3'})
+
+
+@pytest.mark.gen_test(timeout=ASYNC_TESTS_TIMEOUT)
+def test_restore_expired(mocker, clock, tmpdir):
+    path = tmpdir.join('snapshot.json')
+
+    yield make_snapshot(mocker, clock, path).save()
+
+    clock.now += 101
+
+    snapshot = make_snapshot(mocker, clock, path)
+
+    assert not snapshot.restore()
+    assert snapshot.get_count_metrics()['snapshots_expired'] == 1
+
+
+@pytest.mark.parametrize(
+    'content',
+    [
+        '{"format": 1, "state": ',
+        '{"format": 100500}',
+        '{"format": 1, "saved_at": 0, "version": 1, "uuid": "u", '
+        '"state": {"app": ["STARTED", "many"]}}',
+    ]
+)
+def test_restore_corrupted(mocker, clock, tmpdir, content):
+    path = tmpdir.join('snapshot.json')
+    path.write(content)
+
+    snapshot = make_snapshot(mocker, clock, path)
+
+    assert not snapshot.restore()
+    assert snapshot.get_count_metrics()['snapshots_corrupted'] == 1
+
+    assert not path.exists()
+    assert tmpdir.join('snapshot.json.corrupted').read() == content
+
+
+def test_restore_disabled_or_missing(mocker, clock, tmpdir):
+    path = tmpdir.join('snapshot.json')
+
+    assert not make_snapshot(mocker, clock, path).restore()
+    assert not make_snapshot(
+        mocker, clock, path, snapshot_enabled=False).restore()
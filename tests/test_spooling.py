@@ -0,0 +1,97 @@
+from cocaine.burlak.spooling import SpoolingWatcher
+
+import pytest
+
+from .common import Clock, make_context
+
+
+SPOOLING_CONFIG = dict(
+    enabled=True,
+    initial_delay_sec=1,
+    max_delay_sec=3,
+    backoff_factor=2,
+    max_wait_sec=10,
+)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_watcher(mocker, clock, **kwargs):
+    spooling_config = dict(SPOOLING_CONFIG)
+    spooling_config.update(kwargs)
+
+    context = make_context(mocker, 'spooling', **spooling_config)
+
+    return SpoolingWatcher(context, clock)
+
+
+def due_apps(watcher):
+    return sorted(app for app, _ in watcher.due())
+
+
+def test_disabled(mocker, clock):
+    watcher = make_watcher(mocker, clock, enabled=False)
+    watcher.watch('app', 'p', 1, 1)
+
+    assert not watcher.pending
+
+
+def test_backoff(mocker, clock):
+    watcher = make_watcher(mocker, clock)
+    watcher.watch('app', 'p', 1, 1)
+
+    assert due_apps(watcher) == []
+
+    # Retry delays are 1, 2, 3, 3 ... seconds.
+    for delay in [1, 2, 3, 3]:
+        clock.now += delay - 0.5
+        assert due_apps(watcher) == []
+
+        clock.now += 0.5
+        assert due_apps(watcher) == ['app']
+
+        watcher.backoff('app')
+
+    # Target update keeps the retry schedule.
+    watcher.watch('app', 'p', 5, 2)
+
+    record = watcher.pending['app']
+    assert (record.workers, record.state_version) == (5, 2)
+    assert record.since == 0
+    assert record.delay == 3
+
+    assert watcher.get_count_metrics()['spooling_retries'] == 4
+
+
+def test_resolved(mocker, clock):
+    watcher = make_watcher(mocker, clock)
+    watcher.watch('app', 'p', 1, 1)
+
+    clock.now += 2.5
+
+    metrics = watcher.get_count_metrics()
+    assert metrics['spooling_apps'] == 1
+    assert metrics['longest_spooling_sec'] == 2.5
+
+    assert watcher.resolved('app') == 2.5
+    assert watcher.resolved('app') == 0.0
+
+    metrics = watcher.get_count_metrics()
+
+    assert metrics['spooling_apps'] == 0
+    assert metrics['spooling_recovered'] == 1
+    assert metrics['spooling_time']['max_ms'] == 2500
+
+
+def test_gave_up(mocker, clock):
+    watcher = make_watcher(mocker, clock)
+    watcher.watch('app', 'p', 1, 1)
+
+    clock.now += 11
+
+    assert due_apps(watcher) == []
+    assert not watcher.pending
+    assert watcher.get_count_metrics()['spooling_gave_up'] == 1
@@ -2,6 +2,7 @@ import json
 from collections import namedtuple
 
 from cocaine.burlak import burlak
+from cocaine.burlak.chcache import ChannelsCache
 from cocaine.burlak.comm_state import CommittedState
 from cocaine.burlak.helpers import flatten_dict, flatten_dict_rec
 from cocaine.burlak.sys_metrics import SysMetricsGatherer
@@ -13,7 +14,7 @@ import pytest
 
 import tornado.queues
 
-from .common import make_future
+from .common import Clock, make_future, make_mock_channel_with
 
 
 TEST_UUID = 'some_correct_uuid'
@@ -98,15 +99,7 @@ def app(mocker):
     stop_queue.qsize = mock.MagicMock(return_value=3)
 
     committed_state = CommittedState()
-    committed_state.as_dict = mock.MagicMock(
-        return_value=test_state
-    )
-    committed_state.as_named_dict = mock.MagicMock(
-        return_value={
-            app: record._asdict()
-            for app, record in test_state.iteritems()
-        }
-    )
+    committed_state.state.update(test_state)
 
     committed_state.set_incoming_state(
         incoming_state, TEST_INCOMING_STATE_VERSION, TEST_TS)
@@ -136,6 +129,18 @@ def app(mocker):
     uptime = mocker.Mock()
     uptime.uptime = mocker.Mock(return_value=TEST_UPTIME)
 
+    clock = Clock()
+
+    node = mocker.Mock()
+    node.control = mocker.Mock(return_value=make_mock_channel_with(0))
+
+    apps_elysium = mocker.Mock()
+    apps_elysium.channels_cache = ChannelsCache(
+        mocker.Mock(), node, clock=clock)
+
+    apps_elysium.channels_cache.get_ch('x')
+    clock.now += 5
+
     wops = WebOptions(
         '',
         TEST_PORT,
@@ -146,7 +151,7 @@ def app(mocker):
         qs,
         units,
         workers_distribution,
-        mocker.Mock(),
+        apps_elysium,
         TEST_VERSION
     )
     return make_web_app_v1(wops)
@@ -224,6 +229,8 @@ def test_get_state(http_client, base_url, is_legacy, state_path):
 
     if not is_legacy:
         assert loaded_state.get('version') == TEST_STATE_VERSION
+        assert loaded_state.get('seq') == 0
+        assert loaded_state.get('flapping') == dict()
 
 
 @pytest.mark.parametrize(
@@ -246,6 +253,22 @@ def test_get_state_by_app(http_client, base_url, is_legacy, state_path):
         assert state == {app: test_state[app]._asdict()}
 
 
+@pytest.mark.parametrize(
+    'since, expect',
+    [
+        (0, dict(refetch=False, seq=0, changes=[])),
+        (5, dict(refetch=True, seq=0, changes=[])),
+    ]
+)
+@pytest.mark.gen_test
+def test_state_changes(http_client, base_url, since, expect):
+    path = make_url('', API_V1, 'state/changes?since={}'.format(since))
+    response = yield http_client.fetch(base_url + path)
+
+    assert response.code == 200
+    assert json.loads(response.body) == expect
+
+
 @pytest.mark.gen_test
 def test_incoming_state(http_client, base_url):
     response = yield http_client.fetch(
@@ -356,5 +379,17 @@ def test_defaults_channels(http_client, base_url):
     response = yield http_client.fetch(
         base_url + make_url('', API_V1, r'channels'))
 
+    channels = json.loads(response.body)
+
     assert response.code == 200
-    assert json.loads(response.body) == dict(apps=test_channels)
+    assert channels['apps'] == test_channels
+    assert channels['channels'] == dict(
+        x=dict(age=5, idle=5, last_ack=None, errors=0, suspected=False))
+
+    metrics = channels['metrics']
+
+    assert metrics['size'] == 1
+    assert metrics['hits'] == 0
+    assert metrics['misses'] == 1
+    assert metrics['open_latency']['count'] == 1
+    assert metrics['closed'] == dict()